@@ -8,6 +8,13 @@ IOU_THRESHOLD = .4
 APPROX_INF = 65535
 MAX_MATCHING_DIST = 45
 
-from ._widget import MMVH4TRACKS
-
 __all__ = ["MMVH4TRACKS"]
+
+
+def __getattr__(name):
+    # The widget is imported on first use, so the analysis can run without Qt
+    if name == "MMVH4TRACKS":
+        from ._widget import MMVH4TRACKS
+
+        return MMVH4TRACKS
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,3 @@
-from multiprocessing import Pool
 
 import numpy as np
 from qtpy.QtWidgets import (
@@ -21,13 +20,29 @@ from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from napari.qt.threading import thread_worker
 import napari
-from skimage import measure
 
 from ._grabber import grab_layer
 from ._logger import notify
 from mmv_h4tracks._logger import handle_exception
 from ._selector import Selector
-from ._writer import save_csv
+from .analysis import (
+    SEGMENTATION_METRICS,
+    calculate_cell_size,
+    compose_csv_data,
+    filter_tracks,
+    save_csv,
+)
+from ._metrics import (
+    calculate_accumulated_distance,
+    calculate_direction,
+    calculate_euclidean_distance,
+    calculate_speed,
+    calculate_track_duration,
+    calculate_track_statistics,
+    calculate_velocity,
+    get_tracks_fingerprint,
+)
+from ._morphology import MorphologyTable, get_morphology_table, get_track_morphology
 
 
 class AnalysisWindow(QWidget):
@@ -49,6 +64,8 @@ class AnalysisWindow(QWidget):
         super().__init__()
         self.parent = parent
         self.viewer = parent.viewer
+        # Results of the metrics, (fingerprint of the data, result) by metric
+        self.metric_cache = {}
         self.setLayout(QVBoxLayout())
         try:
             self.setStyleSheet(napari.qt.get_stylesheet(theme="dark"))
@@ -208,22 +225,7 @@ class AnalysisWindow(QWidget):
         nd array
             (N,3) shape array, which contains the ID, average speed and standard deviation of speed
         """
-        for unique_id in np.unique(tracks[:, 0]):
-            track = np.delete(tracks, np.where(tracks[:, 0] != unique_id), 0)
-            accumulated_distance = []
-            for i in range(0, len(track) - 1):
-                accumulated_distance.append(
-                    np.hypot(
-                        track[i, 2] - track[i + 1, 2], track[i, 3] - track[i + 1, 3]
-                    )
-                )
-            average = np.around(np.average(accumulated_distance), 3)
-            std_deviation = np.around(np.std(accumulated_distance), 3)
-            try:
-                speeds = np.append(speeds, [[unique_id, average, std_deviation]], 0)
-            except UnboundLocalError:
-                speeds = np.array([[unique_id, average, std_deviation]])
-        return speeds
+        return calculate_speed(tracks)
 
     def _calculate_size(self, tracks, segmentation):
         """
@@ -241,17 +243,7 @@ class AnalysisWindow(QWidget):
         speeds: nd array
             (N,3) shape array, which contains the ID, average speed and standard deviation of speed
         """
-        track_and_segmentation = []
-        for unique_id in np.unique(tracks[:, 0]):
-            track_and_segmentation.append(
-                [tracks[np.where(tracks[:, 0] == unique_id)], segmentation]
-            )
-        AMOUNT_OF_PROCESSES = self.parent.get_process_limit()
-
-        with Pool(AMOUNT_OF_PROCESSES) as p:
-            sizes = p.starmap(calculate_size_single_track, track_and_segmentation)
-
-        return np.array(sizes)
+        return calculate_cell_size(tracks, segmentation)
 
     def _calculate_direction(self, tracks):
         """
@@ -267,29 +259,7 @@ class AnalysisWindow(QWidget):
         sizes: nd array
             (N,3) shape array, which contains the ID, average speed and standard deviation of speed
         """
-        for unique_id in np.unique(tracks[:, 0]):
-            track = np.delete(tracks, np.where(tracks[:, 0] != unique_id), 0)
-            x = track[-1, 3] - track[0, 3]
-            y = track[0, 2] - track[-1, 2]
-            if x == 0:
-                if y < 0:
-                    direction = 270
-                elif y > 0:
-                    direction = 90
-                else:
-                    direction = 0
-            else:
-                direction = 180 + np.arctan(y / x) / np.pi * 180
-                if x > 0:
-                    direction += 180
-            if direction >= 360:
-                direction -= 360
-            direction = np.around(direction, 3)
-            try:
-                retval = np.append(retval, [[unique_id, x, y, direction]], 0)
-            except UnboundLocalError:
-                retval = np.array([[unique_id, x, y, direction]])
-        return retval
+        return calculate_direction(tracks)
 
     def _calculate_euclidean_distance(self, tracks):
         """
@@ -305,18 +275,7 @@ class AnalysisWindow(QWidget):
         euclidean_distances: nd array
             (N,3) shape array, which contains the ID, average euclidean distance and track length
         """
-        for id in np.unique(tracks[:, 0]):
-            track = np.delete(tracks, np.where(tracks[:, 0] != id), 0)
-            x = track[-1, 3] - track[0, 3]
-            y = track[0, 2] - track[-1, 2]
-            euclidean_distance = np.around(np.sqrt(np.square(x) + np.square(y)), 3)
-            try:
-                euclidean_distances = np.append(
-                    euclidean_distances, [[id, euclidean_distance, len(track)]], 0
-                )
-            except UnboundLocalError:
-                euclidean_distances = np.array([[id, euclidean_distance, len(track)]])
-        return euclidean_distances
+        return calculate_euclidean_distance(tracks)
 
     def _calculate_velocity(self, tracks):
         """
@@ -332,20 +291,7 @@ class AnalysisWindow(QWidget):
         velocities: nd array
             (N,3) shape array, which contains the ID, velocity and ID again
         """
-        euclidean_distances = self._calculate_euclidean_distance(tracks)
-        for unique_id in np.unique(tracks[:, 0]):
-            euclidean_distance = np.delete(
-                euclidean_distances, np.where(euclidean_distances[:, 0] != unique_id), 0
-            )
-            track = np.delete(tracks, np.where(tracks[:, 0] != unique_id), 0)
-            directed_speed = np.around(euclidean_distance[0, 1] / len(track), 3)
-            try:
-                directed_speeds = np.append(
-                    directed_speeds, [[unique_id, directed_speed, unique_id]], 0
-                )
-            except UnboundLocalError:
-                directed_speeds = np.array([[unique_id, directed_speed, unique_id]])
-        return directed_speeds
+        return calculate_velocity(tracks)
 
     def _calculate_accumulated_distance(self, tracks):
         """
@@ -361,27 +307,7 @@ class AnalysisWindow(QWidget):
         accumulated_distances: nd array
             (N,3) shape array, which contains the ID, average accumulated distance and track length
         """
-        for unique_id in np.unique(tracks[:, 0]):
-            track = np.delete(tracks, np.where(tracks[:, 0] != unique_id), 0)
-            steps = []
-            for i in range(0, len(track) - 1):
-                steps.append(
-                    np.hypot(
-                        track[i, 2] - track[i + 1, 2], track[i, 3] - track[i + 1, 3]
-                    )
-                )
-            accumulated_distance = np.around(np.sum(steps), 3)
-            try:
-                accumulated_distances = np.append(
-                    accumulated_distances,
-                    [[unique_id, accumulated_distance, len(track)]],
-                    0,
-                )
-            except UnboundLocalError:
-                accumulated_distances = np.array(
-                    [[unique_id, accumulated_distance, len(track)]]
-                )
-        return accumulated_distances
+        return calculate_accumulated_distance(tracks)
 
     def calculate_cell_eccentricity(self, tracks, segmentation):
         """
@@ -399,38 +325,13 @@ class AnalysisWindow(QWidget):
         eccentricities: nd array
             (N,3) shape array, which contains the ID, average eccentricity and standard deviation of eccentricity
         """
-        for unique_id in np.unique(tracks[:, 0]):
-            track = np.delete(tracks, np.where(tracks[:, 0] != unique_id), 0)
-            eccentricity = []
-            for i in range(len(track)):
-                seg_id = segmentation[track[i, 1], track[i, 2], track[i, 3]]
-                properties = measure.regionprops(
-                    (segmentation[track[i, 1]] == seg_id).astype(int)
-                )
-                eccentricity.append(properties[0].eccentricity)
-            try:
-                eccentricities = np.append(
-                    eccentricities,
-                    [
-                        [
-                            unique_id,
-                            np.around(np.average(eccentricity), 3),
-                            np.around(np.std(eccentricity), 3),
-                        ]
-                    ],
-                    0,
-                )
-            except UnboundLocalError:
-                eccentricities = np.array(
-                    [
-                        [
-                            unique_id,
-                            np.around(np.average(eccentricity), 3),
-                            np.around(np.std(eccentricity), 3),
-                        ]
-                    ]
-                )
-        return eccentricities
+        morphology = get_track_morphology(
+            tracks,
+            segmentation,
+            self._get_morphology_table(segmentation),
+            self.parent.get_pool(),
+        )
+        return calculate_track_statistics(tracks, morphology["eccentricity"])
 
     def calculate_cell_perimeter(self, tracks, segmentation):
         """
@@ -448,38 +349,83 @@ class AnalysisWindow(QWidget):
         perimeters: nd array
             (N,3) shape array, which contains the ID, average perimeter and standard deviation of perimeter
         """
-        for unique_id in np.unique(tracks[:, 0]):
-            track = np.delete(tracks, np.where(tracks[:, 0] != unique_id), 0)
-            perimeter = []
-            for i in range(len(track)):
-                seg_id = segmentation[track[i, 1], track[i, 2], track[i, 3]]
-                properties = measure.regionprops(
-                    (segmentation[track[i, 1]] == seg_id).astype(int)
-                )
-                perimeter.append(properties[0].perimeter)
-            try:
-                perimeters = np.append(
-                    perimeters,
-                    [
-                        [
-                            unique_id,
-                            np.around(np.average(perimeter), 3),
-                            np.around(np.std(perimeter), 3),
-                        ]
-                    ],
-                    0,
-                )
-            except UnboundLocalError:
-                perimeters = np.array(
-                    [
-                        [
-                            unique_id,
-                            np.around(np.average(perimeter), 3),
-                            np.around(np.std(perimeter), 3),
-                        ]
-                    ]
-                )
-        return perimeters
+        morphology = get_track_morphology(
+            tracks,
+            segmentation,
+            self._get_morphology_table(segmentation),
+            self.parent.get_pool(),
+        )
+        return calculate_track_statistics(tracks, morphology["perimeter"])
+
+    def _get_morphology_table(self, segmentation):
+        """
+        Returns the morphology table of a segmentation. The table of the selected
+        segmentation layer is kept between calls, so each frame is only measured once.
+
+        Parameters
+        ----------
+        segmentation : nd array
+            (z,y,x) shape array, which follows napari's labelslayer format
+
+        Returns
+        -------
+        MorphologyTable
+            the morphology table of the segmentation
+        """
+        segmentation_layer = grab_layer(
+            self.viewer, self.parent.combobox_segmentation.currentText()
+        )
+        if segmentation_layer.data is segmentation:
+            return get_morphology_table(segmentation_layer)
+        return MorphologyTable(segmentation)
+
+    def _get_metric(self, metric, tracks, segmentation=None):
+        """
+        Returns the result of a metric. Results are kept until the tracks, or the
+        segmentation for metrics that depend on it, change.
+
+        Parameters
+        ----------
+        metric : str
+            the name of the metric
+        tracks : nd array
+            (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+        segmentation : nd array, optional
+            (z,y,x) shape array, required for Size, Perimeter and Eccentricity
+
+        Returns
+        -------
+        nd array
+            the result of the metric
+        """
+        calculators = {
+            "Speed": self._calculate_speed,
+            "Direction": self._calculate_direction,
+            "Euclidean distance": self._calculate_euclidean_distance,
+            "Velocity": self._calculate_velocity,
+            "Accumulated distance": self._calculate_accumulated_distance,
+            "Track duration": calculate_track_duration,
+        }
+        morphology_calculators = {
+            "Size": self._calculate_size,
+            "Perimeter": self.calculate_cell_perimeter,
+            "Eccentricity": self.calculate_cell_eccentricity,
+        }
+        fingerprint = [get_tracks_fingerprint(tracks)]
+        if metric in morphology_calculators:
+            # The morphology table counts the changes of the segmentation
+            table = self._get_morphology_table(segmentation)
+            fingerprint.extend([table, table.version])
+
+        cached = self.metric_cache.get(metric)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        if metric in morphology_calculators:
+            result = morphology_calculators[metric](tracks, segmentation)
+        else:
+            result = calculators[metric](tracks)
+        self.metric_cache[metric] = (fingerprint, result)
+        return result
 
     def _start_plot_worker(self):
         """
@@ -589,7 +535,7 @@ class AnalysisWindow(QWidget):
                 {"Description": "Scatterplot Standard Deviation vs Average: Speed"}
             )
             retval.update({"x_label": "Average", "y_label": "Standard Deviation"})
-            retval.update({"Results": self._calculate_speed(tracks_layer.data)})
+            retval.update({"Results": self._get_metric("Speed", tracks_layer.data)})
 
         elif metric == "Size":
             retval.update({"Name": "Size [pixels]"})
@@ -602,8 +548,8 @@ class AnalysisWindow(QWidget):
             retval.update({"x_label": "Average", "y_label": "Standard Deviation"})
             retval.update(
                 {
-                    "Results": self._calculate_size(
-                        tracks_layer.data, segmentation_layer.data
+                    "Results": self._get_metric(
+                        "Size", tracks_layer.data, segmentation_layer.data
                     )
                 }
             )
@@ -611,13 +557,13 @@ class AnalysisWindow(QWidget):
         elif metric == "Direction":
             retval.update({"Name": "Direction [°]"})
             retval.update({"Description": "Scatterplot Travel direction & Distance"})
-            retval.update({"Results": self._calculate_direction(tracks_layer.data)})
+            retval.update({"Results": self._get_metric("Direction", tracks_layer.data)})
             retval.update({"x_label": "Δx", "y_label": "Δy"})
 
         elif metric == "Velocity":
             retval.update({"Name": "Velocity"})
             retval.update({"Description": "Scatterplot velocity vs track id"})
-            retval.update({"Results": self._calculate_velocity(tracks_layer.data)})
+            retval.update({"Results": self._get_metric("Velocity", tracks_layer.data)})
             retval.update({"x_label": "Velocity [px/frame]", "y_label": "ID"})
 
         elif metric == "Euclidean distance":
@@ -632,7 +578,7 @@ class AnalysisWindow(QWidget):
                 }
             )
             retval.update(
-                {"Results": self._calculate_euclidean_distance(tracks_layer.data)}
+                {"Results": self._get_metric("Euclidean distance", tracks_layer.data)}
             )
 
         elif metric == "Accumulated distance":
@@ -647,7 +593,7 @@ class AnalysisWindow(QWidget):
                 }
             )
             retval.update(
-                {"Results": self._calculate_accumulated_distance(tracks_layer.data)}
+                {"Results": self._get_metric("Accumulated distance", tracks_layer.data)}
             )
 
         elif metric == "Eccentricity":
@@ -663,8 +609,8 @@ class AnalysisWindow(QWidget):
             retval.update({"x_label": "Average", "y_label": "Standard Deviation"})
             retval.update(
                 {
-                    "Results": self.calculate_cell_eccentricity(
-                        tracks_layer.data, segmentation_layer.data
+                    "Results": self._get_metric(
+                        "Eccentricity", tracks_layer.data, segmentation_layer.data
                     )
                 }
             )
@@ -680,8 +626,8 @@ class AnalysisWindow(QWidget):
             retval.update({"x_label": "Average", "y_label": "Standard Deviation"})
             retval.update(
                 {
-                    "Results": self.calculate_cell_perimeter(
-                        tracks_layer.data, segmentation_layer.data
+                    "Results": self._get_metric(
+                        "Perimeter", tracks_layer.data, segmentation_layer.data
                     )
                 }
             )
@@ -690,16 +636,8 @@ class AnalysisWindow(QWidget):
             retval.update({"Name": "Track duration"})
             retval.update({"Description": "Scatterplot track ID vs track duration"})
             retval.update({"x_label": "Track duration [frames]", "y_label": "ID"})
-            retval.update(
-                {
-                    "Results": np.array(
-                        [
-                            [i, np.count_nonzero(tracks_layer.data[:, 0] == i), i]
-                            for i in np.unique(tracks_layer.data[:, 0])
-                        ]
-                    )
-                }
-            )
+            duration = self._get_metric("Track duration", tracks_layer.data)
+            retval.update({"Results": np.column_stack([duration, duration[:, 0]])})
         else:
             raise ValueError("No defined behaviour for given metric.")
 
@@ -762,22 +700,25 @@ class AnalysisWindow(QWidget):
         tracks = grab_layer(
             self.parent.viewer, self.parent.combobox_tracks.currentText()
         ).data
-        direction = self._calculate_direction(tracks)
-        self.direction = direction
-
         (
             filtered_mask,
             min_movement,
             min_duration,
         ) = self._filter_tracks_by_parameters(tracks)
 
-        duration = np.array(
-            [[i, np.count_nonzero(tracks[:, 0] == i)] for i in np.unique(tracks[:, 0])]
-        )
-        data = self._compose_csv_data(
-            tracks, duration, filtered_mask, min_movement, min_duration, metrics
+        segmentation = None
+        if any(metric in SEGMENTATION_METRICS for metric in metrics):
+            segmentation = grab_layer(
+                self.viewer, self.parent.combobox_segmentation.currentText()
+            ).data
+        results = {
+            metric: self._get_metric(metric, tracks, segmentation)
+            for metric in ["Track duration", *metrics]
+        }
+        data = compose_csv_data(
+            tracks, results, filtered_mask, min_movement, min_duration, metrics
         )
-        save_csv(file, data)
+        save_csv(file[0], data)
         QApplication.restoreOverrideCursor()
 
     def _filter_tracks_by_parameters(self, tracks):
@@ -798,545 +739,26 @@ class AnalysisWindow(QWidget):
         min_duration: int
             minimum duration in frames
         """
-        distances = self._calculate_accumulated_distance(tracks)
         if self.lineedit_movement.text() == "":
             min_movement = 0
-            movement_mask = np.unique(tracks[:, 0])
         else:
             try:
                 min_movement = int(self.lineedit_movement.text())
             except ValueError as exc:
                 raise ValueError("Movement minimum can't be converted to int") from exc
-            movement_mask = distances[np.where(distances[:, 1] >= min_movement)[0], 0]
 
         if self.lineedit_track_duration.text() == "":
             min_duration = 0
-            duration_mask = np.unique(tracks[:, 0])
         else:
             try:
                 min_duration = int(self.lineedit_track_duration.text())
             except ValueError as exc:
                 raise ValueError("Minimum duration can't be converted to int") from exc
-            indices = np.where(
-                np.unique(tracks[:, 0], return_counts=True)[1] >= min_duration
-            )
-            duration_mask = np.unique(tracks[:, 0])[indices]
-
-        return np.intersect1d(movement_mask, duration_mask), min_movement, min_duration
-
-    def _compose_csv_data(
-        self,
-        tracks,
-        duration,
-        filtered_mask,
-        min_movement,
-        min_duration,
-        selected_metrics,
-    ):
-        """
-        Composes the data for the csv file
 
-        Parameters
-        ----------
-        tracks : nd array
-            (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
-        duration : nd array
-            (N,2) shape array, which contains the ID and duration of each track
-        filtered_mask : nd array
-            (N,) shape array, which contains the IDs of the tracks matching the given parameters
-        min_movement : int
-            minimum movement in pixels
-        min_duration : int
-            minimum duration in frames
-        selected_metrics : list
-            list of metrics to export
-
-        Returns
-        -------
-        rows : list
-            list of rows to export
-        """
-        metrics = ["", "Number of cells", "Average track duration [# frames]"]
-        metrics.append("Standard deviation of track duration [# frames]")
-        individual_metrics = ["ID", "Track duration [# frames]"]
-        all_values = ["all"]
-        all_values.extend(
-            [
-                len(np.unique(tracks[:, 0])),
-                np.around(np.average(duration[:, 1]), 3),
-                np.around(np.std(duration[:, 1]), 3),
-            ]
-        )
-        valid_values = ["valid"]
-        valid_values.extend(
-            [
-                len(filtered_mask),
-                np.around(
-                    np.average(
-                        [
-                            duration[i, 1]
-                            for i in range(len(duration))
-                            if duration[i, 0] in filtered_mask
-                        ]
-                    ),
-                    3,
-                ),
-                np.around(
-                    np.std(
-                        [
-                            duration[i, 1]
-                            for i in range(len(duration))
-                            if duration[i, 0] in filtered_mask
-                        ]
-                    ),
-                    3,
-                ),
-            ]
-        )
-        if len(selected_metrics) > 0:
-            (
-                more_metrics,
-                more_individual_metrics,
-                more_all_values,
-                more_valid_values,
-                metrics_dict,
-            ) = self._extend_metrics(tracks, selected_metrics, filtered_mask, duration)
-            metrics.extend(more_metrics)
-            individual_metrics.extend(more_individual_metrics)
-            all_values.extend(more_all_values)
-            valid_values.extend(more_valid_values)
-
-        rows = [metrics, all_values, valid_values]
-        rows.append([None])
-        rows.append(
-            [
-                "Movement Threshold: {} pixels".format(str(min_movement)),
-                "Duration Threshold: {} frames".format(str(min_duration)),
-            ]
+        filtered_mask = filter_tracks(
+            tracks,
+            min_movement,
+            min_duration,
+            self._get_metric("Accumulated distance", tracks),
         )
-        rows.append([None])
-
-        if len(selected_metrics) > 0:
-            rows.append(individual_metrics)
-            valid_values, invalid_values = self._individual_metric_values(
-                tracks, filtered_mask, metrics_dict
-            )
-            rows.append(["Cells matching the filters"])
-            for value in valid_values:
-                rows.append(value)
-
-            if not np.array_equal(np.unique(tracks[:, 0]), filtered_mask):
-                rows.append([None])
-                rows.append([None])
-                rows.append(["Cells not matching the filters"])
-
-                [rows.append(value) for value in invalid_values]
-
-        return rows
-
-    def _extend_metrics(self, tracks, selected_metrics, filtered_mask, duration):
-        """
-        Extends the metrics for the export
-
-        Parameters
-        ----------
-        tracks : nd array
-            (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
-        selected_metrics : list
-            list of metrics to export
-        filtered_mask : nd array
-            (N,) shape array, which contains the IDs of the tracks matching the given parameters
-        duration : nd array
-            (N,2) shape array, which contains the ID and duration of each track
-
-        Returns
-        -------
-        metrics : list
-            list of metrics to export
-        """
-        metrics, individual_metrics, all_values, valid_values = [[], [], [], []]
-        metrics_dict = {}
-        if "Speed" in selected_metrics:
-            speed = self._calculate_speed(tracks)
-            metrics.append("Average_speed [# pixels/frame]")
-            individual_metrics.extend(
-                [
-                    "Average speed [# pixels/frame]",
-                    "Standard deviation of speed [# pixels/frame]",
-                ]
-            )
-            all_values.append(np.around(np.average(speed[:, 1]), 3))
-            valid_values.append(
-                np.around(
-                    np.average(
-                        [
-                            speed[i, 1]
-                            for i in range(len(speed))
-                            if speed[i, 0] in filtered_mask
-                        ]
-                    ),
-                    3,
-                )
-            )
-            metrics_dict.update({"Speed": speed})
-
-        if "Size" in selected_metrics:
-            segmentation = grab_layer(
-                self.viewer, self.parent.combobox_segmentation.currentText()
-            ).data
-            size = self._calculate_size(tracks, segmentation)
-            metrics.extend(
-                ["Average size [# pixels]", "Standard deviation of size [# pixels]"]
-            )
-            individual_metrics.extend(
-                ["Average size [# pixels]", "Standard deviation of size [# pixels]"]
-            )
-            all_values.extend(
-                [np.around(np.average(size[:, 1]), 3), np.around(np.std(size[:, 1]), 3)]
-            )
-            valid_values.extend(
-                [
-                    np.around(
-                        np.average(
-                            [
-                                size[i, 1]
-                                for i in range(len(size))
-                                if size[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                    np.around(
-                        np.std(
-                            [
-                                size[i, 1]
-                                for i in range(len(size))
-                                if size[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                ]
-            )
-            metrics_dict.update({"Size": size})
-
-        if "Direction" in selected_metrics:
-            metrics.extend(
-                [
-                    "Average direction [°]",
-                    "Standard deviation of direction [°]",
-                ]
-            )
-            individual_metrics.extend(["Direction [°]"])
-            all_values.extend(
-                [
-                    np.around(np.average(self.direction[:, 3]), 3),
-                    np.around(np.std(self.direction[:, 3]), 3),
-                ]
-            )
-            valid_values.extend(
-                [
-                    np.around(
-                        np.average(
-                            [
-                                self.direction[i, 3]
-                                for i in range(len(self.direction))
-                                if self.direction[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                    np.around(
-                        np.std(
-                            [
-                                self.direction[i, 3]
-                                for i in range(len(self.direction))
-                                if self.direction[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                ]
-            )
-            metrics_dict.update({"Direction": self.direction})
-
-        if "Euclidean distance" in selected_metrics:
-            euclidean_distance = self._calculate_euclidean_distance(tracks)
-            metrics.extend(["Average euclidean distance [# pixels]"])
-            individual_metrics.extend(["Euclidean distance [# pixels]"])
-            all_values.extend(
-                [
-                    np.around(np.average(euclidean_distance[:, 1]), 3),
-                ]
-            )
-            valid_values.extend(
-                [
-                    np.around(
-                        np.average(
-                            [
-                                euclidean_distance[i, 1]
-                                for i in range(len(euclidean_distance))
-                                if euclidean_distance[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                ]
-            )
-            metrics_dict.update({"Euclidean distance": euclidean_distance})
-
-        if "Velocity" in selected_metrics:
-            velocity = self._calculate_velocity(tracks)
-            metrics.extend(
-                [
-                    "Average velocity [#pixels/frame]",
-                    "Standard deviation of velocity [# pixels/frame]",
-                ]
-            )
-            individual_metrics.extend(["Velocity [# pixels/frame]"])
-            all_values.extend(
-                [
-                    np.around(np.average(velocity[:, 1]), 3),
-                    np.around(np.std(velocity[:, 1]), 3),
-                ]
-            )
-            valid_values.extend(
-                [
-                    np.around(
-                        np.average(
-                            [
-                                velocity[i, 1]
-                                for i in range(len(velocity))
-                                if velocity[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                    np.around(
-                        np.std(
-                            [
-                                velocity[i, 1]
-                                for i in range(len(velocity))
-                                if velocity[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                ]
-            )
-            metrics_dict.update({"Velocity": velocity})
-
-        if "Accumulated distance" in selected_metrics:
-            accumulated_distance = self._calculate_accumulated_distance(tracks)
-            metrics.append("Average accumulated distance [# pixels]")
-            individual_metrics.append("Accumulated distance [# pixels]")
-            all_values.append(np.around(np.average(accumulated_distance[:, 1]), 3))
-            valid_values.append(
-                np.around(
-                    np.average(
-                        [
-                            accumulated_distance[i, 1]
-                            for i in range(len(accumulated_distance))
-                            if accumulated_distance[i, 0] in filtered_mask
-                        ]
-                    ),
-                    3,
-                )
-            )
-            metrics_dict.update({"Accumulated distance": accumulated_distance})
-
-            if "Euclidean distance" in selected_metrics:
-                metrics.append("Average directness")
-                individual_metrics.append("Directness")
-
-                directness = []
-                for i in range(len(np.unique(tracks[:, 0]))):
-                    directness.append(
-                        [
-                            euclidean_distance[i, 0],
-                            euclidean_distance[i, 1] / accumulated_distance[i, 1]
-                            if accumulated_distance[i, 1] > 0
-                            else 0,
-                        ]
-                    )
-
-                directness = np.around(np.array(directness), 3)
-                all_values.append(np.around((np.average(directness[:, 1])), 3))
-                valid_values.append(
-                    np.around(
-                        np.average(
-                            [
-                                directness[i, 1]
-                                for i in range(len(directness))
-                                if directness[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    )
-                )
-                metrics_dict.update({"Directness": directness})
-
-        if "Perimeter" in selected_metrics:
-            segmentation = grab_layer(
-                self.viewer, self.parent.combobox_segmentation.currentText()
-            ).data
-            perimeter = self.calculate_cell_perimeter(tracks, segmentation)
-            metrics.extend(
-                [
-                    "Average perimeter [# pixels]",
-                    "Standard deviation of perimeter [# pixels",
-                ]
-            )
-            individual_metrics.extend(
-                [
-                    "Average perimeter [# pixels]",
-                    "Standard deviation of perimeter [# pixels]",
-                ]
-            )
-            all_values.extend(
-                [
-                    np.around(np.average(perimeter[:, 1]), 3),
-                    np.around(np.std(perimeter[:, 1]), 3),
-                ]
-            )
-            valid_values.extend(
-                [
-                    np.around(
-                        np.average(
-                            [
-                                perimeter[i, 1]
-                                for i in range(len(perimeter))
-                                if perimeter[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                    np.around(
-                        np.std(
-                            [
-                                perimeter[i, 1]
-                                for i in range(len(perimeter))
-                                if perimeter[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                ]
-            )
-            metrics_dict.update({"Perimeter": perimeter})
-
-        if "Eccentricity" in selected_metrics:
-            segmentation = grab_layer(
-                self.viewer, self.parent.combobox_segmentation.currentText()
-            ).data
-            eccentricity = self.calculate_cell_eccentricity(tracks, segmentation)
-            metrics.extend(
-                [
-                    "Average eccentricity [# pixels]",
-                    "Standard deviation of eccentricity [# pixels]",
-                ]
-            )
-            individual_metrics.extend(
-                [
-                    "Average eccentricity [# pixels]",
-                    "Standard deviation of eccentricity [# pixels]",
-                ]
-            )
-            all_values.extend(
-                [
-                    np.around(np.average(eccentricity[:, 1]), 3),
-                    np.around(np.std(eccentricity[:, 1]), 3),
-                ]
-            )
-            valid_values.extend(
-                [
-                    np.around(
-                        np.average(
-                            [
-                                eccentricity[i, 1]
-                                for i in range(len(eccentricity))
-                                if eccentricity[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                    np.around(
-                        np.std(
-                            [
-                                eccentricity[i, 1]
-                                for i in range(len(eccentricity))
-                                if eccentricity[i, 0] in filtered_mask
-                            ]
-                        ),
-                        3,
-                    ),
-                ]
-            )
-            metrics_dict.update({"Eccentricity": eccentricity})
-
-        return metrics, individual_metrics, all_values, valid_values, metrics_dict
-
-    def _individual_metric_values(self, tracks, filtered_mask, metrics):
-        """
-        Calculate each selected metric for both valid tracks that match the filter criteria and invalid tracks that do not match the filter criteria
-        """
-        valid_values, invalid_values = [[], []]
-        for i, id in enumerate(np.unique(tracks[:, 0])):
-            value = [id]
-            value.append(np.count_nonzero(tracks[:, 0] == id))
-            if "Speed" in metrics:
-                value.extend([metrics["Speed"][i][1], metrics["Speed"][i][2]])
-            if "Size" in metrics:
-                value.extend([metrics["Size"][i][1], metrics["Size"][i][2]])
-            if "Direction" in metrics:
-                value.extend(
-                    [metrics["Direction"][i][3]]
-                )  # using index 3 as 1 and 2 are solely used for plotting
-            if "Euclidean distance" in metrics:
-                value.append(metrics["Euclidean distance"][i][1])
-            if "Velocity" in metrics:
-                value.append(metrics["Velocity"][i][1])
-            if "Accumulated distance" in metrics:
-                value.append(metrics["Accumulated distance"][i][1])
-            if "Directness" in metrics:
-                value.append(metrics["Directness"][i][1])
-            if "Perimeter" in metrics:
-                value.extend([metrics["Perimeter"][i][1], metrics["Perimeter"][i][2]])
-            if "Eccentricity" in metrics:
-                value.extend(
-                    [metrics["Eccentricity"][i][1], metrics["Eccentricity"][i][2]]
-                )
-
-            if id in filtered_mask:
-                valid_values.append(value)
-            else:
-                invalid_values.append(value)
-
-        return valid_values, invalid_values
-
-
-def calculate_size_single_track(track, segmentation):
-    """
-    Calculates the size of a single tracked cell
-
-    Parameters
-    ----------
-    track : nd array
-        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
-    segmentation : nd array
-        (z,y,x) shape array, which follows napari's labelslayer format
-
-    Returns
-    -------
-    sizes: nd array
-        (N,3) shape array, which contains the ID, average size and standard deviation of size
-    """
-    id = track[0, 0]
-    sizes = []
-    for line in track:
-        _, z, y, x = line
-        seg_id = segmentation[z, y, x]
-        sizes.append(len(np.where(segmentation[z] == seg_id)[0]))
-    average = np.around(np.average(sizes), 3)
-    std_deviation = np.around(np.std(sizes), 3)
-    return [id, average, std_deviation]
+        return filtered_mask, min_movement, min_duration
@@ -1,6 +1,5 @@
 import numpy as np
 import math
-from multiprocessing import Pool
 
 from qtpy.QtWidgets import (
     QWidget,
@@ -15,12 +14,18 @@ from qtpy.QtWidgets import (
     QTableWidgetItem,
     QAbstractScrollArea,
 )
-from scipy import ndimage
 
 from ._logger import notify
 from ._grabber import grab_layer
 from mmv_h4tracks._logger import handle_exception
 from mmv_h4tracks import IOU_THRESHOLD
+from ._shared import SharedArray, attach_shared_array
+from ._label_index import LabelIndex
+from ._object_table import (
+    calculate_object_table,
+    get_object_rows,
+    get_rounded_centroids,
+)
 
 
 class EvaluationWindow(QWidget):
@@ -150,7 +155,7 @@ class EvaluationWindow(QWidget):
         except ValueError as exc:
             handle_exception(exc)
             return
-        eval_seg = self.parent.initial_layers[0]
+        eval_seg = self.parent.get_initial_layers()[0]
         if eval_seg is None:
             notify("Segmentation and Tracks must be imported from zarr currently! (Drag and drop will be supported in the future). As a work-around for now export your data as zarr and import it.")
             return
@@ -244,8 +249,7 @@ class EvaluationWindow(QWidget):
         except ValueError as exc:
             handle_exception(exc)
             return
-        eval_tracks = self.parent.initial_layers[1]
-        eval_seg = self.parent.initial_layers[0]
+        eval_seg, eval_tracks = self.parent.get_initial_layers()
         if eval_tracks is None or eval_seg is None:
             notify("Segmentation and Tracks must be imported from zarr currently! (Drag and drop will be supported in the future). As a work-around for now export your data as zarr and import it.")
             return
@@ -309,18 +313,15 @@ class EvaluationWindow(QWidget):
     def adjust_centroids(self, segmentation, tracks_layer, bounds):
         """Adjust the centroids of the tracks to the current segmentation."""
         tracks = tracks_layer.data
-        for row in tracks:
-            _, z, y, x = row
-            if z < bounds[0] or z >= bounds[1]:
-                continue
-            segmentation_id = segmentation[z, y, x]
-            if segmentation_id == 0:
-                continue
-            centroid = ndimage.center_of_mass(
-                segmentation[z], labels=segmentation[z], index=segmentation_id
-            )
-            row[2] = int(np.rint(centroid[0]))
-            row[3] = int(np.rint(centroid[1]))
+        lower_bound = max(bounds[0], 0)
+        objects = calculate_object_table(segmentation[lower_bound : bounds[1]])
+        in_bounds = np.flatnonzero(
+            (tracks[:, 1] >= bounds[0]) & (tracks[:, 1] < bounds[1])
+        )
+        z, y, x = tracks[in_bounds, 1:4].T.astype(int)
+        rows = get_object_rows(objects, z - lower_bound, segmentation[z, y, x])
+        found = rows >= 0
+        tracks[in_bounds[found], 2:4] = get_rounded_centroids(objects[rows[found]])
 
         tracks_layer.data = tracks
 
@@ -330,13 +331,20 @@ class EvaluationWindow(QWidget):
         faults = 0
         if np.array_equal(gt_seg, eval_seg):
             return faults
-        AMOUNT_OF_PROCESSES = self.parent.get_process_limit()
-
-        slice_pairs = []
-        for i in range(len(gt_seg)):
-            slice_pairs.append((gt_seg[i], eval_seg[i]))
-        with Pool(AMOUNT_OF_PROCESSES) as p:
-            faults = sum(p.starmap(evaluation_function, slice_pairs))
+        # Publish both volumes once instead of pickling every slice pair
+        with SharedArray(gt_seg) as shared_gt, SharedArray(eval_seg) as shared_eval:
+            slice_pairs = []
+            for i in range(len(gt_seg)):
+                slice_pairs.append(
+                    (
+                        evaluation_function,
+                        shared_gt.descriptor,
+                        shared_eval.descriptor,
+                        i,
+                    )
+                )
+            pool = self.parent.get_pool()
+            faults = sum(pool.starmap(evaluate_shared_slice, slice_pairs))
 
         return faults
 
@@ -351,14 +359,19 @@ class EvaluationWindow(QWidget):
         gt_connections = []
         eval_connections = []
         fault_value = [de, ae]
-        for connections, tracks, segmentations, fault_index in zip(
+        gt_index = LabelIndex(gt_seg)
+        eval_index = LabelIndex(eval_seg)
+        for connections, tracks, segmentations, indices, fault_index in zip(
             [gt_connections, eval_connections],
             [(gt_tracks, eval_tracks), (eval_tracks, gt_tracks)],
             [(gt_seg, eval_seg), (eval_seg, gt_seg)],
+            [(gt_index, eval_index), (eval_index, gt_index)],
             [1, 0],
         ):
             base_tracks, comparison_tracks = tracks
             base_segmentation, comparison_segmentation = segmentations
+            base_index, comparison_index = indices
+            comparison_objects = calculate_object_table(comparison_segmentation)
             for i in range(len(base_tracks) - 1):
                 if (
                     base_tracks[i][0] == base_tracks[i + 1][0]
@@ -377,39 +390,32 @@ class EvaluationWindow(QWidget):
                     comparison_segmentation,
                     old_cell_base,
                     connection[0][0],
+                    base_index,
+                    comparison_index,
                 )
                 new_cell_comparison = get_matching_cell(
                     base_segmentation,
                     comparison_segmentation,
                     new_cell_base,
                     connection[1][0],
+                    base_index,
+                    comparison_index,
                 )
 
                 if old_cell_comparison == 0 or new_cell_comparison == 0:
                     fault_value[fault_index] += 1
                     continue
 
-                old_centroid_in_slice = ndimage.center_of_mass(
-                    comparison_segmentation[connection[0][0]],
-                    labels=segmentations[1][connection[0][0]],
-                    index=old_cell_comparison,
+                rows = get_object_rows(
+                    comparison_objects,
+                    [connection[0][0], connection[1][0]],
+                    [old_cell_comparison, new_cell_comparison],
                 )
-                old_centroid = [
-                    connection[0][0],
-                    int(np.rint(old_centroid_in_slice[0])),
-                    int(np.rint(old_centroid_in_slice[1])),
-                ]
-
-                new_centroid_in_slice = ndimage.center_of_mass(
-                    comparison_segmentation[connection[1][0]],
-                    labels=segmentations[1][connection[1][0]],
-                    index=new_cell_comparison,
+                old_centroid_in_slice, new_centroid_in_slice = get_rounded_centroids(
+                    comparison_objects[rows]
                 )
-                new_centroid = [
-                    connection[1][0],
-                    int(np.rint(new_centroid_in_slice[0])),
-                    int(np.rint(new_centroid_in_slice[1])),
-                ]
+                old_centroid = [connection[0][0], *old_centroid_in_slice]
+                new_centroid = [connection[1][0], *new_centroid_in_slice]
 
                 # Check if the centroids are connected
                 if not is_connected(comparison_tracks, old_centroid, new_centroid):
@@ -426,6 +432,14 @@ def round_half_up(n, decimals=0):
     return math.floor(n * multiplier + 0.5) / multiplier
 
 
+def evaluate_shared_slice(evaluation_function, gt_descriptor, eval_descriptor, slice_id):
+    """Apply an evaluation function to a slice pair of segmentations in shared memory."""
+    return evaluation_function(
+        attach_shared_array(gt_descriptor)[slice_id],
+        attach_shared_array(eval_descriptor)[slice_id],
+    )
+
+
 def get_false_positives(gt_slice, eval_slice):
     """Calculate the number of false positives in a given slice.
     Counts as false positive if:
@@ -437,22 +451,15 @@ def get_false_positives(gt_slice, eval_slice):
     if np.array_equal(gt_slice, eval_slice):
         return fp
 
-    for cell in np.unique(eval_slice):
+    gt_index = LabelIndex(gt_slice[np.newaxis])
+    eval_index = LabelIndex(eval_slice[np.newaxis])
+    for cell in eval_index.get_frame_index(0)[0]:
         if cell == 0:
             continue
 
         # Calculate the IoU scores for the current cell
-        iou_scores = []
-        for gt_cell in np.unique(gt_slice):
-            if gt_cell == 0:
-                continue
-            intersection = np.sum(
-                np.logical_and(gt_slice == gt_cell, eval_slice == cell).flat
-            )
-            if intersection == 0:
-                continue
-            union = np.sum(np.logical_or(gt_slice == gt_cell, eval_slice == cell).flat)
-            iou_scores.append(intersection / union)
+        _, iou_scores = get_intersections_over_union(eval_index, gt_index, cell)
+        iou_scores = list(iou_scores)
         iou_scores.sort(reverse=True)
         if (
             len(iou_scores) < 1
@@ -479,34 +486,25 @@ def get_false_negatives(ground_truth_slice, evaluated_slice):
     if np.array_equal(ground_truth_slice, evaluated_slice):
         return false_negatives
 
+    ground_truth_index = LabelIndex(ground_truth_slice[np.newaxis])
+    evaluated_index = LabelIndex(evaluated_slice[np.newaxis])
+
     # Iterate over unique identifiers in the ground truth slice
-    for identifier in np.unique(ground_truth_slice):
+    for identifier in ground_truth_index.get_frame_index(0)[0]:
         if identifier == 0:
             continue
 
         # Get the Intersection over Union (IoU) on all cells in the evaluated slice at locations of the identifier in the ground truth
-        id_locations = np.where(ground_truth_slice == identifier)
-        evaluated_identifiers = np.unique(evaluated_slice[id_locations])
+        evaluated_identifiers, intersections_over_union = get_intersections_over_union(
+            ground_truth_index, evaluated_index, identifier
+        )
 
         max_intersection_over_union = -1
         best_match_evaluated_id = -1
 
-        for evaluated_id in evaluated_identifiers:
-            if evaluated_id == 0:
-                continue
-
-            intersection = np.sum(
-                np.logical_and(
-                    ground_truth_slice == identifier, evaluated_slice == evaluated_id
-                ).flat
-            )
-            union = np.sum(
-                np.logical_or(
-                    ground_truth_slice == identifier, evaluated_slice == evaluated_id
-                ).flat
-            )
-            intersection_over_union = intersection / union
-
+        for evaluated_id, intersection_over_union in zip(
+            evaluated_identifiers, intersections_over_union
+        ):
             if intersection_over_union > max_intersection_over_union:
                 max_intersection_over_union = intersection_over_union
                 best_match_evaluated_id = evaluated_id
@@ -516,29 +514,10 @@ def get_false_negatives(ground_truth_slice, evaluated_slice):
             # Largest IoU too small
             continue
 
-        reverse_id_locations = np.where(evaluated_slice == best_match_evaluated_id)
-        reverse_identifiers = np.unique(ground_truth_slice[reverse_id_locations])
-
-        reverse_intersections_over_union = []
-
-        for reverse_id in reverse_identifiers:
-            if reverse_id == 0:
-                continue
-
-            intersection = np.sum(
-                np.logical_and(
-                    evaluated_slice == best_match_evaluated_id,
-                    ground_truth_slice == reverse_id,
-                ).flat
-            )
-            union = np.sum(
-                np.logical_or(
-                    evaluated_slice == best_match_evaluated_id,
-                    ground_truth_slice == reverse_id,
-                ).flat
-            )
-            reverse_intersection_over_union = intersection / union
-            reverse_intersections_over_union.append(reverse_intersection_over_union)
+        _, reverse_intersections_over_union = get_intersections_over_union(
+            evaluated_index, ground_truth_index, best_match_evaluated_id
+        )
+        reverse_intersections_over_union = list(reverse_intersections_over_union)
 
         if len(reverse_intersections_over_union) < 2:
             # Reverse IoU only has one match
@@ -570,54 +549,42 @@ def get_split_cells(gt_slice, eval_slice):
     if np.array_equal(gt_slice, eval_slice):
         return 0
 
-    for cell in np.unique(eval_slice):
+    gt_index = LabelIndex(gt_slice[np.newaxis])
+    eval_index = LabelIndex(eval_slice[np.newaxis])
+    for cell in eval_index.get_frame_index(0)[0]:
         if cell == 0:
             continue
 
         # Calculate the IoU scores for the current cell
-        iou_scores = []
-        for gt_cell in np.unique(gt_slice):
-            if gt_cell == 0:
-                continue
-            intersection = np.sum(
-                np.logical_and(eval_slice == cell, gt_slice == gt_cell).flat
-            )
-            if intersection == 0:
-                continue
-            union = np.sum(np.logical_or(eval_slice == cell, gt_slice == gt_cell).flat)
-            iou_scores.append(intersection / union)
+        _, iou_scores = get_intersections_over_union(eval_index, gt_index, cell)
+        iou_scores = list(iou_scores)
         iou_scores.sort(reverse=True)
         if len(iou_scores) > 1 and iou_scores[1] > 0.2:
             sc += 1
     return sc
 
 
-def get_matching_cell(base_layer, comparison_layer, base_id, z):
+def get_matching_cell(
+    base_layer, comparison_layer, base_id, z, base_index=None, comparison_index=None
+):
     """Find the cell in the comparison layer with the highest IoU score with the cell in the base layer.
-    IoU has to be above IOU_THRESHOLD."""
-    base_slice = base_layer[z]
-    comparison_slice = comparison_layer[z]
+    IoU has to be above IOU_THRESHOLD.
+    Label indices of the layers can be passed to reuse them between calls."""
+    if base_index is None:
+        base_index = LabelIndex(base_layer)
+    if comparison_index is None:
+        comparison_index = LabelIndex(comparison_layer)
 
-    base_locations = np.where(base_slice == base_id)
-    comparison_ids = np.unique(comparison_slice[base_locations])
+    comparison_ids, intersections_over_union = get_intersections_over_union(
+        base_index, comparison_index, base_id, z
+    )
 
     max_intersection_over_union = 0
     best_match_id = 0
 
-    for comparison_id in comparison_ids:
-        if comparison_id == 0:
-            continue
-
-        intersection = np.sum(
-            np.logical_and(
-                base_slice == base_id, comparison_slice == comparison_id
-            ).flat
-        )
-        union = np.sum(
-            np.logical_or(base_slice == base_id, comparison_slice == comparison_id).flat
-        )
-        intersection_over_union = intersection / union
-
+    for comparison_id, intersection_over_union in zip(
+        comparison_ids, intersections_over_union
+    ):
         if intersection_over_union > max_intersection_over_union:
             max_intersection_over_union = intersection_over_union
             best_match_id = comparison_id
@@ -628,6 +595,25 @@ def get_matching_cell(base_layer, comparison_layer, base_id, z):
     return best_match_id
 
 
+def get_intersections_over_union(base_index, comparison_index, base_id, z=0):
+    """Calculate the IoU of a cell with every cell of the comparison it overlaps.
+    Returns the IDs of the overlapping cells in ascending order and their IoU scores,
+    the background is left out."""
+    comparison_slice = np.asarray(comparison_index.data[int(z)]).ravel()
+    comparison_ids, intersections = np.unique(
+        comparison_slice[base_index.get_pixels(z, base_id)], return_counts=True
+    )
+    foreground = comparison_ids != 0
+    comparison_ids = comparison_ids[foreground]
+    intersections = intersections[foreground]
+    comparison_areas = np.array(
+        [comparison_index.get_area(z, comparison_id) for comparison_id in comparison_ids],
+        dtype=int,
+    )
+    unions = base_index.get_area(z, base_id) + comparison_areas - intersections
+    return comparison_ids, intersections / unions
+
+
 def is_connected(tracks, old_centroid, new_centroid):
     """Check if the old and new centroids are connected in the tracks."""
     for i in range(len(tracks) - 1):
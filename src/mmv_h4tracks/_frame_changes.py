@@ -0,0 +1,152 @@
+import weakref
+import zlib
+
+import numpy as np
+
+from ._label_index import _get_changed_frames
+
+# Frame changes of the layers loaded from a file
+_LAYER_CHANGES = weakref.WeakKeyDictionary()
+
+
+class FrameChanges:
+    """
+    Keeps track of the frames of a layer that may differ from the file it was loaded from.
+    Frames are marked when they are painted on, saved frames are remembered by their checksum,
+    so frames that were changed back (e.g. by undo) are recognized as well.
+    """
+
+    def __init__(self, amount_of_frames):
+        """
+        Parameters
+        ----------
+        amount_of_frames : int
+            the amount of frames of the layer
+        """
+        self.amount_of_frames = amount_of_frames
+        self.touched_frames = set()
+        self.checksums = {}
+
+    def mark(self, frames=None):
+        """
+        Marks frames as possibly changed
+
+        Parameters
+        ----------
+        frames : iterable, optional
+            the frames, all frames if None
+        """
+        if frames is None:
+            frames = range(self.amount_of_frames)
+        self.touched_frames.update(int(frame) for frame in frames)
+
+    def get_changed_frames(self, data):
+        """
+        Returns the frames that differ from the last saved state
+
+        Parameters
+        ----------
+        data : nd array
+            (z,y,x) shape array of the layer data
+
+        Returns
+        -------
+        dict
+            the checksum of every changed frame
+        """
+        changed_frames = {}
+        for frame in sorted(self.touched_frames):
+            checksum = get_checksum(data[frame])
+            if self.checksums.get(frame) != checksum:
+                changed_frames[frame] = checksum
+        return changed_frames
+
+    def mark_saved(self, checksums):
+        """
+        Remembers the state of frames that were written to the file
+
+        Parameters
+        ----------
+        checksums : dict
+            the checksum of every written frame
+        """
+        self.checksums.update(checksums)
+
+
+def track_frame_changes(layer):
+    """
+    Starts keeping track of the changed frames of a layer that was loaded from a file
+
+    Parameters
+    ----------
+    layer : napari.layers.Layer
+        the image or labels layer
+
+    Returns
+    -------
+    FrameChanges
+        the changes of the layer
+    """
+    changes = FrameChanges(len(layer.data))
+    _LAYER_CHANGES[layer] = changes
+    if hasattr(layer.events, "paint"):
+        layer.events.paint.connect(_on_paint)
+    layer.events.data.connect(_on_data)
+    return changes
+
+
+def get_frame_changes(layer):
+    """
+    Returns the changed frames of a layer
+
+    Parameters
+    ----------
+    layer : napari.layers.Layer
+        the layer
+
+    Returns
+    -------
+    FrameChanges
+        the changes of the layer, None if the layer was not loaded from a file
+    """
+    return _LAYER_CHANGES.get(layer)
+
+
+def get_checksum(label_slice):
+    """
+    Returns the checksum of a frame
+
+    Parameters
+    ----------
+    label_slice : nd array
+        the frame
+
+    Returns
+    -------
+    int
+        the checksum
+    """
+    return zlib.crc32(np.ascontiguousarray(label_slice).data)
+
+
+def _on_paint(event):
+    """
+    Marks the frames of a paint event
+    """
+    changes = _LAYER_CHANGES.get(event.source)
+    if changes is None:
+        return
+    # The first entry of every paint atom holds the painted indices along each axis
+    for atom in event.value:
+        changes.mark(_get_changed_frames(atom[0][0], changes.amount_of_frames))
+
+
+def _on_data(event):
+    """
+    Marks all frames after the data of a layer was replaced
+    """
+    changes = _LAYER_CHANGES.get(event.source)
+    if changes is None:
+        return
+    changes.amount_of_frames = len(event.source.data)
+    changes.mark()
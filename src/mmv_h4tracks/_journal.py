@@ -0,0 +1,427 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+from ._lazy_frames import LazyFrames
+from ._tracks_table import insert_entries
+
+
+class LabelsDiff:
+    """
+    Change of the pixels of a label volume.
+    The changed pixels are stored as runs of consecutive flat indices
+    together with their values before and after the change.
+    """
+
+    def __init__(self, shape, flat_indices, old_values, new_values):
+        """
+        Parameters
+        ----------
+        shape : tuple
+            the shape of the label volume
+        flat_indices : nd array
+            the flat indices of the changed pixels, sorted and unique
+        old_values : nd array
+            the values of the pixels before the change
+        new_values : nd array
+            the values of the pixels after the change, or a single value for all pixels
+        """
+        self.shape = tuple(shape)
+        self.starts, self.lengths = _encode_runs(flat_indices)
+        self.old_values = np.asarray(old_values)
+        self.new_values = np.asarray(new_values)
+
+    @classmethod
+    def from_paint(cls, atoms, shape):
+        """
+        Creates the diff of a napari paint event
+
+        Parameters
+        ----------
+        atoms : list
+            the value of the paint event
+        shape : tuple
+            the shape of the label volume
+
+        Returns
+        -------
+        LabelsDiff
+            the change made by the paint event
+        """
+        indices, old_values, new_values = [], [], []
+        for atom in atoms:
+            if len(atom) == 4:
+                # Masked atom, the pixels are given relative to a bounding box
+                slice_key, mask, atom_old_values, new_value = atom
+                region_shape = tuple(
+                    len(range(*key.indices(length)))
+                    for key, length in zip(slice_key, shape)
+                )
+                if mask is None:
+                    mask = np.ones(region_shape, dtype=bool)
+                    atom_old_values = np.asarray(atom_old_values).ravel()
+                locations = np.nonzero(mask)
+                locations = tuple(
+                    location + key.indices(length)[0]
+                    for location, key, length in zip(locations, slice_key, shape)
+                )
+            else:
+                locations, atom_old_values, new_value = atom
+            atom_indices = np.ravel_multi_index(locations, shape).ravel()
+            indices.append(atom_indices)
+            old_values.append(
+                np.broadcast_to(atom_old_values, atom_indices.shape).ravel()
+            )
+            new_values.append(np.broadcast_to(new_value, atom_indices.shape).ravel())
+        if sum(map(len, indices)) == 0:
+            # Nothing was painted, e.g. the pixels already had the new label
+            return cls(shape, [], [], [])
+        indices = np.concatenate(indices)
+        old_values = np.concatenate(old_values)
+        new_values = np.concatenate(new_values)
+
+        # Keep the first value before and the last value after the change of every pixel
+        order = np.argsort(indices, kind="stable")
+        indices, old_values, new_values = (
+            indices[order],
+            old_values[order],
+            new_values[order],
+        )
+        is_first = np.r_[True, indices[1:] != indices[:-1]]
+        is_last = np.r_[indices[1:] != indices[:-1], True]
+        new_values = new_values[is_last]
+        if np.all(new_values == new_values[0]):
+            new_values = new_values[0]
+        return cls(shape, indices[is_first], old_values[is_first], new_values)
+
+    def apply(self, data, reverse=False):
+        """
+        Writes the change to a label volume
+
+        Parameters
+        ----------
+        data : nd array
+            the label volume, changed in place
+        reverse : bool
+            whether to revert the change instead
+
+        Returns
+        -------
+        nd array
+            the frames that changed
+        """
+        if len(self.starts) == 0:
+            return np.zeros(0, dtype=np.int64)
+        flat_indices = _decode_runs(self.starts, self.lengths)
+        values = np.broadcast_to(
+            self.old_values if reverse else self.new_values, flat_indices.shape
+        )
+        frame_size = int(np.prod(self.shape[1:]))
+        frames = flat_indices // frame_size
+        changed_frames = np.unique(frames)
+        bounds = np.searchsorted(frames, np.append(changed_frames, frames[-1] + 1))
+        for frame, start, stop in zip(changed_frames, bounds[:-1], bounds[1:]):
+            label_slice = np.asarray(data[frame])
+            label_slice.flat[flat_indices[start:stop] - frame * frame_size] = values[
+                start:stop
+            ]
+            data[frame] = label_slice
+        return changed_frames
+
+
+class TracksDiff:
+    """
+    Change of a tracks array, stored as the rows that were removed and added
+    """
+
+    def __init__(self, removed, added, existed=True, exists=True):
+        """
+        Parameters
+        ----------
+        removed : nd array
+            (N,4) shape array of the removed rows
+        added : nd array
+            (M,4) shape array of the added rows
+        existed : bool
+            whether there were tracks before the change
+        exists : bool
+            whether there are tracks after the change
+        """
+        self.removed = removed
+        self.added = added
+        self.existed = existed
+        self.exists = exists
+
+    def apply(self, tracks, reverse=False):
+        """
+        Applies the change to a tracks array
+
+        Parameters
+        ----------
+        tracks : nd array
+            (N,4) shape array of the tracks, sorted by ID and Z, or None if there are no tracks
+        reverse : bool
+            whether to revert the change instead
+
+        Returns
+        -------
+        nd array
+            the changed tracks, None if there are no tracks after the change
+        """
+        removed, added, exists = self.removed, self.added, self.exists
+        if reverse:
+            removed, added, exists = self.added, self.removed, self.existed
+        if not exists:
+            return None
+        if tracks is None:
+            tracks = np.zeros((0, 4), dtype=added.dtype)
+        if len(removed) > 0:
+            tracks = tracks[~np.isin(_as_records(tracks), _as_records(removed))]
+        return insert_entries(tracks, added)
+
+
+def diff_tracks(before, after):
+    """
+    Calculates the change between two versions of a tracks array
+
+    Parameters
+    ----------
+    before : nd array
+        (N,4) shape array of the tracks before the change, or None
+    after : nd array
+        (M,4) shape array of the tracks after the change, or None
+
+    Returns
+    -------
+    TracksDiff
+        the change
+    """
+    existed, exists = before is not None, after is not None
+    dtype = after.dtype if exists else before.dtype if existed else np.int64
+    before = np.zeros((0, 4), dtype=dtype) if before is None else np.asarray(before)
+    after = np.zeros((0, 4), dtype=dtype) if after is None else np.asarray(after)
+
+    # Edits only touch a few rows, skip the rows both versions start and end with
+    length = min(len(before), len(after))
+    same = np.all(before[:length] == after[:length], axis=1)
+    prefix = length if np.all(same) else int(np.argmin(same))
+    length -= prefix
+    same = np.all(
+        before[len(before) - length :][::-1] == after[len(after) - length :][::-1],
+        axis=1,
+    )
+    suffix = length if np.all(same) else int(np.argmin(same))
+    before = before[prefix : len(before) - suffix]
+    after = after[prefix : len(after) - suffix]
+
+    before_records, after_records = _as_records(before), _as_records(after)
+    removed = before[~np.isin(before_records, after_records)]
+    added = after[~np.isin(after_records, before_records)]
+    return TracksDiff(removed, added, existed, exists)
+
+
+class EditJournal:
+    """
+    Undo and redo history of the edits of the segmentation and the tracks.
+    Every entry holds the compact changes of one edit, so the state before all edits
+    can be restored without keeping copies of the data.
+    """
+
+    def __init__(self):
+        self.undo_stack = []
+        self.redo_stack = []
+        self.labels_layer = None
+        self.pending = None
+
+    def reset(self, labels_layer=None, undo=None, redo=None):
+        """
+        Discards the history and starts recording the painting on a labels layer
+
+        Parameters
+        ----------
+        labels_layer : napari.layers.Labels
+            the labels layer to record, None to only record tracks
+        undo : callable, optional
+            replaces the built-in undo of the labels layer, so napari's undo goes through the journal
+        redo : callable, optional
+            replaces the built-in redo of the labels layer
+        """
+        if self.labels_layer is not None:
+            self.labels_layer.events.paint.disconnect(self._on_paint)
+            # Restore the built-in undo and redo of the layer
+            for name in ("undo", "redo"):
+                self.labels_layer.__dict__.pop(name, None)
+        self.undo_stack = []
+        self.redo_stack = []
+        self.labels_layer = labels_layer
+        if labels_layer is not None:
+            labels_layer.events.paint.connect(self._on_paint)
+            if undo is not None:
+                labels_layer.undo = undo
+            if redo is not None:
+                labels_layer.redo = redo
+
+    def _on_paint(self, event):
+        """
+        Records the change of a paint event on the labels layer
+        """
+        change = LabelsDiff.from_paint(event.value, self.labels_layer.data.shape)
+        if len(change.starts) > 0:
+            self.record(change)
+
+    def record(self, change):
+        """
+        Records a change, as part of the current operation if there is one
+
+        Parameters
+        ----------
+        change : LabelsDiff or TracksDiff
+            the change
+        """
+        if self.pending is not None:
+            self.pending.append(change)
+            return
+        self.undo_stack.append([change])
+        self.redo_stack = []
+
+    @contextmanager
+    def operation(self):
+        """
+        Groups all changes recorded inside the context into one entry
+        """
+        if self.pending is not None:
+            yield
+            return
+        self.pending = []
+        try:
+            yield
+        finally:
+            changes, self.pending = self.pending, None
+            if changes:
+                self.undo_stack.append(changes)
+                self.redo_stack = []
+
+    def undo(self):
+        """
+        Moves the latest entry to the redo stack
+
+        Returns
+        -------
+        list
+            the changes of the entry, None if there is nothing to undo
+        """
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        self.redo_stack.append(entry)
+        return entry
+
+    def redo(self):
+        """
+        Moves the latest undone entry back to the undo stack
+
+        Returns
+        -------
+        list
+            the changes of the entry, None if there is nothing to redo
+        """
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.undo_stack.append(entry)
+        return entry
+
+    def get_initial_labels(self, data):
+        """
+        Reconstructs the label volume before all recorded edits
+
+        Parameters
+        ----------
+        data : nd array
+            the current label volume
+
+        Returns
+        -------
+        nd array or LazyFrames
+            copy of the label volume with all recorded edits reverted,
+            lazily loaded volumes stay lazy and only the edited frames are read
+        """
+        labels = data.copy() if isinstance(data, LazyFrames) else np.array(data)
+        for entry in reversed(self.undo_stack):
+            for change in reversed(entry):
+                if isinstance(change, LabelsDiff):
+                    change.apply(labels, reverse=True)
+        return labels
+
+    def get_initial_tracks(self, tracks):
+        """
+        Reconstructs the tracks before all recorded edits
+
+        Parameters
+        ----------
+        tracks : nd array
+            the current tracks, sorted by ID and Z
+
+        Returns
+        -------
+        nd array
+            the tracks with all recorded edits reverted
+        """
+        for entry in reversed(self.undo_stack):
+            for change in reversed(entry):
+                if isinstance(change, TracksDiff):
+                    tracks = change.apply(tracks, reverse=True)
+        return tracks
+
+
+def _encode_runs(flat_indices):
+    """
+    Compresses sorted flat indices into runs of consecutive indices
+
+    Parameters
+    ----------
+    flat_indices : nd array
+        the sorted flat indices
+
+    Returns
+    -------
+    starts : nd array
+        the first index of every run
+    lengths : nd array
+        the length of every run
+    """
+    flat_indices = np.asarray(flat_indices, dtype=np.int64)
+    if len(flat_indices) == 0:
+        return flat_indices, flat_indices
+    breaks = np.flatnonzero(np.diff(flat_indices) != 1) + 1
+    starts = flat_indices[np.r_[0, breaks]]
+    lengths = np.diff(np.r_[0, breaks, len(flat_indices)])
+    return starts, lengths
+
+
+def _decode_runs(starts, lengths):
+    """
+    Expands runs of consecutive indices back into the flat indices
+
+    Parameters
+    ----------
+    starts : nd array
+        the first index of every run
+    lengths : nd array
+        the length of every run
+
+    Returns
+    -------
+    nd array
+        the flat indices
+    """
+    offsets = starts - np.cumsum(np.r_[0, lengths[:-1]])
+    return np.repeat(offsets, lengths) + np.arange(np.sum(lengths))
+
+
+def _as_records(tracks):
+    """
+    Returns a view of a tracks array with one record per row, so rows can be compared as a whole
+    """
+    tracks = np.ascontiguousarray(tracks)
+    return tracks.view([("", tracks.dtype)] * tracks.shape[1]).ravel()
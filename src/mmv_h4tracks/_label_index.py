@@ -0,0 +1,213 @@
+import weakref
+
+import numpy as np
+
+# Label indices of the labels layers, kept up to date with painting on the layer
+_LAYER_INDICES = weakref.WeakKeyDictionary()
+
+
+class LabelIndex:
+    """
+    Index of the pixels of every label in a label volume.
+    The pixels of a frame are grouped by label once, when the frame is first accessed,
+    so the pixels of a label can be looked up without scanning the frame.
+    """
+
+    def __init__(self, data):
+        """
+        Parameters
+        ----------
+        data : nd array
+            (z,y,x) shape array, which follows napari's labelslayer format
+        """
+        self.data = data
+        self.frames = {}
+
+    def get_frame_index(self, frame):
+        """
+        Returns the index of a frame, building it if necessary
+
+        Parameters
+        ----------
+        frame : int
+            the frame
+
+        Returns
+        -------
+        labels : nd array
+            the labels present in the frame, sorted
+        offsets : nd array
+            the pixels of labels[i] are order[offsets[i]:offsets[i + 1]]
+        order : nd array
+            the flat pixel indices of the frame, grouped by label in ascending order
+        """
+        frame = int(frame)
+        if not frame in self.frames:
+            flat_labels = np.asarray(self.data[frame]).ravel()
+            order = np.argsort(flat_labels, kind="stable")
+            labels, starts = np.unique(flat_labels[order], return_index=True)
+            offsets = np.append(starts, len(flat_labels))
+            self.frames[frame] = (labels, offsets, order)
+        return self.frames[frame]
+
+    def get_pixels(self, frame, label):
+        """
+        Returns the flat indices of the pixels of a label, in ascending order
+
+        Parameters
+        ----------
+        frame : int
+            the frame
+        label : int
+            the label
+
+        Returns
+        -------
+        nd array
+            the flat pixel indices, empty if the label is not in the frame
+        """
+        labels, offsets, order = self.get_frame_index(frame)
+        position = np.searchsorted(labels, label)
+        if position == len(labels) or labels[position] != label:
+            return order[0:0]
+        return order[offsets[position] : offsets[position + 1]]
+
+    def get_locations(self, frame, label):
+        """
+        Returns the locations of the pixels of a label, like np.where(slice == label)
+
+        Parameters
+        ----------
+        frame : int
+            the frame
+        label : int
+            the label
+
+        Returns
+        -------
+        tuple
+            the y and x coordinates of the pixels
+        """
+        return np.unravel_index(
+            self.get_pixels(frame, label), np.shape(self.data[int(frame)])
+        )
+
+    def get_area(self, frame, label):
+        """
+        Returns the amount of pixels of a label
+
+        Parameters
+        ----------
+        frame : int
+            the frame
+        label : int
+            the label
+
+        Returns
+        -------
+        int
+            the amount of pixels
+        """
+        return len(self.get_pixels(frame, label))
+
+    def invalidate(self, frames=None):
+        """
+        Discards the index of the given frames, or of all frames
+
+        Parameters
+        ----------
+        frames : iterable, optional
+            the frames that changed
+        """
+        if frames is None:
+            self.frames.clear()
+            return
+        for frame in frames:
+            self.frames.pop(int(frame), None)
+
+
+def get_label_index(layer):
+    """
+    Returns the label index of a labels layer. The index is kept between calls
+    and updated when the layer is painted on or its data is replaced.
+
+    Parameters
+    ----------
+    layer : napari.layers.Labels
+        the labels layer
+
+    Returns
+    -------
+    LabelIndex
+        the label index of the layer data
+    """
+    index = _LAYER_INDICES.get(layer)
+    if index is None:
+        index = LabelIndex(layer.data)
+        _LAYER_INDICES[layer] = index
+        layer.events.paint.connect(_on_paint)
+        layer.events.data.connect(_on_data)
+    elif index.data is not layer.data:
+        index.data = layer.data
+        index.invalidate()
+    return index
+
+
+def _on_paint(event):
+    """
+    Discards the index of the frames that were painted on
+    """
+    index = _LAYER_INDICES.get(event.source)
+    if index is None:
+        return
+    # The first entry of every paint atom holds the painted indices along each axis
+    for atom in event.value:
+        index.invalidate(_get_changed_frames(atom[0][0], len(index.data)))
+
+
+def _on_data(event):
+    """
+    Discards the index after the data of the layer was replaced
+    """
+    index = _LAYER_INDICES.get(event.source)
+    if index is None:
+        return
+    index.data = event.source.data
+    index.invalidate()
+
+
+def _get_changed_frames(frame_indices, amount_of_frames):
+    """
+    Returns the frames addressed by the frame indices of a paint event
+
+    Parameters
+    ----------
+    frame_indices : int, slice or nd array
+        the indices along the first axis
+    amount_of_frames : int
+        the amount of frames of the data
+
+    Returns
+    -------
+    iterable
+        the frames
+    """
+    if isinstance(frame_indices, slice):
+        return range(*frame_indices.indices(amount_of_frames))
+    return np.unique(frame_indices)
+
+
+def invalidate_label_index(layer, frames=None):
+    """
+    Discards the index of frames of a labels layer that were changed without a paint event
+
+    Parameters
+    ----------
+    layer : napari.layers.Labels
+        the labels layer
+    frames : iterable, optional
+        the frames that changed, all frames if None
+    """
+    index = _LAYER_INDICES.get(layer)
+    if index is not None:
+        index.invalidate(frames)
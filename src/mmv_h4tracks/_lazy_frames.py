@@ -0,0 +1,190 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Amount of unchanged frames kept in memory after they were read
+MAX_CACHED_FRAMES = 16
+
+
+class LazyFrames:
+    """
+    Editable label volume backed by an on-disk array, e.g. a zarr dataset.
+    Frames are only read when they are accessed. Changed frames are kept in memory
+    until they are written back, the file itself is never changed.
+    """
+
+    def __init__(self, source, max_cached_frames=MAX_CACHED_FRAMES, dtype=None):
+        """
+        Parameters
+        ----------
+        source : array
+            (z,y,x) shape array the frames are read from
+        max_cached_frames : int
+            the amount of unchanged frames to keep in memory
+        dtype : dtype, optional
+            the dtype of the frames in memory, the dtype of the source if None
+        """
+        self.source = source
+        self.shape = tuple(source.shape)
+        self.dtype = np.dtype(source.dtype if dtype is None else dtype)
+        self.ndim = len(self.shape)
+        self.max_cached_frames = max_cached_frames
+        self.changed_frames = {}
+        self.cached_frames = OrderedDict()
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        for frame in range(len(self)):
+            yield self.get_frame(frame)
+
+    def __array__(self, dtype=None, copy=None):
+        data = np.asarray(self.source[:], dtype=self.dtype)
+        for frame, label_slice in self.changed_frames.items():
+            data[frame] = label_slice
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def get_frame(self, frame):
+        """
+        Returns a frame, reading it if it is not in memory
+
+        Parameters
+        ----------
+        frame : int
+            the frame
+
+        Returns
+        -------
+        nd array
+            the frame
+        """
+        frame = range(len(self))[frame]
+        if frame in self.changed_frames:
+            return self.changed_frames[frame]
+        if frame in self.cached_frames:
+            self.cached_frames.move_to_end(frame)
+            return self.cached_frames[frame]
+        label_slice = np.array(self.source[frame], dtype=self.dtype)
+        self.cached_frames[frame] = label_slice
+        while len(self.cached_frames) > self.max_cached_frames:
+            self.cached_frames.popitem(last=False)
+        return label_slice
+
+    def get_writable_frame(self, frame):
+        """
+        Returns a frame that is about to be changed, it is kept in memory from now on
+
+        Parameters
+        ----------
+        frame : int
+            the frame
+
+        Returns
+        -------
+        nd array
+            the frame
+        """
+        frame = range(len(self))[frame]
+        label_slice = self.get_frame(frame)
+        self.cached_frames.pop(frame, None)
+        self.changed_frames[frame] = label_slice
+        return label_slice
+
+    def copy(self):
+        """
+        Returns a copy that reads from the same source, only the changed frames are copied
+
+        Returns
+        -------
+        LazyFrames
+            the copy
+        """
+        frames = LazyFrames(self.source, self.max_cached_frames, self.dtype)
+        frames.changed_frames = {
+            frame: label_slice.copy()
+            for frame, label_slice in self.changed_frames.items()
+        }
+        return frames
+
+    def max(self, axis=None, out=None, **kwargs):
+        """
+        Returns the largest label, reading one frame at a time
+        """
+        if axis is not None or out is not None:
+            return np.asarray(self).max(axis=axis, out=out, **kwargs)
+        return max((label_slice.max() for label_slice in self), default=0)
+
+    def __getitem__(self, key):
+        frame_key, rest = self._split_key(key)
+        if isinstance(frame_key, (int, np.integer)):
+            return self.get_frame(frame_key)[rest]
+        if isinstance(frame_key, slice):
+            frames = range(len(self))[frame_key]
+            if len(frames) == 0:
+                return np.zeros((0,) + self.shape[1:], self.dtype)[
+                    (slice(None),) + rest
+                ]
+            return np.stack([self.get_frame(frame)[rest] for frame in frames])
+        frame_key = np.asarray(frame_key)
+        if frame_key.dtype == bool or not self._is_point_key(rest):
+            return np.asarray(self)[(frame_key,) + rest]
+        frame_key, *rest = np.broadcast_arrays(frame_key, *rest)
+        values = np.empty(frame_key.shape, self.dtype)
+        for frame in np.unique(frame_key):
+            in_frame = frame_key == frame
+            values[in_frame] = self.get_frame(frame)[
+                tuple(indices[in_frame] for indices in rest)
+            ]
+        return values
+
+    def __setitem__(self, key, value):
+        frame_key, rest = self._split_key(key)
+        if isinstance(frame_key, (int, np.integer)):
+            self.get_writable_frame(frame_key)[rest] = value
+            return
+        if isinstance(frame_key, slice):
+            frames = range(len(self))[frame_key]
+            region_shape = (len(frames),) + np.empty(self.shape[1:], bool)[rest].shape
+            value = np.broadcast_to(value, region_shape)
+            for position, frame in enumerate(frames):
+                self.get_writable_frame(frame)[rest] = value[position]
+            return
+        frame_key = np.asarray(frame_key)
+        if frame_key.dtype == bool or not self._is_point_key(rest):
+            raise IndexError("Only integer point indices are supported for assignment")
+        frame_key, *rest = np.broadcast_arrays(frame_key, *rest)
+        value = np.broadcast_to(value, frame_key.shape)
+        for frame in np.unique(frame_key):
+            in_frame = frame_key == frame
+            self.get_writable_frame(frame)[
+                tuple(indices[in_frame] for indices in rest)
+            ] = value[in_frame]
+
+    def _split_key(self, key):
+        """
+        Splits an index into the index along the frames and the index within the frames
+        """
+        key = key if isinstance(key, tuple) else (key,)
+        if any(entry is Ellipsis for entry in key):
+            position = next(i for i, entry in enumerate(key) if entry is Ellipsis)
+            missing = self.ndim - len(key) + 1
+            key = key[:position] + (slice(None),) * missing + key[position + 1 :]
+        if len(key) == 0:
+            return slice(None), ()
+        return key[0], tuple(key[1:])
+
+    def _is_point_key(self, rest):
+        """
+        Returns whether the index within the frames selects single pixels
+        """
+        return len(rest) == self.ndim - 1 and all(
+            not isinstance(indices, slice) and np.asarray(indices).dtype != bool
+            for indices in rest
+        )
@@ -0,0 +1,337 @@
+import zlib
+
+import numpy as np
+
+
+class TrackGroups:
+    """
+    Rows of a tracks array grouped by track ID.
+    The tracks are sorted once, after that every per-track value is a reduction over
+    contiguous segments instead of a search through the whole array.
+    """
+
+    def __init__(self, tracks):
+        """
+        Parameters
+        ----------
+        tracks : nd array
+            (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+        """
+        tracks = np.asarray(tracks)
+        self.order = np.argsort(tracks[:, 0], kind="stable")
+        self.tracks = tracks[self.order]
+        self.ids, self.starts, self.counts = np.unique(
+            self.tracks[:, 0], return_index=True, return_counts=True
+        )
+        self.track_index = np.repeat(np.arange(len(self.ids)), self.counts)
+        self.first = self.tracks[self.starts]
+        self.last = self.tracks[self.starts + self.counts - 1]
+        self._steps = None
+
+    def get_steps(self):
+        """
+        Returns the distance between consecutive positions of every track
+
+        Returns
+        -------
+        steps : nd array
+            the length of every step
+        step_index : nd array
+            the index of the track of every step
+        """
+        if self._steps is None:
+            steps = np.hypot(*np.diff(self.tracks[:, 2:4], axis=0).T)
+            within_track = self.track_index[1:] == self.track_index[:-1]
+            self._steps = steps[within_track], self.track_index[:-1][within_track]
+        return self._steps
+
+    def sum(self, values, index=None):
+        """
+        Sums values per track
+
+        Parameters
+        ----------
+        values : nd array
+            the values, one per row of the sorted tracks unless an index is given
+        index : nd array, optional
+            the index of the track of every value
+
+        Returns
+        -------
+        nd array
+            the sum of every track
+        """
+        if index is None:
+            index = self.track_index
+        return np.bincount(index, weights=values, minlength=len(self.ids))
+
+    def mean_std(self, values, index=None):
+        """
+        Calculates mean and standard deviation of values per track, NaN for tracks without values
+
+        Parameters
+        ----------
+        values : nd array
+            the values, one per row of the sorted tracks unless an index is given
+        index : nd array, optional
+            the index of the track of every value
+
+        Returns
+        -------
+        mean : nd array
+            the mean of every track
+        std : nd array
+            the standard deviation of every track
+        """
+        if index is None:
+            index = self.track_index
+        counts = np.bincount(index, minlength=len(self.ids))
+        mean = np.full(len(self.ids), np.nan)
+        np.divide(self.sum(values, index), counts, out=mean, where=counts > 0)
+        variance = np.full(len(self.ids), np.nan)
+        np.divide(
+            self.sum(np.square(values - mean[index]), index),
+            counts,
+            out=variance,
+            where=counts > 0,
+        )
+        return mean, np.sqrt(variance)
+
+
+def calculate_speed(tracks, groups=None):
+    """
+    Calculates the speed of each track
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    groups : TrackGroups, optional
+        the grouped tracks, to share them between metrics
+
+    Returns
+    -------
+    nd array
+        (N,3) shape array, which contains the ID, average speed and standard deviation of speed
+    """
+    groups = TrackGroups(tracks) if groups is None else groups
+    average, std_deviation = groups.mean_std(*groups.get_steps())
+    return np.column_stack(
+        [groups.ids, np.around(average, 3), np.around(std_deviation, 3)]
+    )
+
+
+def calculate_direction(tracks, groups=None):
+    """
+    Calculates the angle [°] of each trajectory
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    groups : TrackGroups, optional
+        the grouped tracks, to share them between metrics
+
+    Returns
+    -------
+    nd array
+        (N,4) shape array, which contains the ID, Δx, Δy and direction
+    """
+    groups = TrackGroups(tracks) if groups is None else groups
+    x = groups.last[:, 3] - groups.first[:, 3]
+    y = groups.first[:, 2] - groups.last[:, 2]
+    direction = 180 + np.arctan(y / np.where(x == 0, 1, x)) / np.pi * 180
+    direction[x > 0] += 180
+    direction[direction >= 360] -= 360
+    direction = np.where(
+        x == 0, np.select([y < 0, y > 0], [270, 90], 0), np.around(direction, 3)
+    )
+    return np.column_stack([groups.ids, x, y, direction])
+
+
+def calculate_euclidean_distance(tracks, groups=None):
+    """
+    Calculates the euclidean distance of each trajectory
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    groups : TrackGroups, optional
+        the grouped tracks, to share them between metrics
+
+    Returns
+    -------
+    nd array
+        (N,3) shape array, which contains the ID, euclidean distance and track length
+    """
+    groups = TrackGroups(tracks) if groups is None else groups
+    x = groups.last[:, 3] - groups.first[:, 3]
+    y = groups.first[:, 2] - groups.last[:, 2]
+    euclidean_distance = np.around(np.sqrt(np.square(x) + np.square(y)), 3)
+    return np.column_stack([groups.ids, euclidean_distance, groups.counts])
+
+
+def calculate_velocity(tracks, groups=None):
+    """
+    Calculates the velocity of each trajectory
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    groups : TrackGroups, optional
+        the grouped tracks, to share them between metrics
+
+    Returns
+    -------
+    nd array
+        (N,3) shape array, which contains the ID, velocity and ID again
+    """
+    groups = TrackGroups(tracks) if groups is None else groups
+    euclidean_distance = calculate_euclidean_distance(tracks, groups)[:, 1]
+    directed_speed = np.around(euclidean_distance / groups.counts, 3)
+    return np.column_stack([groups.ids, directed_speed, groups.ids])
+
+
+def calculate_accumulated_distance(tracks, groups=None):
+    """
+    Calculates the accumulated distance of each trajectory
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    groups : TrackGroups, optional
+        the grouped tracks, to share them between metrics
+
+    Returns
+    -------
+    nd array
+        (N,3) shape array, which contains the ID, accumulated distance and track length
+    """
+    groups = TrackGroups(tracks) if groups is None else groups
+    accumulated_distance = np.around(groups.sum(*groups.get_steps()), 3)
+    return np.column_stack([groups.ids, accumulated_distance, groups.counts])
+
+
+def calculate_track_duration(tracks, groups=None):
+    """
+    Calculates the duration of each track
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    groups : TrackGroups, optional
+        the grouped tracks, to share them between metrics
+
+    Returns
+    -------
+    nd array
+        (N,2) shape array, which contains the ID and the amount of frames of the track
+    """
+    groups = TrackGroups(tracks) if groups is None else groups
+    return np.column_stack([groups.ids, groups.counts])
+
+
+def calculate_track_statistics(tracks, values, groups=None):
+    """
+    Calculates average and standard deviation of a value given for every row of the tracks
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    values : nd array
+        (N,) shape array of values, in the order of the rows of the tracks
+    groups : TrackGroups, optional
+        the grouped tracks, to share them between metrics
+
+    Returns
+    -------
+    nd array
+        (N,3) shape array, which contains the ID, average and standard deviation
+    """
+    groups = TrackGroups(tracks) if groups is None else groups
+    average, std_deviation = groups.mean_std(np.asarray(values)[groups.order])
+    return np.column_stack(
+        [groups.ids, np.around(average, 3), np.around(std_deviation, 3)]
+    )
+
+
+def calculate_directness(euclidean_distance, accumulated_distance):
+    """
+    Calculates the directness of each trajectory
+
+    Parameters
+    ----------
+    euclidean_distance : nd array
+        (N,3) shape array, as returned by calculate_euclidean_distance
+    accumulated_distance : nd array
+        (N,3) shape array, as returned by calculate_accumulated_distance
+
+    Returns
+    -------
+    nd array
+        (N,2) shape array, which contains the ID and directness
+    """
+    directness = np.zeros(len(euclidean_distance))
+    np.divide(
+        euclidean_distance[:, 1],
+        accumulated_distance[:, 1],
+        out=directness,
+        where=accumulated_distance[:, 1] > 0,
+    )
+    return np.around(np.column_stack([euclidean_distance[:, 0], directness]), 3)
+
+
+def get_tracks_fingerprint(tracks):
+    """
+    Returns a fingerprint of the content of a tracks array, to recognize unchanged tracks
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+
+    Returns
+    -------
+    tuple
+        shape, dtype and checksum of the tracks
+    """
+    tracks = np.ascontiguousarray(tracks)
+    return tracks.shape, tracks.dtype.str, zlib.crc32(tracks.data)
+
+
+# Motility metrics that only depend on the tracks
+MOTILITY_METRICS = {
+    "Speed": calculate_speed,
+    "Direction": calculate_direction,
+    "Euclidean distance": calculate_euclidean_distance,
+    "Velocity": calculate_velocity,
+    "Accumulated distance": calculate_accumulated_distance,
+    "Track duration": calculate_track_duration,
+}
+
+
+def calculate_motility_metrics(tracks, metrics=None):
+    """
+    Calculates motility metrics of all tracks, sorting the tracks only once
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    metrics : list, optional
+        the names of the metrics, see MOTILITY_METRICS, all if None
+
+    Returns
+    -------
+    dict
+        the result of every metric
+    """
+    if metrics is None:
+        metrics = list(MOTILITY_METRICS)
+    groups = TrackGroups(tracks)
+    return {metric: MOTILITY_METRICS[metric](tracks, groups) for metric in metrics}
@@ -0,0 +1,254 @@
+import weakref
+
+import numpy as np
+from skimage import measure
+
+from ._label_index import _get_changed_frames
+from ._shared import SharedArray, attach_shared_array
+
+# One row per label of a frame, sorted by frame and label
+MORPHOLOGY_DTYPE = np.dtype(
+    [
+        ("frame", np.int32),
+        ("label", np.int64),
+        ("area", np.float64),
+        ("perimeter", np.float64),
+        ("eccentricity", np.float64),
+    ]
+)
+
+# Morphology tables of the labels layers, kept up to date with painting on the layer
+_LAYER_TABLES = weakref.WeakKeyDictionary()
+
+
+def calculate_frame_morphology(label_slice, frame=0):
+    """
+    Calculates area, perimeter and eccentricity of all labels of a 2D slice in one pass
+
+    Parameters
+    ----------
+    label_slice : nd array
+        (y,x) shape array of labels
+    frame : int
+        the frame the slice belongs to
+
+    Returns
+    -------
+    nd array
+        the properties as MORPHOLOGY_DTYPE array, sorted by label
+    """
+    properties = measure.regionprops_table(
+        np.asarray(label_slice),
+        properties=("label", "area", "perimeter", "eccentricity"),
+    )
+    morphology = np.zeros(len(properties["label"]), dtype=MORPHOLOGY_DTYPE)
+    morphology["frame"] = frame
+    for name in ["label", "area", "perimeter", "eccentricity"]:
+        morphology[name] = properties[name]
+    return morphology
+
+
+def calculate_shared_frame_morphology(descriptor, position, frame):
+    """
+    Calculates the morphology of a frame of a label volume in shared memory
+
+    Parameters
+    ----------
+    descriptor : tuple
+        the descriptor of the SharedArray holding the frames
+    position : int
+        the position of the frame in the shared array
+    frame : int
+        the frame the slice belongs to
+
+    Returns
+    -------
+    nd array
+        the properties as MORPHOLOGY_DTYPE array
+    """
+    return calculate_frame_morphology(attach_shared_array(descriptor)[position], frame)
+
+
+class MorphologyTable:
+    """
+    Area, perimeter and eccentricity of every label of a label volume.
+    Frames are measured once, when they are first needed, and kept until they change.
+    """
+
+    def __init__(self, data):
+        """
+        Parameters
+        ----------
+        data : nd array
+            (z,y,x) shape array, which follows napari's labelslayer format
+        """
+        self.data = data
+        self.frames = {}
+        # Counts the changes of the data, so results derived from it can be invalidated
+        self.version = 0
+
+    def get_table(self, frames=None, pool=None):
+        """
+        Returns the properties of the labels of the given frames, measuring missing frames
+
+        Parameters
+        ----------
+        frames : iterable, optional
+            the frames, all frames if None
+        pool : Pool, optional
+            the worker pool to measure the missing frames with, serial if None
+
+        Returns
+        -------
+        nd array
+            the properties as MORPHOLOGY_DTYPE array, sorted by frame and label
+        """
+        if frames is None:
+            frames = range(len(self.data))
+        frames = sorted({int(frame) for frame in frames})
+        missing_frames = [frame for frame in frames if frame not in self.frames]
+        if pool is not None and len(missing_frames) > 1:
+            with SharedArray(
+                np.stack([np.asarray(self.data[frame]) for frame in missing_frames])
+            ) as shared_frames:
+                tables = pool.starmap(
+                    calculate_shared_frame_morphology,
+                    [
+                        (shared_frames.descriptor, position, frame)
+                        for position, frame in enumerate(missing_frames)
+                    ],
+                )
+            self.frames.update(zip(missing_frames, tables))
+        else:
+            for frame in missing_frames:
+                self.frames[frame] = calculate_frame_morphology(self.data[frame], frame)
+        if not frames:
+            return np.zeros(0, dtype=MORPHOLOGY_DTYPE)
+        return np.concatenate([self.frames[frame] for frame in frames])
+
+    def invalidate(self, frames=None):
+        """
+        Discards the properties of frames that changed
+
+        Parameters
+        ----------
+        frames : iterable, optional
+            the frames that changed, all frames if None
+        """
+        self.version += 1
+        if frames is None:
+            self.frames.clear()
+            return
+        for frame in frames:
+            self.frames.pop(int(frame), None)
+
+
+def get_track_morphology(tracks, segmentation, table=None, pool=None):
+    """
+    Looks up area, perimeter and eccentricity of the label under every position of the tracks
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    segmentation : nd array
+        (z,y,x) shape array, which follows napari's labelslayer format
+    table : MorphologyTable, optional
+        the morphology table of the segmentation, to reuse measured frames
+    pool : Pool, optional
+        the worker pool to measure missing frames with
+
+    Returns
+    -------
+    nd array
+        (N,) shape MORPHOLOGY_DTYPE array, one entry per row of the tracks
+    """
+    if table is None:
+        table = MorphologyTable(segmentation)
+    z, y, x = np.asarray(tracks)[:, 1:4].T.astype(int)
+    labels = np.asarray(segmentation[z, y, x], dtype=np.int64)
+    morphology = table.get_table(z, pool)
+    key_stride = (
+        max(int(morphology["label"].max(initial=0)), int(labels.max(initial=0))) + 1
+    )
+    keys = morphology["frame"].astype(np.int64) * key_stride + morphology["label"]
+    query = z * key_stride + labels
+    rows = np.searchsorted(keys, query)
+    found = rows < len(keys)
+    found[found] = keys[rows[found]] == query[found]
+
+    result = np.zeros(len(labels), dtype=MORPHOLOGY_DTYPE)
+    result[found] = morphology[rows[found]]
+    # Positions on the background describe the background of their frame
+    for position in np.flatnonzero(~found):
+        frame, label = z[position], labels[position]
+        mask = np.asarray(segmentation[frame]) == label
+        result[position] = calculate_frame_morphology(mask.astype(int), frame)[0]
+        result[position]["label"] = label
+    return result
+
+
+def get_morphology_table(layer):
+    """
+    Returns the morphology table of a labels layer. The table is kept between calls
+    and updated when the layer is painted on or its data is replaced.
+
+    Parameters
+    ----------
+    layer : napari.layers.Labels
+        the labels layer
+
+    Returns
+    -------
+    MorphologyTable
+        the morphology table of the layer data
+    """
+    table = _LAYER_TABLES.get(layer)
+    if table is None:
+        table = MorphologyTable(layer.data)
+        _LAYER_TABLES[layer] = table
+        layer.events.paint.connect(_on_paint)
+        layer.events.data.connect(_on_data)
+    elif table.data is not layer.data:
+        table.data = layer.data
+        table.invalidate()
+    return table
+
+
+def invalidate_morphology_table(layer, frames=None):
+    """
+    Discards the morphology of frames of a labels layer that were changed without a paint event
+
+    Parameters
+    ----------
+    layer : napari.layers.Labels
+        the labels layer
+    frames : iterable, optional
+        the frames that changed, all frames if None
+    """
+    table = _LAYER_TABLES.get(layer)
+    if table is not None:
+        table.invalidate(frames)
+
+
+def _on_paint(event):
+    """
+    Discards the morphology of the frames that were painted on
+    """
+    table = _LAYER_TABLES.get(event.source)
+    if table is None:
+        return
+    # The first entry of every paint atom holds the painted indices along each axis
+    for atom in event.value:
+        table.invalidate(_get_changed_frames(atom[0][0], len(table.data)))
+
+
+def _on_data(event):
+    """
+    Discards the morphology after the data of the layer was replaced
+    """
+    table = _LAYER_TABLES.get(event.source)
+    if table is None:
+        return
+    table.data = event.source.data
+    table.invalidate()
@@ -0,0 +1,200 @@
+import numpy as np
+from scipy import ndimage
+
+# One row per object of a label volume, sorted by frame and label.
+# The bounding box is (min y, min x, max y, max x) with exclusive maxima.
+OBJECT_DTYPE = np.dtype(
+    [
+        ("frame", np.int32),
+        ("label", np.int64),
+        ("area", np.int64),
+        ("centroid_y", np.float64),
+        ("centroid_x", np.float64),
+        ("bbox", np.int32, (4,)),
+    ]
+)
+
+
+# Amount of pixels of the frames whose objects are calculated at once
+BLOCK_PIXELS = 2**24
+
+
+def calculate_frame_objects(label_slice, frame=0):
+    """
+    Calculates the objects of a 2D slice in a single pass over its pixels
+
+    Parameters
+    ----------
+    label_slice : nd array
+        (y,x) shape array of labels
+    frame : int
+        the frame the slice belongs to
+
+    Returns
+    -------
+    nd array
+        the objects of the slice as OBJECT_DTYPE array
+    """
+    return _calculate_block_objects(np.asarray(label_slice)[np.newaxis], frame)
+
+
+def calculate_object_table(segmentation):
+    """
+    Calculates frame, label, area, centroid and bounding box of every object in a label volume
+
+    Parameters
+    ----------
+    segmentation : nd array
+        (z,y,x) shape array, which follows napari's labelslayer format
+
+    Returns
+    -------
+    nd array
+        the objects as OBJECT_DTYPE array, sorted by frame and label
+    """
+    if len(segmentation) == 0:
+        return np.zeros(0, dtype=OBJECT_DTYPE)
+    frame_pixels = max(1, int(np.prod(np.shape(segmentation[0]))))
+    block_size = max(1, BLOCK_PIXELS // frame_pixels)
+    tables = [
+        _calculate_block_objects(
+            np.asarray(segmentation[start : start + block_size]), start
+        )
+        for start in range(0, len(segmentation), block_size)
+    ]
+    return np.concatenate(tables)
+
+
+def _calculate_block_objects(block, first_frame):
+    """
+    Calculates the objects of consecutive frames in a single pass over their pixels
+
+    Parameters
+    ----------
+    block : nd array
+        (z,y,x) shape array of labels
+    first_frame : int
+        the frame of the first slice of the block
+
+    Returns
+    -------
+    nd array
+        the objects of the frames as OBJECT_DTYPE array, sorted by frame and label
+    """
+    frames, height, width = block.shape
+    flat_labels = block.reshape(frames, height * width)
+    if flat_labels.size == 0 or flat_labels.max() <= 0:
+        return np.zeros(0, dtype=OBJECT_DTYPE)
+    labels = None
+    if flat_labels.max() > 4 * height * width:
+        # Sparse label values, compact them so the accumulation arrays stay small.
+        # The background keeps index 0, even if the frames have no background pixels
+        labels, flat_labels = np.unique(
+            np.r_[0, flat_labels.ravel()], return_inverse=True
+        )
+        flat_labels = flat_labels.ravel()[1:].reshape(frames, height * width)
+    # Every object gets its own key, the background of every frame a multiple of stride
+    stride = int(flat_labels.max()) + 1
+    keys = (np.arange(frames)[:, np.newaxis] * stride + flat_labels).ravel()
+    areas = np.bincount(keys)
+    present = np.flatnonzero(areas)
+    present = present[present % stride > 0]
+    rows = np.repeat(np.arange(height, dtype=np.float64), width)
+    cols = np.tile(np.arange(width, dtype=np.float64), height)
+    if len(areas) > keys.size:
+        # Few objects among many keys, compact the keys to the present objects
+        lookup = np.zeros(len(areas), dtype=np.int64)
+        lookup[present] = np.arange(1, len(present) + 1)
+        keys = lookup[keys]
+        indices = np.arange(1, len(present) + 1)
+    else:
+        indices = present
+    sum_y = np.bincount(keys, weights=np.tile(rows, frames))[indices]
+    sum_x = np.bincount(keys, weights=np.tile(cols, frames))[indices]
+    bounding_boxes = ndimage.find_objects(keys.reshape(block.shape))
+
+    objects = np.zeros(len(present), dtype=OBJECT_DTYPE)
+    objects["frame"] = first_frame + present // stride
+    label_indices = present % stride
+    objects["label"] = label_indices if labels is None else labels[label_indices]
+    objects["area"] = areas[present]
+    objects["centroid_y"] = sum_y / areas[present]
+    objects["centroid_x"] = sum_x / areas[present]
+    objects["bbox"] = [
+        (
+            bounding_boxes[index - 1][1].start,
+            bounding_boxes[index - 1][2].start,
+            bounding_boxes[index - 1][1].stop,
+            bounding_boxes[index - 1][2].stop,
+        )
+        for index in indices
+    ]
+    return objects
+
+
+def get_frame_objects(objects, frame):
+    """
+    Returns the objects of a single frame
+
+    Parameters
+    ----------
+    objects : nd array
+        OBJECT_DTYPE array sorted by frame
+    frame : int
+        the frame
+
+    Returns
+    -------
+    nd array
+        the objects of the frame
+    """
+    start, stop = np.searchsorted(objects["frame"], [frame, frame + 1])
+    return objects[start:stop]
+
+
+def get_object_rows(objects, frames, labels):
+    """
+    Returns the row of the objects with the given frames and labels
+
+    Parameters
+    ----------
+    objects : nd array
+        OBJECT_DTYPE array sorted by frame and label
+    frames : array
+        the frames of the objects
+    labels : array
+        the labels of the objects
+
+    Returns
+    -------
+    nd array
+        the row of each object in the table, -1 for objects that don't exist
+    """
+    frames = np.asarray(frames, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int64)
+    if len(objects) == 0:
+        return np.full(labels.shape, -1)
+    max_label = int(objects["label"].max())
+    keys = objects["frame"].astype(np.int64) * (max_label + 1) + objects["label"]
+    query = frames * (max_label + 1) + labels
+    rows = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    found = (labels > 0) & (labels <= max_label) & (keys[rows] == query)
+    return np.where(found, rows, -1)
+
+
+def get_rounded_centroids(objects):
+    """
+    Returns the centroids of the objects rounded to the nearest pixel
+
+    Parameters
+    ----------
+    objects : nd array
+        OBJECT_DTYPE array
+
+    Returns
+    -------
+    nd array
+        (N,2) shape int array of the (y,x) centroids
+    """
+    centroids = np.stack([objects["centroid_y"], objects["centroid_x"]], axis=1)
+    return np.rint(centroids).astype(int)
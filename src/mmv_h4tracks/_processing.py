@@ -1,14 +1,11 @@
-import multiprocessing
 import os
 import platform
-from multiprocessing import Pool, Manager
+from multiprocessing import Manager
 from threading import Event
-import json
 from pathlib import Path
 
 import napari
 import numpy as np
-from cellpose import models, core
 from napari.qt.threading import thread_worker
 from qtpy.QtCore import Qt
 from qtpy.QtWidgets import (
@@ -22,131 +19,17 @@ from qtpy.QtWidgets import (
     QVBoxLayout,
     QWidget,
 )
-from scipy import ndimage, optimize, spatial
-import torch
 
-from mmv_h4tracks import APPROX_INF, MAX_MATCHING_DIST
 from ._grabber import grab_layer
+from ._lazy_frames import LazyFrames
 from ._logger import choice_dialog, notify, handle_exception
+from .pipeline import (
+    CUSTOM_MODEL_PREFIX,
+    get_model_parameters,
+    segment_image,
+    track_segmentation,
+)
 
-CUSTOM_MODEL_PREFIX = "custom_"
-
-
-def segment_slice_cpu(layer_slice, parameters):
-    """
-    Parameters
-    ----------
-    layer_slice : nd array
-        the slice of raw image data to calculate segmentation for
-    parameters : dict
-        the parameters for the segmentation model
-
-    Returns
-    -------
-    nd array
-        the segmentation mask for the slice
-    """
-    model = models.CellposeModel(
-        gpu=False, pretrained_model=parameters["model_path"]
-    )
-    eval_params = parameters
-    eval_params.pop("model_path", None)
-    mask, _, _ = model.eval(layer_slice, **eval_params)
-    return mask
-
-
-def calculate_centroids(label_slice):
-    """
-    Calculate the centroids of objects in a 2D slice.
-
-    Parameters
-    ----------
-    label_slice : numpy.ndarray
-        A 2D numpy array representing the slice.
-
-    Returns
-    -------
-    tuple
-        A tuple containing two numpy arrays: the centroids and the labels.
-    """
-    labels = np.unique(label_slice)[1:]
-    centroids = ndimage.center_of_mass(label_slice, labels=label_slice, index=labels)
-
-    return (centroids, labels)
-
-
-def match_centroids(
-    slice_pair,
-):
-    """
-    Match centroids between two slices.
-
-    Parameters
-    ----------
-    slice_pair : tuple
-        A tuple containing two slices, each represented by a tuple
-        containing the centroids and IDs of cells in that slice.
-
-    Returns
-    -------
-    list
-        A list of matched pairs, where each pair consists of the centroid and ID
-    """
-    parent_centroids = slice_pair[0][0]
-    parent_ids = slice_pair[0][1]
-    child_centroids = slice_pair[1][0]
-    child_ids = slice_pair[1][1]
-
-    num_cells_parent = len(parent_centroids)
-    num_cells_child = len(child_centroids)
-
-    # calculate distance between each pair of cells
-    cost_mat = spatial.distance.cdist(parent_centroids, child_centroids)
-
-    # if the distance is too far, change to approx. Inf.
-    cost_mat[cost_mat > MAX_MATCHING_DIST] = APPROX_INF
-
-    # add edges from cells in previous frame to auxillary vertices
-    # in order to accomendate segmentation errors and leaving cells
-    cost_mat_aug = (
-        MAX_MATCHING_DIST
-        * 1.2
-        * np.ones((num_cells_parent, num_cells_child + num_cells_parent), dtype=float)
-    )
-    cost_mat_aug[:num_cells_parent, :num_cells_child] = cost_mat[:, :]
-
-    # solve the optimization problem
-    row_ind, col_ind = optimize.linear_sum_assignment(cost_mat_aug)
-
-    matched_pairs = []
-
-    for i in range(len(row_ind)):
-        parent_centroid = np.around(parent_centroids[row_ind[i]])
-        parent_id = parent_ids[row_ind[i]]
-        try:
-            child_centroid = np.around(child_centroids[col_ind[i]])
-            child_id = child_ids[col_ind[i]]
-        except:
-            continue
-
-        matched_pairs.append(
-            {
-                "parent": {"centroid": parent_centroid, "id": parent_id},
-                "child": {"centroid": child_centroid, "id": child_id},
-            }
-        )
-
-    return matched_pairs
-
-def read_custom_model_dict():
-    """
-    Reads the parameters of the custom models from the 'custom_models.json' file and returns them
-    """
-    try:
-        with open(Path(__file__).parent / "custom_models.json", "r") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
 
 def read_models(widget):
     """
@@ -164,6 +47,7 @@ def read_models(widget):
             custom_models.append(CUSTOM_MODEL_PREFIX + custom_model)
     return hardcoded_models, custom_models
 
+
 def display_models(widget, hardcoded_models, custom_models):
     """
     Adds the passed models to the segmentation combobox.
@@ -231,27 +115,17 @@ def _segment_image(widget, demo=False):
     selected_model = widget.combobox_segmentation.currentText()
     parameters = _get_parameters(widget, selected_model)
 
-    if core.use_gpu():
-        model = models.CellposeModel(
-            gpu=True, pretrained_model=parameters.pop("model_path")
-        )
-        mask = []
-        for layer_slice in data:
-            layer_mask, _, _ = model.eval(layer_slice, **parameters)
-            mask.append(layer_mask)
-        mask = np.array(mask)
-    else:
-        # set process limit
-        AMOUNT_OF_PROCESSES = widget.parent.get_process_limit()
-
-        data_with_parameters = [(layer_slice, parameters) for layer_slice in data]
-
-        with Pool(AMOUNT_OF_PROCESSES) as p:
-            mask = p.starmap(segment_slice_cpu, data_with_parameters)
-            mask = np.asarray(mask)
+    # Raw data of a loaded zarr file is streamed from disk into a temporary store
+    zarr_file = None if demo else getattr(widget.parent, "zarr", None)
+    mask = segment_image(data, parameters, widget.parent.get_process_limit(), zarr_file)
 
+    initial_mask = mask
+    if not isinstance(mask, np.ndarray):
+        # edits are kept in memory, the streamed masks stay the initial segmentation
+        initial_mask = LazyFrames(mask)
+        mask = LazyFrames(mask)
     if not demo:
-        widget.parent.initial_layers[0] = mask
+        widget.parent.initial_layers[0] = initial_mask
     QApplication.restoreOverrideCursor()
     return widget, mask
 
@@ -270,28 +144,7 @@ def _get_parameters(widget, model: str):
     dict
         a dictionary of all the parameters based on selected model
     """
-    # Hardcoded models
-    if model == "Neutrophil_granulocytes":
-        params = {
-            "model_path": str(Path(__file__).parent.absolute() / "models" / model),
-            "diameter": 15,
-            "channels": [0, 0],
-            "flow_threshold": 0.4,
-            "cellprob_threshold": 0,
-        }
-
-    model = model[len(CUSTOM_MODEL_PREFIX) :]
-    # Custom models
-    if model in widget.custom_models:
-        params = widget.custom_models[model]["params"]
-        params["model_path"] = str(
-            Path(__file__).parent.absolute()
-            / "models"
-            / "custom_models"
-            / widget.custom_models[model]["filename"]
-        )
-
-    return params
+    return get_model_parameters(model, widget.custom_models)
 
 
 @thread_worker(connect={"errored": handle_exception})
@@ -326,10 +179,7 @@ def _track_segmentation(widget):
             QApplication.restoreOverrideCursor()
             return
 
-    extended_centroids = _calculate_centroids_parallel(widget, data)
-    matches = _match_centroids_parallel(widget, extended_centroids)
-
-    tracks = _process_matches(matches)
+    tracks = track_segmentation(data, widget.parent.get_pool())
 
     QApplication.restoreOverrideCursor()
     return tracks
@@ -414,132 +264,3 @@ def _check_for_tracks_layer(widget):
     else:
         tracks_name = tracks_layer.name
     return tracks_name, collision
-
-
-def _calculate_processes_limit(widget):
-    """
-    Calculate the amount of processes to use for multiprocessing
-
-    Parameters
-    ----------
-    widget : QWidget
-        the widget containing the viewer and the comboboxes
-
-    Returns
-    -------
-    int
-        the amount of processes to use
-    """
-    if widget.parent.rb_eco.isChecked():
-        return max(1, int(multiprocessing.cpu_count() * 0.4))
-    else:
-        return max(1, int(multiprocessing.cpu_count() * 0.8))
-
-
-def _calculate_centroids_parallel(widget, data):
-    """
-    Calculate the centroids of objects in a 2D slice.
-    """
-    with Pool(_calculate_processes_limit(widget)) as p:
-        return p.map(calculate_centroids, data)
-
-
-def _match_centroids_parallel(widget, extended_centroids):
-    """
-    Match centroids between two slices.
-    """
-    slice_pairs = [
-        (extended_centroids[i - 1], extended_centroids[i])
-        for i in range(1, len(extended_centroids))
-    ]
-    with Pool(_calculate_processes_limit(widget)) as p:
-        return p.map(match_centroids, (slice_pairs))
-
-
-def _process_matches(matches):
-    """
-    Process the matches to create the tracks
-
-    Parameters
-    ----------
-    matches : list
-        the list of matches
-
-    Returns
-    -------
-    array
-        the tracks
-    """
-    # Initialize variables to store tracks, unique ID and visited cells
-    tracks = np.array([])
-    next_id = 0
-    visited = [[0] * len(matches[i]) for i in range(len(matches))]
-
-    # Helper function to append entry to tracks
-    def process_entry(entry, tracks):
-        """
-        Process an entry to add to the tracks"""
-        try:
-            tracks = np.append(tracks, np.array([entry]), axis=0)
-        except ValueError:
-            tracks = np.array([entry])
-        return tracks
-
-    # Create an iterator to traverse through all slices and cells
-    iterator = iter(
-        ((i, j) for i in range(len(visited)) for j in range(len(visited[i])))
-    )
-
-    # Iterate through slices and cells
-    for slice_id, cell_id in iterator:
-        if visited[slice_id][cell_id]:
-            continue
-
-        # Extract centroid information for parent and child cells
-        entry = [
-            next_id,
-            slice_id,
-            int(matches[slice_id][cell_id]["parent"]["centroid"][0]),
-            int(matches[slice_id][cell_id]["parent"]["centroid"][1]),
-        ]
-        tracks = process_entry(entry, tracks)
-
-        entry = [
-            next_id,
-            slice_id + 1,
-            int(matches[slice_id][cell_id]["child"]["centroid"][0]),
-            int(matches[slice_id][cell_id]["child"]["centroid"][1]),
-        ]
-        tracks = process_entry(entry, tracks)
-
-        visited[slice_id][cell_id] = 1
-        label = matches[slice_id][cell_id]["child"]["id"]
-
-        # Iterate through subsequent slices to complete the track
-        while True:
-            if slice_id + 1 >= len(matches):
-                break
-            labels = [
-                matches[slice_id + 1][matched_cell]["parent"]["id"]
-                for matched_cell in range(len(matches[slice_id + 1]))
-            ]
-
-            if not label in labels:
-                break
-
-            match_number = labels.index(label)
-            visited[slice_id + 1][match_number] = 1
-            entry = [
-                next_id,
-                slice_id + 2,
-                int(matches[slice_id + 1][match_number]["child"]["centroid"][0]),
-                int(matches[slice_id + 1][match_number]["child"]["centroid"][1]),
-            ]
-            tracks = process_entry(entry, tracks)
-            label = matches[slice_id + 1][match_number]["child"]["id"]
-
-            slice_id += 1
-
-        next_id += 1
-
-    return tracks.astype(int)
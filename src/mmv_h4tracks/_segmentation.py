@@ -14,12 +14,13 @@ from qtpy.QtWidgets import (
 from qtpy.QtCore import Qt
 from scipy import ndimage
 import napari
-import pandas as pd
 
 from ._logger import notify, handle_exception
 from ._grabber import grab_layer
 import mmv_h4tracks._processing as processing
+import mmv_h4tracks.pipeline as pipeline
 from .add_models import ModelWindow
+from ._tracks_table import TracksTable, get_tracks_table, relabel_rows
 
 
 class SegmentationWindow(QWidget):
@@ -51,7 +52,7 @@ class SegmentationWindow(QWidget):
         except TypeError:
             self.setStyleSheet(napari.qt.get_stylesheet(theme_id="dark"))
 
-        self.custom_models = processing.read_custom_model_dict()
+        self.custom_models = pipeline.read_custom_model_dict()
         # Used to cach the callback on the label layer
         self.cached_callback = None
 
@@ -220,10 +221,11 @@ class SegmentationWindow(QWidget):
         event : Event
             the event that triggered the callback
         """
-        self.remove_cell_from_tracks(event.position)
+        with self.parent.tracking_window.record_edit():
+            self.remove_cell_from_tracks(event.position)
 
-        # replace label with 0 to make it background
-        self._replace_label(event, 0)
+            # replace label with 0 to make it background
+            self._replace_label(event, 0)
 
     def remove_cell_from_tracks(self, position):
         """
@@ -274,21 +276,23 @@ class SegmentationWindow(QWidget):
             all_tracks.append(self.parent.tracking_window.cached_tracks)
         else:
             next_id = max(displayed_tracks[:, 0]) + 1
-        indices_to_delete = [[], []]
+        updated_tracks = list(all_tracks)
 
         for indicator, tracks in enumerate(all_tracks):
+            if indicator == 0:
+                tracks_table = get_tracks_table(tracks_layer)
+            else:
+                tracks_table = TracksTable(tracks)
             # find index of entry in displayed tracks
-            for i in range(len(tracks)):
-                if np.all(tracks[i, 1:4] == cell):
-                    index = i
-                    # get track id of that entry
-                    track_id = tracks[i][0]
-                    break
+            row = tracks_table.get_row(cell)
+            if row is not None:
+                index = row
+                # get track id of that entry
+                track_id = tracks[row][0]
 
             # find first and last index of that track id
-            indices = np.where(tracks[:, 0] == track_id)[0]
+            indices = tracks_table.get_track_rows(track_id)
             if len(indices) == 0:
-                indices_to_delete[indicator] = []
                 continue
             first = min(indices)
             last = max(indices)
@@ -299,25 +303,18 @@ class SegmentationWindow(QWidget):
             if index < last - 1:
                 indices = indices[indices <= index]
 
+            # remove entry (or entries)
+            updated_tracks[indicator] = np.delete(tracks, indices, 0)
             if len(indices) == 1:
-                for i in range(index + 1, last + 1):
-                    tracks[i][0] = next_id
+                # the entries after index moved up by one row
+                updated_tracks[indicator] = relabel_rows(
+                    updated_tracks[indicator], np.arange(index, last), next_id
+                )
 
-            indices_to_delete[indicator] = indices
-
-        # remove entry (or entries)
         if displayed:
-            displayed_tracks = np.delete(displayed_tracks, indices_to_delete[0], 0)
-            tracks_layer.data = displayed_tracks
+            tracks_layer.data = updated_tracks[0]
         if self.parent.tracking_window.cached_tracks is not None:
-            self.parent.tracking_window.cached_tracks = np.delete(
-                self.parent.tracking_window.cached_tracks, indices_to_delete[1], 0
-            )
-            df = pd.DataFrame(
-                self.parent.tracking_window.cached_tracks, columns=["ID", "Z", "Y", "X"]
-            )
-            df.sort_values(["ID", "Z"], ascending=True, inplace=True)
-            self.parent.tracking_window.cached_tracks = df.values
+            self.parent.tracking_window.cached_tracks = updated_tracks[1]
 
     def get_track_id_of_cell(self, cell):
         """
@@ -339,15 +336,15 @@ class SegmentationWindow(QWidget):
         tracks_layer = grab_layer(self.viewer, tracks_name)
         if tracks_layer is None:
             return
-        tracks = tracks_layer.data
-
-        for track in tracks:
-            if np.all(track[1:4] == cell):
-                return track[0], True
+        track_id = get_tracks_table(tracks_layer).get_track_id(cell)
+        if track_id is not None:
+            return track_id, True
         if self.parent.tracking_window.cached_tracks is not None:
-            for track in self.parent.tracking_window.cached_tracks:
-                if np.all(track[1:4] == cell):
-                    return track[0], False
+            track_id = TracksTable(
+                self.parent.tracking_window.cached_tracks
+            ).get_track_id(cell)
+            if track_id is not None:
+                return track_id, False
         raise ValueError("No matching track found")
 
     def _add_select_callback(self):
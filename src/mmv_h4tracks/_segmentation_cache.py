@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Directory the segmentation results are cached in
+CACHE_DIRECTORY = Path.home() / ".cache" / "mmv_h4tracks" / "segmentation"
+# Maximum size of the cache on disk in bytes, least recently used entries are removed first
+MAX_CACHE_SIZE = 2 * 1024**3
+
+
+class SegmentationCache:
+    """
+    On-disk cache for segmentation masks of single frames.
+    Entries are addressed by the content of the frame, the model file and the model parameters,
+    so the same frame segmented with the same model is only computed once.
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY, max_size=MAX_CACHE_SIZE):
+        """
+        Parameters
+        ----------
+        directory : Path
+            the directory the masks are stored in
+        max_size : int
+            the maximum size of the cache in bytes
+        """
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.model_hashes = {}
+
+    def get_model_hash(self, model_path):
+        """
+        Returns the hash of a model file, the file is only read again if it changed
+
+        Parameters
+        ----------
+        model_path : str
+            path to the model file
+
+        Returns
+        -------
+        str
+            the hash of the model file, empty if there is no model file
+        """
+        if model_path is None or not os.path.isfile(model_path):
+            return ""
+        stat = os.stat(model_path)
+        key = (model_path, stat.st_mtime_ns, stat.st_size)
+        if not key in self.model_hashes:
+            model_hash = hashlib.sha256()
+            with open(model_path, "rb") as file:
+                for block in iter(lambda: file.read(1024**2), b""):
+                    model_hash.update(block)
+            self.model_hashes[key] = model_hash.hexdigest()
+        return self.model_hashes[key]
+
+    def get_key(self, layer_slice, parameters):
+        """
+        Returns the cache key of a frame
+
+        Parameters
+        ----------
+        layer_slice : nd array
+            the raw image data of the frame
+        parameters : dict
+            the parameters for the segmentation model, including the model path
+
+        Returns
+        -------
+        str
+            the cache key
+        """
+        layer_slice = np.ascontiguousarray(layer_slice)
+        eval_params = dict(parameters)
+        model_path = eval_params.pop("model_path", None)
+        key = hashlib.sha256()
+        key.update(str((layer_slice.shape, layer_slice.dtype.str)).encode())
+        key.update(layer_slice.data)
+        key.update(self.get_model_hash(model_path).encode())
+        key.update(json.dumps(eval_params, sort_keys=True, default=str).encode())
+        return key.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached mask for a key, or None if it isn't cached
+
+        Parameters
+        ----------
+        key : str
+            the cache key
+
+        Returns
+        -------
+        nd array
+            the segmentation mask
+        """
+        path = self.directory / f"{key}.npy"
+        try:
+            mask = np.load(path)
+        except (OSError, ValueError):
+            return None
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return mask
+
+    def put(self, key, mask):
+        """
+        Stores a mask in the cache and removes the least recently used entries if the cache is full
+
+        Parameters
+        ----------
+        key : str
+            the cache key
+        mask : nd array
+            the segmentation mask
+        """
+        if self.max_size <= 0:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temporary_path = self.directory / f"{key}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as file:
+                np.save(file, np.asarray(mask))
+            os.replace(temporary_path, self.directory / f"{key}.npy")
+        except OSError:
+            # The cache is only an optimization, segmentation works without it
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits into its maximum size
+        """
+        entries = []
+        for path in self.directory.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries, key=lambda entry: entry[0]):
+            if size <= self.max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            size -= entry_size
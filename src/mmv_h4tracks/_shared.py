@@ -0,0 +1,136 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Amount of shared arrays a worker process keeps attached at the same time
+MAX_ATTACHED_ARRAYS = 4
+
+# Shared arrays attached by this process, keyed by name, oldest first
+_ATTACHED_ARRAYS = {}
+# Shared memory detached from while views of it were still in use, closed once they are gone
+_DETACHED_MEMORY = []
+
+
+class SharedArray:
+    """
+    Copy of an array in shared memory, so worker processes can access it without pickling.
+    Workers attach to it by its descriptor with attach_shared_array.
+    """
+
+    def __init__(self, array):
+        """
+        Parameters
+        ----------
+        array : nd array
+            the array to publish
+        """
+        array = np.asarray(array)
+        self.shared_memory = shared_memory.SharedMemory(
+            create=True, size=max(array.nbytes, 1)
+        )
+        self.array = np.ndarray(array.shape, array.dtype, buffer=self.shared_memory.buf)
+        self.array[...] = array
+        self.descriptor = (self.shared_memory.name, array.shape, array.dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Releases the shared memory. Arrays attached by workers stay valid until they detach.
+        """
+        if self.shared_memory is None:
+            return
+        self.array = None
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+        self.shared_memory = None
+
+
+def attach_shared_array(descriptor):
+    """
+    Returns the array published under the given descriptor, attaching to it on first use
+
+    Parameters
+    ----------
+    descriptor : tuple
+        the descriptor of a SharedArray
+
+    Returns
+    -------
+    nd array
+        view of the shared array
+    """
+    name, shape, dtype = descriptor
+    if name in _ATTACHED_ARRAYS:
+        return _ATTACHED_ARRAYS[name][1]
+    while len(_ATTACHED_ARRAYS) >= MAX_ATTACHED_ARRAYS:
+        _detach(next(iter(_ATTACHED_ARRAYS)))
+    attached_memory = _open_shared_memory(name)
+    # Views of the array keep the buffer exported, so the memory can't be closed under them
+    array = np.frombuffer(
+        attached_memory.buf, dtype, count=int(np.prod(shape))
+    ).reshape(shape)
+    _ATTACHED_ARRAYS[name] = (attached_memory, array)
+    return array
+
+
+def untrack_shared_memory():
+    """
+    Stops this process from registering shared memory with the resource tracker.
+    Only called in worker processes, which attach to shared arrays but never create them.
+
+    Before Python 3.13 attaching registers the memory with the resource tracker the workers
+    share with their parent, which would unlink it when a worker exits. Unregistering it
+    afterwards races with the other workers, so it isn't registered in the first place.
+    """
+    register = resource_tracker.register
+
+    def register_untracked(name, rtype):
+        if rtype != "shared_memory":
+            register(name, rtype)
+
+    resource_tracker.register = register_untracked
+
+
+def _open_shared_memory(name):
+    """
+    Attaches to existing shared memory without tracking it, if supported
+
+    Parameters
+    ----------
+    name : str
+        the name of the shared memory
+
+    Returns
+    -------
+    SharedMemory
+        the attached shared memory
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _detach(name):
+    """
+    Detaches this process from a shared array.
+    If views of the array are still in use, the memory is closed on a later detach.
+
+    Parameters
+    ----------
+    name : str
+        the name of the shared array
+    """
+    _DETACHED_MEMORY.append(_ATTACHED_ARRAYS.pop(name)[0])
+    in_use = []
+    for attached_memory in _DETACHED_MEMORY:
+        try:
+            attached_memory.close()
+        except BufferError:
+            in_use.append(attached_memory)
+    _DETACHED_MEMORY[:] = in_use
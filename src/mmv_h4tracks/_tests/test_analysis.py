@@ -0,0 +1,72 @@
+"""Module providing tests for the analysis widget and the analysis API"""
+import numpy as np
+import pytest
+
+from mmv_h4tracks import MMVH4TRACKS
+from mmv_h4tracks.analysis import compute_metrics, export_metrics
+
+
+@pytest.fixture
+def create_widget(make_napari_viewer):
+    yield MMVH4TRACKS(make_napari_viewer())
+
+
+@pytest.mark.unit
+def test_metric_cache(create_widget, monkeypatch):
+    widget = create_widget
+    monkeypatch.setattr(widget, "get_pool", lambda: None)
+    segmentation = np.zeros((3, 20, 20), dtype=np.int32)
+    segmentation[:, 2:6, 2:6] = 1
+    segmentation[:, 10:15, 10:18] = 2
+    labels_layer = widget.viewer.add_labels(segmentation, name="Segmentation")
+    widget.combobox_segmentation.setCurrentText("Segmentation")
+    tracks = np.array([[1, 0, 3, 3], [1, 1, 4, 4], [1, 2, 12, 12]])
+    window = widget.analysis_window
+
+    speed = window._get_metric("Speed", tracks)
+    assert window._get_metric("Speed", tracks.copy()) is speed
+    moved_tracks = tracks.copy()
+    moved_tracks[2, 3] = 15
+    assert window._get_metric("Speed", moved_tracks) is not speed
+
+    perimeter = window._get_metric("Perimeter", tracks, labels_layer.data)
+    assert window._get_metric("Perimeter", tracks, labels_layer.data) is perimeter
+    labels_layer.paint((2, 12, 12), 3, refresh=False)
+    updated_perimeter = window._get_metric("Perimeter", tracks, labels_layer.data)
+    assert updated_perimeter is not perimeter
+    assert np.array_equal(
+        updated_perimeter, window.calculate_cell_perimeter(tracks, labels_layer.data)
+    )
+
+
+@pytest.mark.unit
+def test_compute_metrics():
+    segmentation = np.zeros((3, 20, 20), dtype=np.int32)
+    segmentation[:, 2:6, 2:6] = 1
+    segmentation[:, 10:15, 10:18] = 2
+    tracks = np.array(
+        [[1, 0, 3, 3], [1, 1, 4, 4], [1, 2, 3, 12], [2, 0, 12, 12], [2, 1, 12, 13]]
+    )
+    results, valid_ids = compute_metrics(
+        tracks, segmentation, ["Speed", "Size"], min_movement=5
+    )
+    assert sorted(results) == ["Size", "Speed", "Track duration"]
+    assert np.array_equal(valid_ids, [1])
+    assert np.array_equal(results["Track duration"], [[1, 3], [2, 2]])
+    assert np.array_equal(results["Size"][1], [2, 40, 0])
+    with pytest.raises(ValueError):
+        compute_metrics(tracks, metrics=["Perimeter"])
+
+
+@pytest.mark.unit
+def test_export_metrics(tmp_path):
+    tracks = np.array([[1, 0, 3, 3], [1, 1, 4, 4], [2, 0, 12, 12], [2, 1, 12, 13]])
+    rows = export_metrics(
+        tmp_path / "metrics.csv",
+        tracks,
+        metrics=["Euclidean distance", "Accumulated distance"],
+        min_duration=3,
+    )
+    assert "Average directness" in rows[0]
+    assert rows[-1][0] == 2 and rows[-3] == ["Cells not matching the filters"]
+    assert (tmp_path / "metrics.csv").is_file()
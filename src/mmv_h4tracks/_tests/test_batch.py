@@ -0,0 +1,53 @@
+"""Module providing tests for the batch processing command line interface."""
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import zarr
+
+from mmv_h4tracks import pipeline
+from mmv_h4tracks.batch import main
+
+# Makes every import of Qt or napari fail, like on a machine without them
+BLOCK_QT = """
+import sys
+
+class BlockQt:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ["qtpy", "PyQt5", "PyQt6", "PySide2", "PySide6", "napari"]:
+            raise ImportError(name + " is blocked")
+
+sys.meta_path.insert(0, BlockQt())
+"""
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "module", ["mmv_h4tracks.pipeline", "mmv_h4tracks.analysis", "mmv_h4tracks.batch"]
+)
+def test_import_without_qt(module):
+    subprocess.run([sys.executable, "-c", f"{BLOCK_QT}\nimport {module}"], check=True)
+
+
+@pytest.mark.unit
+def test_batch_tracking_and_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "get_pool", lambda processes: None)
+    segmentation = np.zeros((4, 30, 30), dtype=np.int32)
+    for frame in range(4):
+        segmentation[frame, 5:10, 5 + frame : 10 + frame] = 1
+        segmentation[frame, 20:25, 20:25] = 2
+    zarr_file = zarr.open(str(tmp_path / "experiment.zarr"), mode="w")
+    zarr_file.create_dataset("raw_data", data=np.zeros((4, 30, 30), dtype=np.uint8))
+    zarr_file.create_dataset("segmentation_data", data=segmentation)
+
+    assert main([str(tmp_path), "-p", "1", "--metrics", "Speed", "Size"]) == 0
+    tracks = zarr.open(str(tmp_path / "experiment.zarr"))["tracking_data"][:]
+    assert len(np.unique(tracks[:, 0])) == 2 and len(tracks) == 8
+    assert (tmp_path / "experiment.csv").is_file()
+
+    # A file without segmentation can't be processed without a model
+    zarr.open(str(tmp_path / "raw.zarr"), mode="w").create_dataset(
+        "raw_data", data=np.zeros((4, 30, 30), dtype=np.uint8)
+    )
+    assert main([str(tmp_path), "-p", "1", "-j", "2"]) == 1
@@ -0,0 +1,68 @@
+"""Module providing tests for saving only the changed frames."""
+import numpy as np
+import pytest
+import zarr
+from napari.layers import Image, Labels, Tracks
+
+import mmv_h4tracks._writer as writer
+from mmv_h4tracks._frame_changes import get_frame_changes, track_frame_changes
+
+
+@pytest.fixture
+def zarr_file():
+    rng = np.random.default_rng(0)
+    zarr_file = zarr.group()
+    zarr_file.create_dataset(
+        "raw_data", data=rng.random((5, 20, 20)), chunks=(1, 20, 20)
+    )
+    segmentation = np.zeros((5, 20, 20), dtype=np.int32)
+    segmentation[:, 2:6, 2:6] = 1
+    zarr_file.create_dataset("segmentation_data", data=segmentation, chunks=(1, 20, 20))
+    tracks = np.array([[1, 0, 4, 4], [1, 1, 4, 4]], dtype=np.int32)
+    zarr_file.create_dataset("tracking_data", data=tracks)
+    return zarr_file
+
+
+@pytest.mark.unit
+def test_changed_frames():
+    layer = Labels(np.zeros((4, 10, 10), dtype=np.int32))
+    changes = track_frame_changes(layer)
+    assert get_frame_changes(layer) is changes
+    assert changes.get_changed_frames(layer.data) == {}
+    layer.paint((2, 5, 5), 3, refresh=False)
+    layer.data_setitem((np.array([0, 0]), np.array([1, 2]), np.array([1, 1])), 7)
+    changed = changes.get_changed_frames(layer.data)
+    assert sorted(changed) == [0, 2]
+    changes.mark_saved(changed)
+    assert changes.get_changed_frames(layer.data) == {}
+
+    # napari's undo does not emit a paint event, the checksum still catches it
+    layer.undo()
+    assert list(changes.get_changed_frames(layer.data)) == [0]
+
+
+@pytest.mark.unit
+def test_save_changed_frames(zarr_file, monkeypatch):
+    messages = []
+    monkeypatch.setattr(writer, "notify", messages.append)
+    layers = [
+        Image(zarr_file["raw_data"][:]),
+        Labels(zarr_file["segmentation_data"][:]),
+        Tracks(zarr_file["tracking_data"][:]),
+    ]
+    track_frame_changes(layers[0])
+    track_frame_changes(layers[1])
+    writer.save_zarr(zarr_file, layers, None)
+    assert messages[-1] == "Zarr file has been saved, 0.0 MB written."
+
+    layers[1].paint((3, 10, 10), 2, refresh=False)
+    layers[2].data = np.array([[1, 0, 4, 4], [1, 1, 4, 4], [1, 2, 4, 4]])
+    writer.save_zarr(zarr_file, layers, None)
+    assert np.array_equal(zarr_file["segmentation_data"][:], layers[1].data)
+    assert np.array_equal(zarr_file["tracking_data"][:], layers[2].data)
+    frame_bytes = zarr_file["segmentation_data"][3].nbytes
+    tracks_bytes = zarr_file["tracking_data"].nbytes
+    assert messages[-1] == (
+        f"Zarr file has been saved, {(frame_bytes + tracks_bytes) / 1024**2:.1f} MB written."
+    )
+    assert get_frame_changes(layers[1]).checksums.keys() == {3}
@@ -0,0 +1,164 @@
+"""Module providing tests for the edit journal."""
+import numpy as np
+import pytest
+from napari.layers import Labels
+from napari.layers.labels import _labels_key_bindings as label_bindings
+
+from mmv_h4tracks._journal import EditJournal, LabelsDiff, diff_tracks
+from mmv_h4tracks._lazy_frames import LazyFrames
+
+
+@pytest.fixture
+def labels_layer():
+    data = np.zeros((3, 20, 20), dtype=np.int32)
+    data[1, 2:8, 2:8] = 1
+    data[2, 10:15, 3:9] = 2
+    return Labels(data)
+
+
+@pytest.mark.unit
+def test_labels_journal(labels_layer):
+    initial = labels_layer.data.copy()
+    journal = EditJournal()
+    journal.reset(labels_layer)
+    labels_layer.paint((1, 10, 10), 3, refresh=False)
+    labels_layer.fill((2, 12, 5), 4, refresh=False)
+    labels_layer.data_setitem((np.array([0, 0]), np.array([1, 2]), np.array([1, 1])), 7)
+    assert len(journal.undo_stack) == 3
+    edited = labels_layer.data.copy()
+    assert np.array_equal(journal.get_initial_labels(labels_layer.data), initial)
+
+    data = edited.copy()
+    for entry in reversed(journal.undo_stack):
+        for change in entry:
+            change.apply(data, reverse=True)
+    assert np.array_equal(data, initial)
+    for entry in journal.undo_stack:
+        for change in entry:
+            change.apply(data)
+    assert np.array_equal(data, edited)
+
+
+@pytest.mark.unit
+def test_labels_diff_runs():
+    flat_indices = np.array([3, 4, 5, 9, 20, 21])
+    diff = LabelsDiff((2, 4, 4), flat_indices, np.arange(6), 8)
+    assert list(diff.starts) == [3, 9, 20]
+    assert list(diff.lengths) == [3, 1, 2]
+    data = np.zeros((2, 4, 4), dtype=int)
+    assert list(diff.apply(data)) == [0, 1]
+    assert np.array_equal(np.flatnonzero(data == 8), flat_indices)
+    diff.apply(data, reverse=True)
+    assert np.array_equal(data.ravel()[flat_indices], np.arange(6))
+
+
+@pytest.mark.unit
+def test_empty_labels_diff():
+    data = np.zeros((2, 4, 4), dtype=int)
+    empty = (np.zeros(0, int), np.zeros(0, int), np.zeros(0, int))
+    for atoms in [[], [(empty, np.zeros(0, int), 5)]]:
+        diff = LabelsDiff.from_paint(atoms, data.shape)
+        assert len(diff.apply(data)) == 0
+        assert len(diff.apply(data, reverse=True)) == 0
+    assert not np.any(data)
+
+
+class FrameSource:
+    """
+    Array that records which frames are read
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.shape = data.shape
+        self.dtype = data.dtype
+        self.read = []
+
+    def __getitem__(self, key):
+        self.read.append(key)
+        return self.data[key]
+
+
+@pytest.mark.unit
+def test_initial_lazy_labels(labels_layer):
+    initial = labels_layer.data.copy()
+    source = FrameSource(initial.copy())
+    data = LazyFrames(source)
+    journal = EditJournal()
+    flat_indices = np.ravel_multi_index(([1, 1], [3, 3], [3, 4]), data.shape)
+    diff = LabelsDiff(data.shape, flat_indices, [1, 1], 5)
+    diff.apply(data)
+    journal.record(diff)
+
+    labels = journal.get_initial_labels(data)
+    assert isinstance(labels, LazyFrames) and source.read == [1]
+    assert np.array_equal(np.asarray(labels), initial)
+    assert data[1, 3, 3] == 5
+
+
+@pytest.mark.unit
+def test_native_undo(labels_layer):
+    initial = labels_layer.data.copy()
+    journal = EditJournal()
+
+    def undo():
+        for change in reversed(journal.undo() or []):
+            change.apply(labels_layer.data, reverse=True)
+
+    def redo():
+        for change in journal.redo() or []:
+            change.apply(labels_layer.data)
+
+    journal.reset(labels_layer, undo, redo)
+    labels_layer.paint((1, 10, 10), 3, refresh=False)
+    labels_layer.paint((2, 4, 4), 5, refresh=False)
+    edited = labels_layer.data.copy()
+    # napari's undo and redo key bindings go through the journal
+    label_bindings.undo(labels_layer)
+    assert len(journal.undo_stack) == 1
+    assert np.array_equal(journal.get_initial_labels(labels_layer.data), initial)
+    label_bindings.redo(labels_layer)
+    assert np.array_equal(labels_layer.data, edited)
+    assert np.array_equal(journal.get_initial_labels(labels_layer.data), initial)
+
+    journal.reset()
+    assert labels_layer.undo == Labels.undo.__get__(labels_layer)
+    labels_layer.undo()
+    assert len(journal.undo_stack) == 0
+
+
+@pytest.mark.unit
+def test_diff_tracks():
+    before = np.array([[1, 0, 5, 5], [1, 1, 6, 6], [2, 0, 9, 9], [2, 1, 8, 8]])
+    after = np.array([[1, 0, 5, 5], [1, 1, 6, 6], [1, 2, 7, 7], [3, 0, 9, 9]])
+    diff = diff_tracks(before, after)
+    assert diff.removed.tolist() == [[2, 0, 9, 9], [2, 1, 8, 8]]
+    assert diff.added.tolist() == [[1, 2, 7, 7], [3, 0, 9, 9]]
+    assert np.array_equal(diff.apply(before), after)
+    assert np.array_equal(diff.apply(after, reverse=True), before)
+    diff = diff_tracks(None, after)
+    assert diff.apply(after, reverse=True) is None
+    assert np.array_equal(diff.apply(None), after)
+
+
+@pytest.mark.unit
+def test_journal_operation():
+    journal = EditJournal()
+    tracks = [
+        np.array([[1, 0, 5, 5], [1, 1, 6, 6]]),
+        np.array([[1, 0, 5, 5]]),
+        np.array([[2, 0, 5, 5]]),
+    ]
+    with journal.operation():
+        journal.record(diff_tracks(tracks[0], tracks[1]))
+        journal.record(diff_tracks(tracks[1], tracks[2]))
+    with journal.operation():
+        pass
+    assert len(journal.undo_stack) == 1
+    assert np.array_equal(journal.get_initial_tracks(tracks[2]), tracks[0])
+    entry = journal.undo()
+    assert len(entry) == 2 and journal.undo() is None
+    assert journal.redo() is entry and journal.redo() is None
+    journal.undo()
+    journal.record(diff_tracks(tracks[0], tracks[2]))
+    assert journal.redo() is None
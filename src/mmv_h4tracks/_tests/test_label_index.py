@@ -0,0 +1,37 @@
+"""Module providing tests for the label index."""
+import numpy as np
+import pytest
+from napari.layers import Labels
+
+from mmv_h4tracks._label_index import LabelIndex, get_label_index
+
+
+@pytest.mark.unit
+def test_get_locations():
+    data = np.random.default_rng(0).integers(0, 5, (2, 20, 30))
+    index = LabelIndex(data)
+    for frame in range(2):
+        for label in range(5):
+            locations = index.get_locations(frame, label)
+            expected = np.where(data[frame] == label)
+            assert np.array_equal(locations[0], expected[0])
+            assert np.array_equal(locations[1], expected[1])
+            assert index.get_area(frame, label) == len(expected[0])
+    assert index.get_area(0, 7) == 0
+    assert list(index.frames) == [0, 1]
+
+
+@pytest.mark.unit
+def test_label_index_follows_layer():
+    layer = Labels(np.zeros((3, 10, 10), dtype=int))
+    index = get_label_index(layer)
+    assert index.get_area(1, 3) == 0
+    assert index.get_area(2, 4) == 0
+    layer.paint((1, 5, 5), 3, refresh=False)
+    assert index.get_area(1, 3) > 0
+    layer.fill((2, 1, 1), 4)
+    assert index.get_area(2, 4) == 100
+    assert get_label_index(layer) is index
+
+    layer.data = np.ones((3, 10, 10), dtype=int)
+    assert index.get_area(0, 1) == 100
@@ -0,0 +1,52 @@
+"""Module providing tests for lazily loaded label volumes."""
+import numpy as np
+import pytest
+import zarr
+from napari.layers import Labels
+
+from mmv_h4tracks._lazy_frames import LazyFrames
+from mmv_h4tracks._object_table import calculate_object_table
+
+
+@pytest.fixture
+def segmentation():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 5, (6, 30, 40)).astype(np.int32)
+
+
+@pytest.mark.unit
+def test_indexing(segmentation):
+    frames = LazyFrames(zarr.array(segmentation, chunks=(1, 30, 40)), 2)
+    assert frames.shape == segmentation.shape and len(frames) == 6
+    assert np.array_equal(frames[2], segmentation[2])
+    assert np.array_equal(frames[1:4, 2:5, ::2], segmentation[1:4, 2:5, ::2])
+    assert np.array_equal(frames[..., 3], segmentation[..., 3])
+    indices = (np.array([1, 2, 1]), np.array([3, 4, 5]), np.array([5, 6, 7]))
+    assert np.array_equal(frames[indices], segmentation[indices])
+    assert np.array_equal(np.asarray(frames), segmentation)
+    assert len(frames.cached_frames) <= 2
+    assert frames.changed_frames == {}
+    assert np.amax(frames) == segmentation.max()
+
+
+@pytest.mark.unit
+def test_editing(segmentation):
+    source = zarr.array(segmentation, chunks=(1, 30, 40))
+    frames = LazyFrames(source, 2)
+    layer = Labels(frames)
+    reference = Labels(segmentation.copy())
+    for labels_layer in [layer, reference]:
+        labels_layer.paint((1, 5, 5), 9, refresh=False)
+        labels_layer.fill((2, 10, 10), 8, refresh=False)
+        labels_layer.data_setitem(
+            (np.array([0, 3]), np.array([1, 2]), np.array([1, 1])), 7
+        )
+    assert np.array_equal(np.asarray(frames), reference.data)
+    assert sorted(frames.changed_frames) == [0, 1, 2, 3]
+    assert np.array_equal(source[:], segmentation)
+    assert np.array_equal(
+        calculate_object_table(frames), calculate_object_table(reference.data)
+    )
+    layer.undo()
+    reference.undo()
+    assert np.array_equal(np.asarray(frames), reference.data)
@@ -0,0 +1,62 @@
+"""Module providing tests for the track metrics."""
+import numpy as np
+import pytest
+
+from mmv_h4tracks._metrics import (
+    calculate_accumulated_distance,
+    calculate_direction,
+    calculate_directness,
+    calculate_euclidean_distance,
+    calculate_motility_metrics,
+    calculate_speed,
+    calculate_track_statistics,
+    calculate_velocity,
+)
+
+
+@pytest.fixture
+def tracks():
+    return np.array(
+        [
+            [2, 0, 10, 10],
+            [1, 0, 0, 0],
+            [1, 1, 3, 4],
+            [2, 1, 10, 13],
+            [1, 2, 3, 10],
+            [3, 4, 7, 7],
+        ]
+    )
+
+
+@pytest.mark.unit
+def test_motility_metrics(tracks):
+    speed = calculate_speed(tracks)
+    assert np.array_equal(speed[:2], [[1, 5.5, 0.5], [2, 3, 0]])
+    assert speed[2, 0] == 3 and np.all(np.isnan(speed[2, 1:]))
+    accumulated_distance = calculate_accumulated_distance(tracks)
+    assert np.array_equal(accumulated_distance, [[1, 11, 3], [2, 3, 2], [3, 0, 1]])
+    euclidean_distance = calculate_euclidean_distance(tracks)
+    assert np.array_equal(euclidean_distance, [[1, 10.44, 3], [2, 3, 2], [3, 0, 1]])
+    assert np.array_equal(
+        calculate_velocity(tracks), [[1, 3.48, 1], [2, 1.5, 2], [3, 0, 3]]
+    )
+    assert np.array_equal(
+        calculate_direction(tracks),
+        [[1, 10, -3, 343.301], [2, 3, 0, 0], [3, 0, 0, 0]],
+    )
+    assert np.array_equal(
+        calculate_directness(euclidean_distance, accumulated_distance),
+        [[1, 0.949], [2, 1], [3, 0]],
+    )
+    metrics = calculate_motility_metrics(tracks)
+    assert np.array_equal(metrics["Speed"], speed, equal_nan=True)
+    assert np.array_equal(metrics["Track duration"], [[1, 3], [2, 2], [3, 1]])
+
+
+@pytest.mark.unit
+def test_track_statistics(tracks):
+    values = np.array([4, 1, 2, 6, 3, 5])
+    assert np.array_equal(
+        calculate_track_statistics(tracks, values),
+        [[1, 2, 0.816], [2, 5, 1], [3, 5, 0]],
+    )
@@ -0,0 +1,59 @@
+"""Module providing tests for the morphology table."""
+import numpy as np
+import pytest
+from napari.layers import Labels
+from skimage import measure
+
+from mmv_h4tracks._morphology import (
+    calculate_frame_morphology,
+    get_morphology_table,
+    get_track_morphology,
+)
+
+
+@pytest.fixture
+def segmentation():
+    rng = np.random.default_rng(0)
+    segmentation = np.zeros((3, 40, 50), dtype=np.int32)
+    for frame in range(3):
+        for label in rng.choice(np.arange(1, 30), 6, replace=False):
+            y, x = rng.integers(0, 35, 2)
+            segmentation[frame, y : y + 5, x : x + rng.integers(2, 8)] = label
+    return segmentation
+
+
+@pytest.mark.unit
+def test_frame_morphology(segmentation):
+    morphology = calculate_frame_morphology(segmentation[1], 1)
+    assert np.array_equal(morphology["label"], np.unique(segmentation[1])[1:])
+    assert np.all(morphology["frame"] == 1)
+    for row in morphology:
+        properties = measure.regionprops((segmentation[1] == row["label"]).astype(int))
+        assert row["area"] == properties[0].area
+        assert row["perimeter"] == pytest.approx(properties[0].perimeter)
+        assert row["eccentricity"] == pytest.approx(properties[0].eccentricity)
+
+
+@pytest.mark.unit
+def test_track_morphology(segmentation):
+    layer = Labels(segmentation)
+    table = get_morphology_table(layer)
+    assert get_morphology_table(layer) is table
+    positions = [np.argwhere(segmentation[frame] > 0)[0] for frame in range(3)]
+    tracks = np.array(
+        [[1, frame, *position] for frame, position in enumerate(positions)]
+    )
+    tracks = np.append(tracks, [[2, 0, 39, 49]], 0)
+    morphology = get_track_morphology(tracks, segmentation, table)
+    assert sorted(table.frames) == [0, 1, 2]
+    for row, (_, frame, y, x) in zip(morphology, tracks):
+        label = segmentation[frame, y, x]
+        properties = measure.regionprops((segmentation[frame] == label).astype(int))
+        assert row["label"] == label
+        assert row["area"] == properties[0].area
+        assert row["perimeter"] == pytest.approx(properties[0].perimeter)
+
+    # Painting discards only the painted frame
+    layer.paint((2, 20, 20), 40, refresh=False)
+    assert sorted(table.frames) == [0, 1]
+    assert 40 in table.get_table([2])["label"]
@@ -0,0 +1,93 @@
+"""Module providing tests for the object table."""
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from mmv_h4tracks import _object_table
+from mmv_h4tracks._object_table import (
+    calculate_frame_objects,
+    calculate_object_table,
+    get_frame_objects,
+    get_object_rows,
+)
+
+pytestmark = pytest.mark.processing
+
+
+@pytest.fixture
+def segmentation():
+    rng = np.random.default_rng(0)
+    segmentation = np.zeros((3, 40, 50), dtype=np.int32)
+    for frame in range(3):
+        for label in rng.choice(np.arange(1, 30), 6, replace=False):
+            y, x = rng.integers(0, 35, 2)
+            segmentation[frame, y : y + 5, x : x + rng.integers(2, 8)] = label
+    return segmentation
+
+
+@pytest.mark.unit
+def test_calculate_object_table(segmentation):
+    objects = calculate_object_table(segmentation)
+    for frame, label_slice in enumerate(segmentation):
+        frame_objects = get_frame_objects(objects, frame)
+        labels = np.unique(label_slice)[1:]
+        assert np.array_equal(frame_objects["label"], labels)
+        assert np.all(frame_objects["frame"] == frame)
+        centroids = ndimage.center_of_mass(label_slice, label_slice, labels)
+        assert np.allclose(
+            np.stack([frame_objects["centroid_y"], frame_objects["centroid_x"]], 1),
+            centroids,
+        )
+        for label, area, bbox in zip(
+            labels, frame_objects["area"], frame_objects["bbox"]
+        ):
+            y, x = np.nonzero(label_slice == label)
+            assert area == len(y)
+            assert list(bbox) == [y.min(), x.min(), y.max() + 1, x.max() + 1]
+
+
+@pytest.mark.unit
+def test_sparse_labels():
+    label_slice = np.zeros((4, 4), dtype=np.int64)
+    label_slice[0, 0] = 2**40
+    label_slice[3, 2:4] = 7
+    objects = calculate_frame_objects(label_slice, 5)
+    assert list(objects["label"]) == [7, 2**40]
+    assert list(objects["area"]) == [2, 1]
+    assert list(objects["centroid_x"]) == [2.5, 0]
+    assert list(objects["frame"]) == [5, 5]
+
+
+@pytest.mark.unit
+def test_sparse_labels_without_background():
+    objects = calculate_frame_objects([[100, 100], [200, 200]])
+    assert list(objects["label"]) == [100, 200]
+    assert [list(bbox) for bbox in objects["bbox"]] == [[0, 0, 1, 2], [1, 0, 2, 2]]
+    objects = calculate_frame_objects(np.full((2, 3), 100))
+    assert list(objects["label"]) == [100]
+    assert list(objects["area"]) == [6]
+    assert list(objects["bbox"][0]) == [0, 0, 2, 3]
+
+
+@pytest.mark.unit
+def test_get_object_rows(segmentation):
+    objects = calculate_object_table(segmentation)
+    rows = get_object_rows(objects, objects["frame"], objects["label"])
+    assert np.array_equal(rows, np.arange(len(objects)))
+    assert list(get_object_rows(objects, [0, 1, 9], [0, 99, 1])) == [-1, -1, -1]
+    assert list(get_object_rows(calculate_object_table([]), [0], [1])) == [-1]
+
+
+@pytest.mark.unit
+def test_calculate_object_table_blocks(segmentation, monkeypatch):
+    objects = calculate_object_table(segmentation)
+    # two frames per block
+    monkeypatch.setattr(_object_table, "BLOCK_PIXELS", 2 * 40 * 50)
+    assert np.array_equal(calculate_object_table(segmentation), objects)
+    frame_objects = np.concatenate(
+        [
+            calculate_frame_objects(label_slice, frame)
+            for frame, label_slice in enumerate(segmentation)
+        ]
+    )
+    assert np.array_equal(frame_objects, objects)
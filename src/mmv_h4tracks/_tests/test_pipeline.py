@@ -0,0 +1,135 @@
+"""Module providing tests for the Qt independent pipeline."""
+import threading
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pytest
+import zarr
+
+from mmv_h4tracks import pipeline
+from mmv_h4tracks._object_table import calculate_object_table
+
+
+@pytest.mark.unit
+def test_get_overlap_successors():
+    label_slice = np.zeros((10, 10), dtype=int)
+    next_slice = np.zeros((10, 10), dtype=int)
+    label_slice[0:2, 0:5] = 1
+    next_slice[0:2, 0:4] = 4  # covers 80% of cell 1
+    label_slice[5:7, 0:5] = 2
+    next_slice[5:7, 0:3] = 5  # covers 60% of cell 2
+    next_slice[5:7, 3:5] = 6
+    label_slice[8:10, 0:5] = 3
+    next_slice[8, 0:5] = 7  # covers 50% of cell 3, tie with background
+    next_slice[9, 0:5] = 0
+    labels, successors = pipeline.get_overlap_successors(label_slice, next_slice)
+    assert labels.tolist() == [1, 2, 3]
+    assert successors.tolist() == [4, 0, 0]
+
+
+@pytest.mark.unit
+def test_link_overlap_tracks():
+    label_data = np.zeros((6, 20, 20), dtype=np.int32)
+    label_data[0, 2:6, 2:6] = 1
+    label_data[0, 2:6, 8:12] = 2
+    label_data[1:, 2:6, 2:12] = 3
+    objects = calculate_object_table(label_data)
+    successors = [
+        pipeline.get_overlap_successors(label_data[i], label_data[i + 1])
+        for i in range(len(label_data) - 1)
+    ]
+    tracks = pipeline.link_overlap_tracks(objects, successors, len(label_data), 5)
+    # both cells are followed into the merged cell, which doesn't start a track itself
+    merged = [[z, 4, 6] for z in range(1, 6)]
+    assert tracks.tolist() == [
+        [track_id, *cell]
+        for track_id, first_cell in [(1, [0, 4, 4]), (2, [0, 4, 10])]
+        for cell in [first_cell, *merged]
+    ]
+    assert pipeline.link_overlap_tracks(objects, successors, 6, 7).shape == (0, 4)
+
+
+@pytest.mark.unit
+def test_track_overlap():
+    label_data = np.zeros((7, 20, 20), dtype=np.int32)
+    label_data[:, 2:6, 2:6] = 1
+    label_data[0:3, 10:14, 2:6] = 2
+    label_data[1:, 10:14, 10:14] = 3
+    expected = [[1, z, 4, 4] for z in range(7)] + [[2, z, 12, 12] for z in range(1, 7)]
+    assert pipeline.track_overlap(label_data).tolist() == expected
+    with ThreadPool(2) as pool:
+        assert pipeline.track_overlap(label_data, pool).tolist() == expected
+    # track 2 can't start early enough for six cells
+    tracks = pipeline.track_overlap(label_data, min_track_length=6)
+    assert tracks.tolist() == expected[:7]
+
+
+@pytest.mark.unit
+def test_segment_zarr_path(tmp_path, monkeypatch):
+    def segment_frames(data, parameters, processes):
+        return (np.asarray(data) > 0).astype(np.int32)
+
+    monkeypatch.setattr(pipeline, "segment_frames", segment_frames)
+    data = np.random.default_rng(0).integers(0, 2, (3, 10, 10))
+    zarr.open(str(tmp_path / "file.zarr"), mode="w").create_dataset(
+        "raw_data", data=data
+    )
+    mask = pipeline.segment_zarr(tmp_path / "file.zarr", {"batch_size": 2}, 1)
+    assert np.array_equal(mask[:], data > 0)
+    zarr_file = zarr.open(str(tmp_path / "file.zarr"))
+    assert pipeline.CALCULATED_SEGMENTATION_NAME in zarr_file
+    # arrays that don't belong to the file are segmented in memory
+    mask = pipeline.segment_image(data[:2], {"batch_size": 2}, 1, zarr_file)
+    assert isinstance(mask, np.ndarray)
+    mask = pipeline.segment_image(data.copy(), {"batch_size": 2}, 1, zarr_file)
+    assert isinstance(mask, np.ndarray)
+
+
+@pytest.mark.unit
+def test_segment_image_raw_data(tmp_path, monkeypatch):
+    def segment_frames(data, parameters, processes):
+        return (np.asarray(data) > 0).astype(np.int32)
+
+    monkeypatch.setattr(pipeline, "segment_frames", segment_frames)
+    data = np.random.default_rng(0).integers(0, 2, (3, 10, 10))
+    zarr_file = zarr.open(str(tmp_path / "file.zarr"), mode="w")
+    zarr_file.create_dataset("raw_data", data=data)
+    zarr_file.create_dataset("other_data", data=data)
+    mask = pipeline.segment_image(
+        zarr_file["raw_data"], {"batch_size": 2}, 1, zarr_file
+    )
+    assert isinstance(mask, zarr.Array)
+    assert np.array_equal(mask[:], data > 0)
+    # the masks are streamed into a temporary store, the file is left unchanged
+    assert mask.store is not zarr_file.store
+    assert sorted(zarr_file.array_keys()) == ["other_data", "raw_data"]
+    mask = pipeline.segment_image(
+        zarr_file["other_data"], {"batch_size": 2}, 1, zarr_file
+    )
+    assert isinstance(mask, np.ndarray)
+
+
+@pytest.mark.unit
+def test_get_pool_resize(monkeypatch):
+    monkeypatch.setattr(
+        pipeline, "Pool", lambda processes, initializer: ThreadPool(processes)
+    )
+    monkeypatch.setattr(pipeline, "_POOL", None)
+    release = threading.Event()
+    pool = pipeline.get_pool(1)
+    assert pipeline.get_pool(1) is pool
+    running = pool.apply_async(release.wait)
+    workers = list(pool._pool)
+    try:
+        assert pipeline.get_pool(2) is not pool
+        # the old pool finishes its work before its workers exit
+        assert pipeline._RETIRED_POOLS == [pool]
+        assert all(worker.is_alive() for worker in workers)
+        release.set()
+        assert running.get(timeout=10)
+        for worker in workers:
+            worker.join(timeout=10)
+            assert not worker.is_alive()
+    finally:
+        release.set()
+        pipeline.close_pool()
@@ -1,9 +1,10 @@
 """Module providing tests for the processing module."""
+import os
 import numpy as np
 import pytest
 from pathlib import Path
 
-from mmv_h4tracks import _processing as processing, MMVH4TRACKS
+from mmv_h4tracks import _processing as processing, pipeline, MMVH4TRACKS
 from mmv_h4tracks._segmentation import SegmentationWindow
 
 @pytest.fixture
@@ -23,23 +24,254 @@ def test_segment_slice_cpu():
             "flow_threshold": 0.4,
             "cellprob_threshold": 0,
     }
-    assert processing.segment_slice_cpu(layer_slice, parameters).shape == (100, 100)
+    assert pipeline.segment_slice_cpu(layer_slice, parameters).shape == (100, 100)
+
+@pytest.mark.unit
+def test_get_cellpose_model_cached(monkeypatch):
+    loaded = []
+
+    def load_model(gpu, pretrained_model):
+        loaded.append(pretrained_model)
+        return object()
+
+    monkeypatch.setattr(pipeline.models, "CellposeModel", load_model)
+    pipeline._MODEL_CACHE.clear()
+    model = pipeline.get_cellpose_model("model_a")
+    assert pipeline.get_cellpose_model("model_a") is model
+    pipeline.get_cellpose_model("model_b")
+    assert loaded == ["model_a", "model_b"]
+    pipeline._MODEL_CACHE.clear()
+
+@pytest.mark.unit
+def test_segment_stack_batches():
+    class CountingModel:
+        def __init__(self):
+            self.batches = []
+            self.batch_sizes = []
+
+        def eval(self, batch, **kwargs):
+            self.batches.append(len(batch))
+            self.batch_sizes.append(kwargs["batch_size"])
+            return [np.full(image.shape, len(self.batches)) for image in batch], None, None
+
+    model = CountingModel()
+    data = np.zeros((5, 10, 10))
+    mask = pipeline.segment_stack(model, data, {"batch_size": 4}, frames_per_batch=2)
+    assert model.batches == [2, 2, 1]
+    # the Cellpose batch size is passed on untouched
+    assert model.batch_sizes == [4, 4, 4]
+    assert mask.shape == (5, 10, 10)
+    assert np.array_equal(mask[:, 0, 0], [1, 1, 2, 2, 3])
+
+@pytest.mark.unit
+def test_segment_to_zarr(monkeypatch):
+    import zarr
+
+    windows = []
+
+    def segment_frames(data, parameters, processes):
+        windows.append(len(data))
+        return (data > 0).astype(np.int32)
+
+    monkeypatch.setattr(pipeline, "segment_frames", segment_frames)
+    data = zarr.array(np.random.default_rng(0).integers(0, 2, (5, 10, 10)))
+    target, progress = pipeline.open_segmentation_job(
+        zarr.group(), data.shape, {"batch_size": 2}
+    )
+    pipeline.segment_to_zarr(data, {}, target, 1, progress, frames_per_batch=2)
+    assert windows == [2, 2, 1]
+    assert target.chunks == (1, 10, 10)
+    assert np.all(progress[:])
+    assert np.array_equal(target[:], np.asarray(data) > 0)
+
+@pytest.mark.unit
+def test_segment_to_zarr_resume(monkeypatch):
+    import zarr
+
+    segmented = []
+
+    def segment_frames(data, parameters, processes):
+        segmented.extend(data[:, 0, 0])
+        return np.ones(data.shape, dtype=np.int32)
+
+    monkeypatch.setattr(pipeline, "segment_frames", segment_frames)
+    zarr_file = zarr.group()
+    parameters = {"diameter": 15, "channels": [0, 0]}
+    data = np.arange(4).reshape(4, 1, 1) * np.ones((4, 5, 5))
+    target, progress = pipeline.open_segmentation_job(
+        zarr_file, data.shape, parameters
+    )
+    progress[1] = True
+
+    target, progress = pipeline.open_segmentation_job(
+        zarr_file, data.shape, parameters
+    )
+    pipeline.segment_to_zarr(data, parameters, target, 1, progress)
+    assert segmented == [0, 2, 3]
+
+    # other parameters start a new job
+    _, progress = pipeline.open_segmentation_job(
+        zarr_file, data.shape, {"diameter": 20, "channels": [0, 0]}
+    )
+    assert not np.any(progress[:])
+
+@pytest.mark.unit
+@pytest.mark.parametrize("length", [100, 512, 1000, 1300])
+def test_get_tile_ranges(length):
+    ranges = pipeline.get_tile_ranges(length, 512, 64)
+    assert ranges[0][0] == 0 and ranges[-1][1] == length
+    for (start, stop, core_start, core_stop), following in zip(ranges, ranges[1:]):
+        assert following[0] <= stop - 64
+        assert core_stop == following[2]
+    for start, stop, core_start, core_stop in ranges:
+        assert start <= core_start < core_stop <= stop
+
+@pytest.mark.unit
+def test_stitch_tiles():
+    from scipy import ndimage
+
+    rng = np.random.default_rng(0)
+    frame = np.zeros((300, 300), dtype=bool)
+    rows, cols = np.indices(frame.shape)
+    for y, x in rng.integers(5, 295, (40, 2)):
+        frame |= (rows - y) ** 2 + (cols - x) ** 2 < 36
+    expected, _ = ndimage.label(frame)
+    tiles = pipeline.get_tiles(frame.shape, 100, 30)
+    tile_masks = [
+        ndimage.label(frame[y_start:y_stop, x_start:x_stop])[0]
+        for (y_start, y_stop, _, _), (x_start, x_stop, _, _) in tiles
+    ]
+    stitched = pipeline.stitch_tiles(tile_masks, tiles, frame.shape)
+    assert np.array_equal(stitched > 0, expected > 0)
+    # every cell keeps exactly one unique label
+    pairs = np.unique(np.stack([expected[frame], stitched[frame]]), axis=1)
+    assert len(np.unique(pairs[0])) == pairs.shape[1]
+    assert len(np.unique(pairs[1])) == pairs.shape[1]
+
+@pytest.mark.unit
+def test_segmentation_cache(tmp_path):
+    from mmv_h4tracks._segmentation_cache import SegmentationCache
+
+    cache = SegmentationCache(tmp_path, max_size=2 * (128 + 100 * 4))
+    frame = np.arange(100).reshape(10, 10)
+    key = cache.get_key(frame, {"diameter": 15})
+    assert key == cache.get_key(frame.copy(), {"diameter": 15})
+    assert key != cache.get_key(frame, {"diameter": 20})
+    assert key != cache.get_key(frame.T, {"diameter": 15})
+    assert cache.get(key) is None
+    cache.put(key, frame.astype(np.int32))
+    assert np.array_equal(cache.get(key), frame)
+
+    # the least recently used entry is removed once the cache is full
+    os.utime(tmp_path / f"{key}.npy", ns=(0, 0))
+    cache.put("a", np.zeros((10, 10), np.int32))
+    cache.put("b", np.zeros((10, 10), np.int32))
+    assert cache.get(key) is None
+    assert cache.get("b") is not None
+
+@pytest.mark.unit
+def test_segment_frames_cached(monkeypatch, tmp_path):
+    from mmv_h4tracks._segmentation_cache import SegmentationCache
+
+    segmented = []
+
+    def segment_frames_uncached(data, parameters, processes):
+        segmented.append(len(data))
+        return (data > 0).astype(np.int32)
+
+    monkeypatch.setattr(pipeline, "segment_frames_uncached", segment_frames_uncached)
+    monkeypatch.setattr(pipeline, "_SEGMENTATION_CACHE", SegmentationCache(tmp_path))
+    data = np.random.default_rng(0).integers(0, 2, (8, 10, 10))
+    demo = pipeline.segment_frames(data[0:5], {"diameter": 15}, 1)
+    mask = pipeline.segment_frames(data, {"diameter": 15}, 1)
+    assert segmented == [5, 3]
+    assert np.array_equal(mask[0:5], demo)
+    assert np.array_equal(mask, data > 0)
 
 @pytest.mark.format
 @pytest.mark.unit
 def test_calculate_centroid():
     layer_slice = np.zeros((100, 100), dtype=np.int8)
-    centroids, labels = processing.calculate_centroids(layer_slice)
+    centroids, labels = pipeline.calculate_centroids(layer_slice)
     assert centroids == []
     assert labels.shape == (0,)
     assert labels.dtype == np.int8
 
 
+@pytest.mark.unit
+@pytest.mark.parametrize("seed", range(5))
+def test_match_centroids_matches_dense_solver(seed):
+    from scipy import optimize, spatial
+    from mmv_h4tracks import APPROX_INF, MAX_MATCHING_DIST
+
+    rng = np.random.default_rng(seed)
+    parent_centroids = np.round(rng.uniform(0, 500, (150, 2)))
+    child_centroids = np.r_[
+        parent_centroids[:120] + np.round(rng.normal(0, 15, (120, 2))),
+        rng.uniform(0, 500, (50, 2)),
+    ]
+    parent_ids = np.arange(1, 151)
+    child_ids = np.arange(1, 171)
+    matches = pipeline.match_centroids(
+        ((parent_centroids, parent_ids), (child_centroids, child_ids))
+    )
+
+    cost_mat = spatial.distance.cdist(parent_centroids, child_centroids)
+    cost_mat[cost_mat > MAX_MATCHING_DIST] = APPROX_INF
+    cost_mat_aug = MAX_MATCHING_DIST * 1.2 * np.ones((150, 170 + 150))
+    cost_mat_aug[:, :170] = cost_mat
+    row_ind, col_ind = optimize.linear_sum_assignment(cost_mat_aug)
+    expected = [
+        (parent_ids[row], child_ids[col])
+        for row, col in zip(row_ind, col_ind)
+        if col < 170
+    ]
+    assert list(zip(matches["parent_id"], matches["child_id"])) == expected
+    matched_costs = cost_mat_aug[row_ind, col_ind][col_ind < 170]
+    assert np.allclose(matches["cost"], matched_costs)
+
+@pytest.mark.unit
+def test_match_centroids_empty_slice():
+    centroids = np.array([[10.0, 10.0]])
+    empty_slice = ([], np.array([]))
+    assert len(pipeline.match_centroids((empty_slice, (centroids, [1])))) == 0
+    assert len(pipeline.match_centroids(((centroids, [1]), empty_slice))) == 0
+
+
+@pytest.mark.unit
+def test_process_matches():
+    def slice_matches(*pairs):
+        matches = np.zeros(len(pairs), dtype=pipeline.MATCH_DTYPE)
+        for match, (parent_id, parent_yx, child_id, child_yx) in zip(matches, pairs):
+            match["parent_id"], match["parent_yx"] = parent_id, parent_yx
+            match["child_id"], match["child_yx"] = child_id, child_yx
+        return matches
+
+    matches = [
+        slice_matches((1, [0, 0], 2, [1, 1]), (3, [5, 5], 4, [6, 6])),
+        slice_matches((4, [6, 6], 5, [7, 7]), (7, [9, 9], 8, [9, 8])),
+        slice_matches((5, [7, 7], 6, [8, 8])),
+    ]
+    tracks = pipeline._process_matches(matches)
+    assert tracks.tolist() == [
+        [0, 0, 0, 0],
+        [0, 1, 1, 1],
+        [1, 0, 5, 5],
+        [1, 1, 6, 6],
+        [1, 2, 7, 7],
+        [1, 3, 8, 8],
+        [2, 1, 9, 9],
+        [2, 2, 9, 8],
+    ]
+    empty = np.zeros(0, dtype=pipeline.MATCH_DTYPE)
+    assert pipeline._process_matches([empty, empty]).shape == (0, 4)
+
+
 
 @pytest.mark.unit
 def test_read_custom_model_dict(create_widget):
     widget = create_widget
-    model_dict = processing.read_custom_model_dict()
+    model_dict = pipeline.read_custom_model_dict()
     assert model_dict == {}
 
 @pytest.mark.unit
@@ -0,0 +1,62 @@
+"""Module providing tests for the shared memory arrays."""
+import numpy as np
+import pytest
+
+from mmv_h4tracks import _shared as shared
+
+
+@pytest.mark.unit
+def test_attach_shared_array():
+    array = np.arange(24, dtype=np.int32).reshape(2, 3, 4)
+    with shared.SharedArray(array) as shared_array:
+        attached = shared.attach_shared_array(shared_array.descriptor)
+        assert np.array_equal(attached, array)
+        assert attached.dtype == array.dtype
+        assert shared.attach_shared_array(shared_array.descriptor) is attached
+
+
+@pytest.mark.unit
+def test_attached_arrays_are_limited():
+    shared_arrays = [
+        shared.SharedArray(np.full(3, i)) for i in range(shared.MAX_ATTACHED_ARRAYS + 1)
+    ]
+    try:
+        for shared_array in shared_arrays:
+            shared.attach_shared_array(shared_array.descriptor)
+        assert len(shared._ATTACHED_ARRAYS) == shared.MAX_ATTACHED_ARRAYS
+        assert shared_arrays[0].descriptor[0] not in shared._ATTACHED_ARRAYS
+    finally:
+        for shared_array in shared_arrays:
+            shared_array.close()
+
+
+@pytest.mark.unit
+def test_attach_is_not_tracked(monkeypatch):
+    registered = []
+    with shared.SharedArray(np.arange(3)) as shared_array:
+        monkeypatch.setattr(
+            shared.resource_tracker, "register", lambda *args: registered.append(args)
+        )
+        shared.untrack_shared_memory()
+        shared.attach_shared_array(shared_array.descriptor)
+        assert registered == []
+        # other resources are still tracked
+        shared.resource_tracker.register("/semaphore", "semaphore")
+        assert registered == [("/semaphore", "semaphore")]
+        shared._detach(shared_array.descriptor[0])
+
+
+@pytest.mark.unit
+def test_detach_array_in_use():
+    with shared.SharedArray(np.arange(3)) as shared_array:
+        name = shared_array.descriptor[0]
+        attached = shared.attach_shared_array(shared_array.descriptor)
+        shared._detach(name)
+        assert name not in shared._ATTACHED_ARRAYS
+        assert len(shared._DETACHED_MEMORY) == 1
+        assert attached.tolist() == [0, 1, 2]
+        del attached
+        with shared.SharedArray(np.arange(3)) as other_array:
+            shared.attach_shared_array(other_array.descriptor)
+            shared._detach(other_array.descriptor[0])
+        assert shared._DETACHED_MEMORY == []
@@ -264,6 +264,31 @@ def test_evaluate_proposed_track_converge(create_widget):
 #     expected_result = np.array([[0,0,1,1], [0,1,1,1], [0,2,1,1], [0,3,1,1]])
 #     assert np.array_equal(post_tracks, expected_result)
 
+@pytest.mark.integration
+@pytest.mark.misc
+def test_undo_redo_link(create_widget):
+    widget = create_widget
+    initial_tracks = np.array([[0,0,1,1], [0,1,1,1], [1,2,1,1], [1,3,1,1]])
+    widget.viewer.add_tracks(initial_tracks, name="Tracks")
+    widget.journal.reset(widget.viewer.add_labels(np.zeros((4,3,3), dtype=int)))
+    window = widget.tracking_window
+    window.selected_cells = [[1,1,1], [2,1,1]]
+    with window.record_edit():
+        window.link_stored_cells()
+    linked_tracks = widget.viewer.layers["Tracks"].data.copy()
+    assert np.array_equal(widget.get_initial_layers()[1], initial_tracks)
+    window.selected_cells = [[1,1,1], [2,1,1]]
+    with window.record_edit():
+        window.unlink_stored_cells()
+    assert not np.array_equal(widget.viewer.layers["Tracks"].data, linked_tracks)
+    widget.undo()
+    assert np.array_equal(widget.viewer.layers["Tracks"].data, linked_tracks)
+    widget.redo()
+    assert not np.array_equal(widget.viewer.layers["Tracks"].data, linked_tracks)
+    widget.undo()
+    widget.undo()
+    assert np.array_equal(widget.viewer.layers["Tracks"].data, initial_tracks)
+
 ### Untested Functions
 ## on_clicks
 # coordinate_tracking_on_click
@@ -0,0 +1,95 @@
+"""Module providing tests for the tracks table."""
+import numpy as np
+import pytest
+from napari.layers import Tracks
+
+from mmv_h4tracks import _tracks_table
+from mmv_h4tracks._tracks_table import (
+    TracksTable,
+    get_tracks_table,
+    insert_entries,
+    relabel_rows,
+    relabel_tracks,
+)
+
+pytestmark = pytest.mark.tracking
+
+
+@pytest.fixture
+def tracks():
+    return np.array(
+        [
+            [1, 0, 10, 10],
+            [1, 1, 11, 10],
+            [3, 0, 20, 20],
+            [2, 0, 30, 30],
+            [3, 1, 21, 20],
+            [2, 1, 11, 10],
+        ]
+    )
+
+
+@pytest.mark.unit
+def test_cell_lookup(tracks):
+    table = TracksTable(tracks)
+    assert table.get_row([1, 11, 10]) == 1
+    assert table.get_rows([1, 11, 10]) == [1, 5]
+    assert table.get_rows(np.array([0, 30, 30])) == [3]
+    assert table.get_track_id([1, 21, 20]) == 3
+    assert table.get_row([2, 0, 0]) is None
+    assert table.get_rows([2, 0, 0]) == []
+    assert table.get_track_id([2, 0, 0]) is None
+
+
+@pytest.mark.unit
+def test_track_lookup(tracks):
+    table = TracksTable(tracks)
+    assert list(table.get_track_rows(3)) == [2, 4]
+    assert np.array_equal(table.get_track(2), tracks[[3, 5]])
+    assert len(table.get_track(4)) == 0
+
+
+@pytest.mark.unit
+def test_get_tracks_table(tracks):
+    layer = Tracks(sort_tracks(tracks))
+    table = get_tracks_table(layer)
+    assert get_tracks_table(layer) is table
+    assert get_tracks_table(Tracks(layer.data)) is not table
+    layer.data = layer.data[:-1]
+    assert _tracks_table._LAYER_TABLES[layer] is None
+    assert get_tracks_table(layer) is not table
+    assert get_tracks_table(layer).tracks is layer.data
+
+
+def sort_tracks(tracks):
+    return tracks[np.lexsort((tracks[:, 1], tracks[:, 0]))]
+
+
+@pytest.fixture
+def sorted_tracks():
+    rng = np.random.default_rng(0)
+    tracks = np.zeros((200, 4), dtype=np.int64)
+    tracks[:, 0] = rng.integers(1, 30, 200)
+    tracks[:, 1] = rng.permutation(200) % 50
+    tracks[:, 2:] = rng.integers(0, 100, (200, 2))
+    return sort_tracks(tracks)
+
+
+@pytest.mark.unit
+def test_insert_entries(sorted_tracks):
+    entries = [[40, 3, 1, 1], [5, 7, 2, 2], [40, 1, 3, 3], [0, 0, 4, 4]]
+    result = insert_entries(sorted_tracks, entries)
+    expected = sort_tracks(np.concatenate([sorted_tracks, entries]))
+    assert np.array_equal(result, expected)
+
+
+@pytest.mark.unit
+def test_relabel(sorted_tracks):
+    result = relabel_tracks(sorted_tracks, [3, 7, 99], 5)
+    expected = sorted_tracks.copy()
+    expected[np.isin(expected[:, 0], [3, 7]), 0] = 5
+    assert np.array_equal(result, sort_tracks(expected))
+    result = relabel_rows(sorted_tracks, [10, 11, 12], 30)
+    expected = sorted_tracks.copy()
+    expected[10:13, 0] = 30
+    assert np.array_equal(result, sort_tracks(expected))
@@ -0,0 +1,84 @@
+"""Module providing tests for the zarr export."""
+import numpy as np
+import pytest
+import zarr
+from napari.layers import Image, Labels, Tracks
+
+import mmv_h4tracks._writer as writer
+from mmv_h4tracks._zarr_export import get_export_profile, get_label_dtype
+from mmv_h4tracks._frame_changes import track_frame_changes
+from mmv_h4tracks._lazy_frames import LazyFrames
+
+
+@pytest.mark.unit
+def test_export_profile():
+    raw_data = np.zeros((3, 4096, 4096), dtype=np.uint16)
+    profile = get_export_profile("raw_data", raw_data)
+    assert profile["dtype"] == np.uint16
+    assert profile["chunks"] == (1, 2048, 4096)
+    assert profile["compressor"].cname == "zstd"
+    segmentation = np.zeros((3, 50, 50), dtype=np.int32)
+    assert get_label_dtype(segmentation) == np.uint8
+    segmentation[1, 5, 5] = 300
+    assert get_label_dtype(segmentation) == np.uint16
+    assert get_export_profile("segmentation_data", segmentation)["chunks"] == (
+        1,
+        50,
+        50,
+    )
+
+
+@pytest.mark.unit
+def test_save_new_file(monkeypatch):
+    monkeypatch.setattr(writer, "notify", lambda text: None)
+    raw_data = np.arange(2 * 10 * 10, dtype=np.uint16).reshape(2, 10, 10)
+    segmentation = np.zeros((2, 10, 10), dtype=np.int32)
+    segmentation[:, 2:4, 2:4] = 7
+    layers = [
+        Image(raw_data),
+        Labels(segmentation),
+        Tracks(np.array([[1, 0, 3, 3], [1, 1, 3, 3]])),
+    ]
+    zarr_file = zarr.group()
+    writer.save_zarr(zarr_file, layers, None, {"segmentation_data": {"dtype": "u2"}})
+    assert zarr_file["raw_data"].dtype == np.uint16
+    assert zarr_file["segmentation_data"].dtype == np.uint16
+    assert zarr_file["segmentation_data"].chunks == (1, 10, 10)
+    assert np.array_equal(zarr_file["raw_data"][:], raw_data)
+    assert np.array_equal(zarr_file["segmentation_data"][:], segmentation)
+
+    # labels that no longer fit the stored dtype rewrite the dataset
+    track_frame_changes(layers[1])
+    layers[1].paint((1, 8, 8), 70000, refresh=False)
+    writer.save_zarr(zarr_file, layers, None)
+    assert zarr_file["segmentation_data"].dtype == np.uint32
+    assert np.array_equal(zarr_file["segmentation_data"][:], layers[1].data)
+
+
+@pytest.mark.unit
+def test_widen_lazy_labels(monkeypatch):
+    monkeypatch.setattr(writer, "notify", lambda text: None)
+    zarr_file = zarr.group()
+    segmentation = np.zeros((3, 10, 10), dtype=np.uint8)
+    segmentation[:, 1:3, 1:3] = 5
+    zarr_file.create_dataset("raw_data", data=np.zeros((3, 10, 10)))
+    zarr_file.create_dataset("segmentation_data", data=segmentation, chunks=(1, 10, 10))
+    zarr_file.create_dataset(
+        "tracking_data", data=np.array([[1, 0, 2, 2], [1, 1, 2, 2]])
+    )
+    frames = LazyFrames(zarr_file["segmentation_data"], 1, np.int32)
+    layers = [
+        Image(zarr_file["raw_data"]),
+        Labels(frames),
+        Tracks(zarr_file["tracking_data"][:]),
+    ]
+    track_frame_changes(layers[0])
+    track_frame_changes(layers[1])
+    layers[1].data_setitem((np.array([2]), np.array([8]), np.array([8])), 1000)
+    writer.save_zarr(zarr_file, layers, None)
+    segmentation = segmentation.astype(np.uint16)
+    segmentation[2, 8, 8] = 1000
+    assert zarr_file["segmentation_data"].dtype == np.uint16
+    assert np.array_equal(zarr_file["segmentation_data"][:], segmentation)
+    assert np.array_equal(np.asarray(frames), segmentation)
+    assert "segmentation_data_incomplete" not in zarr_file
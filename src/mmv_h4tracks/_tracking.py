@@ -1,9 +1,8 @@
-from multiprocessing import Pool
+from contextlib import contextmanager
 from threading import Event
 
 import napari
 import numpy as np
-import pandas as pd
 from napari.qt.threading import thread_worker
 from qtpy.QtCore import Qt
 from qtpy.QtWidgets import (
@@ -24,6 +23,14 @@ from ._logger import notify, notify_with_delay, choice_dialog, handle_exception
 from ._grabber import grab_layer
 from ._logger import choice_dialog, notify, notify_with_delay
 import mmv_h4tracks._processing as processing
+import mmv_h4tracks.pipeline as pipeline
+from ._journal import diff_tracks
+from ._label_index import LabelIndex, get_label_index
+from ._tracks_table import (
+    get_tracks_table,
+    insert_entries,
+    relabel_tracks,
+)
 
 LINK_TEXT = "Link tracks"
 UNLINK_TEXT = "Unlink tracks"
@@ -41,7 +48,7 @@ class TrackingWindow(QWidget):
     -------
     """
 
-    MIN_TRACK_LENGTH = 5
+    MIN_TRACK_LENGTH = pipeline.MIN_TRACK_LENGTH
 
     def __init__(self, parent):
         """
@@ -223,56 +230,13 @@ class TrackingWindow(QWidget):
         if label_layer is None:
             raise ValueError("No segmentation layer to track")
 
-        AMOUNT_OF_PROCESSES = self.parent.get_process_limit()
-
-        track_id = 1
-        for start_slice in range(len(label_layer.data) - self.MIN_TRACK_LENGTH):
-            threads_input = []
-            for label_id in np.unique(label_layer.data[start_slice]):
-                if label_id == 0:
-                    continue
-                if track_id > 1:
-                    # calculate centroid of the cell
-                    centroid = ndimage.center_of_mass(
-                        label_layer.data[start_slice],
-                        labels=label_layer.data[start_slice],
-                        index=label_id,
-                    )
-                    centroid = [
-                        start_slice,
-                        int(np.rint(centroid[0])),
-                        int(np.rint(centroid[1])),
-                    ]
-                    # check if the cell is already tracked
-                    tracked = False
-                    for track in tracks:
-                        if np.all(centroid == track[1:4]):
-                            tracked = True
-                    if tracked:
-                        continue
-                threads_input.append([label_layer.data, start_slice, label_id])
-
-            with Pool(AMOUNT_OF_PROCESSES) as pool:
-                track_cells = pool.starmap(func, threads_input)
-
-            for entry in track_cells:
-                if entry is None:
-                    continue
-                for line in entry:
-                    try:
-                        tracks = np.r_[tracks, [[track_id] + line]]
-                    except UnboundLocalError:
-                        tracks = np.array([[track_id] + line])
-                track_id += 1
-
-        if not "tracks" in locals():
-            return None
-
-        tracks = np.array(tracks)
-        df = pd.DataFrame(tracks, columns=["ID", "Z", "Y", "X"])
-        df.sort_values(["ID", "Z"], ascending=True, inplace=True)
+        tracks = pipeline.track_overlap(
+            label_layer.data, self.parent.get_pool(), self.MIN_TRACK_LENGTH
+        )
         QApplication.restoreOverrideCursor()
-        return df.values
+        if len(tracks) == 0:
+            return None
+        return tracks
 
     def single_overlap_tracking_on_click(self):
         if self.cached_tracks is not None:
@@ -297,16 +261,28 @@ class TrackingWindow(QWidget):
                 return
 
             worker = self.worker_single_overlap_tracking(
-                label_layer.data, int(event.position[0]), selected_cell
+                label_layer.data,
+                int(event.position[0]),
+                selected_cell,
+                get_label_index(label_layer),
             )
-            worker.returned.connect(self.evaluate_proposed_track)
+
+            def record_proposed_track(proposed_track):
+                with self.record_edit():
+                    self.evaluate_proposed_track(proposed_track)
+
+            worker.returned.connect(record_proposed_track)
 
         self.set_callback(overlap_tracking_callback)
         QApplication.setOverrideCursor(Qt.CrossCursor)
 
     @thread_worker(connect={"errored": handle_exception})
     def worker_single_overlap_tracking(
-        self, segmentation: np.ndarray, slice_id: int, selected_cell: int
+        self,
+        segmentation: np.ndarray,
+        slice_id: int,
+        selected_cell: int,
+        label_index: LabelIndex = None,
     ):
         """
         Perform single cell overlap based tracking
@@ -319,6 +295,8 @@ class TrackingWindow(QWidget):
             The slice to track the cell from
         selected_cell : int
             The selected cell
+        label_index : LabelIndex, optional
+            The label index of the segmentation
 
         Returns
         -------
@@ -328,44 +306,36 @@ class TrackingWindow(QWidget):
         self.restore_callbacks()
         start_slice = slice_id
         track = []
-        MIN_OVERLAP = 0.7
         if segmentation.shape[0] - slice_id < self.MIN_TRACK_LENGTH:
             # Cell is too close to the end to have a track long enough
             return track
-        cell_indices = np.where(segmentation[slice_id] == selected_cell)
+        if label_index is None:
+            label_index = LabelIndex(segmentation)
+        cell_indices = label_index.get_locations(slice_id, selected_cell)
         while slice_id + 1 < segmentation.shape[0]:
             matched_ids = segmentation[slice_id + 1][cell_indices]
             matched_ids_counted = np.unique(matched_ids, return_counts=True)
             index_highest_overlap = np.argmax(matched_ids_counted[1])
             if (
                 matched_ids_counted[1][index_highest_overlap]
-                <= MIN_OVERLAP * np.sum(matched_ids_counted[1])
+                <= pipeline.MIN_OVERLAP * np.sum(matched_ids_counted[1])
                 or matched_ids_counted[0][index_highest_overlap] == 0
             ):
                 # No cell with big enough overlap found
                 return track
 
             if slice_id == start_slice:
-                centroid = ndimage.center_of_mass(
-                    segmentation[slice_id],
-                    labels=segmentation[slice_id],
-                    index=selected_cell,
-                )
+                centroid = np.mean(cell_indices, axis=1)
                 track.append(
                     [slice_id, int(np.rint(centroid[0])), int(np.rint(centroid[1]))]
                 )
-            centroid = ndimage.center_of_mass(
-                segmentation[slice_id + 1],
-                labels=segmentation[slice_id + 1],
-                index=matched_ids_counted[0][index_highest_overlap],
-            )
-            track.append(
-                [slice_id + 1, int(np.rint(centroid[0])), int(np.rint(centroid[1]))]
-            )
-
             selected_cell = matched_ids_counted[0][index_highest_overlap]
             slice_id += 1
-            cell_indices = np.where(segmentation[slice_id] == selected_cell)
+            cell_indices = label_index.get_locations(slice_id, selected_cell)
+            centroid = np.mean(cell_indices, axis=1)
+            track.append(
+                [slice_id, int(np.rint(centroid[0])), int(np.rint(centroid[1]))]
+            )
 
         return track
 
@@ -393,21 +363,24 @@ class TrackingWindow(QWidget):
         entries_to_add = []
         ids_to_change = []
 
+        tracks_table = get_tracks_table(tracks_layer)
         track_id: int = None
         for entry in proposed_track:
             # Check if the entry exists in the tracks layer
             existing_entry = [
-                track for track in tracks_layer.data if np.all(track[1:4] == entry)
+                tracks_layer.data[row] for row in tracks_table.get_rows(entry)
             ]
             if len(existing_entry) > 1 and track_id is None:
                 track_id = existing_entry[0][0]
-            diverging_entries = [
-                track
-                for track in tracks_layer.data
-                if (track[0] in ids_to_change or track[0] == track_id)
-                and track[1] == entry[0]
-                and len(existing_entry) == 0
-            ]
+            diverging_entries = []
+            if len(existing_entry) == 0:
+                diverging_entries = [
+                    track
+                    for touched_id in ids_to_change + [track_id]
+                    if touched_id is not None
+                    for track in tracks_table.get_track(touched_id)
+                    if track[1] == entry[0]
+                ]
 
             if diverging_entries:
                 # Diverging tracks
@@ -419,9 +392,7 @@ class TrackingWindow(QWidget):
             else:
                 if track_id is None:
                     track_id = existing_entry[0][0]
-                    existing_track = np.array(
-                        [track for track in tracks_layer.data if track[0] == track_id]
-                    )
+                    existing_track = tracks_table.get_track(track_id)
                     if np.min(existing_track[:, 1]) < existing_entry[0][1]:
                         # Converging tracks
                         track_id = None
@@ -431,13 +402,7 @@ class TrackingWindow(QWidget):
                     existing_entry[0][0] != track_id
                     and not existing_entry[0][0] in ids_to_change
                 ):
-                    existing_track = np.array(
-                        [
-                            track
-                            for track in tracks_layer.data
-                            if track[0] == existing_entry[0][0]
-                        ]
-                    )
+                    existing_track = tracks_table.get_track(existing_entry[0][0])
                     if np.min(existing_track[:, 1]) < existing_entry[0][1]:
                         # Converging tracks
                         break
@@ -447,8 +412,8 @@ class TrackingWindow(QWidget):
         if track_id is None:
             track_id = np.amax(tracks_layer.data[:, 0]) + 1
 
-        for old_id in ids_to_change:
-            self.assign_new_track_id(tracks_layer, old_id, track_id)
+        if ids_to_change:
+            self.assign_new_track_id(tracks_layer, ids_to_change, track_id)
 
         if entries_to_add:
             if len(entries_to_add) < self.MIN_TRACK_LENGTH and track_id == np.amax(
@@ -464,7 +429,7 @@ class TrackingWindow(QWidget):
 
         QApplication.restoreOverrideCursor()
 
-    def assign_new_track_id(self, tracks_layer, old_id: int, new_id: int):
+    def assign_new_track_id(self, tracks_layer, old_id, new_id: int):
         """
         Assign a new track id to the cells with the old id
 
@@ -472,16 +437,12 @@ class TrackingWindow(QWidget):
         ----------
         tracks_layer : napari layer
             The tracks to update
-        old_id : int
-            The old id
+        old_id : int or list of int
+            The old id, or the old ids of multiple tracks
         new_id : int
             The new id
         """
-        tracks = tracks_layer.data
-        tracks[tracks[:, 0] == old_id, 0] = new_id
-        df = pd.DataFrame(tracks, columns=["ID", "Z", "Y", "X"])
-        df.sort_values(["ID", "Z"], ascending=True, inplace=True)
-        tracks_layer.data = df.values
+        tracks_layer.data = relabel_tracks(tracks_layer.data, old_id, new_id)
 
     def link_tracks_on_click(self):
         """
@@ -553,7 +514,8 @@ class TrackingWindow(QWidget):
                 if retval != 0:
                     return
                 self.parent.tracking_window.display_cached_tracks()
-            self.link_stored_cells()
+            with self.record_edit():
+                self.link_stored_cells()
 
     def link_stored_cells(self):
         """
@@ -597,16 +559,16 @@ class TrackingWindow(QWidget):
         for cell in self.selected_cells:
             if tracks_layer is None:
                 break
-            for track_line in tracks_layer.data:
-                if np.all(track_line[1:4] == cell):
-                    track_id_matches.append(track_line[0])
+            tracks_table = get_tracks_table(tracks_layer)
+            for row in tracks_table.get_rows(cell):
+                track_id_matches.append(tracks_layer.data[row, 0])
 
         track_id_matches = list(set(track_id_matches))
 
         contained_tracks = []
         cell_tuples = [tuple(cell) for cell in self.selected_cells]
         for track_id in track_id_matches:
-            track = tracks_layer.data[tracks_layer.data[:, 0] == track_id]
+            track = get_tracks_table(tracks_layer).get_track(track_id)
             track_tuples = [tuple(track_line[1:4]) for track_line in track]
             # check if all of track's cells are in the selected cells
             if all(track_tuple in cell_tuples for track_tuple in track_tuples):
@@ -623,7 +585,7 @@ class TrackingWindow(QWidget):
                 for track_id in track_id_matches
                 if track_id not in contained_tracks
             ][0]
-            track = tracks_layer.data[tracks_layer.data[:, 0] == touched_track_id]
+            track = get_tracks_table(tracks_layer).get_track(touched_track_id)
             entries_to_add = []
             for cell in self.selected_cells:
                 tracked = False
@@ -643,11 +605,12 @@ class TrackingWindow(QWidget):
         else:
             # multiple tracks contain cells from the selected cells & are not contained
             # check if more than one track has same z
+            tracks_table = get_tracks_table(tracks_layer)
             z_values = [
                 track_line[1]
-                for track_line in tracks_layer.data
-                if track_line[0] in track_id_matches
-                and not track_line[0] in contained_tracks
+                for track_id in track_id_matches
+                if not track_id in contained_tracks
+                for track_line in tracks_table.get_track(track_id)
             ]
             if len(z_values) != len(set(z_values)):
                 # Not sure if there is a simple way to find the offending tracks
@@ -661,7 +624,7 @@ class TrackingWindow(QWidget):
                 for track_id in track_id_matches
                 if track_id not in contained_tracks
             ]:
-                track = tracks_layer.data[tracks_layer.data[:, 0] == touched_track_id]
+                track = tracks_table.get_track(touched_track_id)
                 for cell in self.selected_cells:
                     for track_line in track:
                         if cell[0] == track_line[1]:
@@ -680,8 +643,10 @@ class TrackingWindow(QWidget):
             if len(entries_to_add) > 0:
                 self.add_entries_to_tracks(entries_to_add, track_id_matches[0])
 
-        for track_id in track_id_matches[1:]:
-            self.assign_new_track_id(tracks_layer, track_id, track_id_matches[0])
+        if len(track_id_matches) > 1:
+            self.assign_new_track_id(
+                tracks_layer, track_id_matches[1:], track_id_matches[0]
+            )
 
     def unlink_tracks_on_click(self):
         """
@@ -731,7 +696,8 @@ class TrackingWindow(QWidget):
             self.reset_button_labels()
             self.restore_callbacks()
             QApplication.restoreOverrideCursor()
-            self.unlink_stored_cells()
+            with self.record_edit():
+                self.unlink_stored_cells()
 
     def unlink_stored_cells(self):
         """
@@ -747,11 +713,11 @@ class TrackingWindow(QWidget):
             notify("Please select a valid tracks layer.")
             return
 
+        tracks_table = get_tracks_table(tracks_layer)
         track_id_matches = []
         for cell in self.selected_cells:
-            for track_line in tracks_layer.data:
-                if np.all(track_line[1:4] == cell):
-                    track_id_matches.append(track_line[0])
+            for row in tracks_table.get_rows(cell):
+                track_id_matches.append(tracks_layer.data[row, 0])
 
         if len(set(track_id_matches)) != 1:
             notify("Please select cells from the same track to disconnect.")
@@ -763,11 +729,7 @@ class TrackingWindow(QWidget):
 
         min_z = np.min(np.asarray(self.selected_cells)[:, 0])
         max_z = np.max(np.asarray(self.selected_cells)[:, 0])
-        track = [
-            track_line[1:4]
-            for track_line in tracks_layer.data
-            if track_line[0] == track_id_matches[0]
-        ]
+        track = list(tracks_table.get_track(track_id_matches[0])[:, 1:4])
         min_z_track = np.min(np.asarray(track)[:, 0])
         max_z_track = np.max(np.asarray(track)[:, 0])
         if max_z - min_z != len(self.selected_cells) - 1:
@@ -883,40 +845,43 @@ class TrackingWindow(QWidget):
             notify("Only displayed tracks can be deleted.")
             return
 
-        # check if all displayed tracks are selected for deletion
-        if np.all(np.isin(tracks_layer.data[:, 0], tracks_to_delete)):
-            if self.cached_tracks is None:
-                msg = QMessageBox()
-                msg.setIcon(QMessageBox.Warning)
-                msg.setText("Are you sure you want to delete all displayed tracks?")
-                msg.setInformativeText(
-                    "This action can not be undone. If you want to delete only some tracks, use the delete field."
-                )
-                msg.setWindowTitle("Delete all displayed tracks")
-                msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
-                ret = msg.exec_()
-                if ret == QMessageBox.Yes:
-                    self.viewer.layers.remove(tracks_layer.name)
-                    self.viewer.layers.select_next()
-                return
-            # remove selected tracks from the cached tracks
-            self.cached_tracks = np.delete(
-                self.cached_tracks,
-                np.isin(self.cached_tracks[:, 0], tracks_to_delete),
-                0,
-            )
-            tracks_layer.data = self.cached_tracks
-            self.cached_tracks = None
-        else:
-            tracks_layer.data = np.delete(
-                tracks_layer.data, np.isin(tracks_layer.data[:, 0], tracks_to_delete), 0
-            )
-            if self.cached_tracks is not None:
+        with self.record_edit():
+            # check if all displayed tracks are selected for deletion
+            if np.all(np.isin(tracks_layer.data[:, 0], tracks_to_delete)):
+                if self.cached_tracks is None:
+                    msg = QMessageBox()
+                    msg.setIcon(QMessageBox.Warning)
+                    msg.setText("Are you sure you want to delete all displayed tracks?")
+                    msg.setInformativeText(
+                        "Press U to undo. If you want to delete only some tracks, use the delete field."
+                    )
+                    msg.setWindowTitle("Delete all displayed tracks")
+                    msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+                    ret = msg.exec_()
+                    if ret == QMessageBox.Yes:
+                        self.viewer.layers.remove(tracks_layer.name)
+                        self.viewer.layers.select_next()
+                    return
+                # remove selected tracks from the cached tracks
                 self.cached_tracks = np.delete(
                     self.cached_tracks,
                     np.isin(self.cached_tracks[:, 0], tracks_to_delete),
                     0,
                 )
+                tracks_layer.data = self.cached_tracks
+                self.cached_tracks = None
+            else:
+                tracks_layer.data = np.delete(
+                    tracks_layer.data,
+                    np.isin(tracks_layer.data[:, 0], tracks_to_delete),
+                    0,
+                )
+                if self.cached_tracks is not None:
+                    self.cached_tracks = np.delete(
+                        self.cached_tracks,
+                        np.isin(self.cached_tracks[:, 0], tracks_to_delete),
+                        0,
+                    )
         if len(non_existing_tracks) > 0:
             message = f"Tracks {non_existing_tracks} do not exist and were not deleted."
             if len(tracks_to_delete) > 0:
@@ -933,35 +898,36 @@ class TrackingWindow(QWidget):
             notify("Please select a valid tracks layer.")
             return
 
-        if self.cached_tracks is None:
-            msg = QMessageBox()
-            msg.setIcon(QMessageBox.Warning)
-            msg.setText("Are you sure you want to delete all tracks?")
-            msg.setInformativeText(
-                "This action can not be undone. If you want to delete only some tracks, use the delete field."
-            )
-            msg.setWindowTitle("Delete all tracks")
-            msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
-            ret = msg.exec_()
-            if ret == QMessageBox.No:
-                return
-            self.viewer.layers.remove(tracks_layer.name)
-            self.viewer.layers.select_next()
-        else:
-            cached_tracks_view = self.cached_tracks.view(
-                [("", self.cached_tracks.dtype)] * self.cached_tracks.shape[1]
-            )
-            tracks_layer_data_view = tracks_layer.data.view(
-                [("", tracks_layer.data.dtype)] * tracks_layer.data.shape[1]
-            )
+        with self.record_edit():
+            if self.cached_tracks is None:
+                msg = QMessageBox()
+                msg.setIcon(QMessageBox.Warning)
+                msg.setText("Are you sure you want to delete all tracks?")
+                msg.setInformativeText(
+                    "Press U to undo. If you want to delete only some tracks, use the delete field."
+                )
+                msg.setWindowTitle("Delete all tracks")
+                msg.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+                ret = msg.exec_()
+                if ret == QMessageBox.No:
+                    return
+                self.viewer.layers.remove(tracks_layer.name)
+                self.viewer.layers.select_next()
+            else:
+                cached_tracks_view = self.cached_tracks.view(
+                    [("", self.cached_tracks.dtype)] * self.cached_tracks.shape[1]
+                )
+                tracks_layer_data_view = tracks_layer.data.view(
+                    [("", tracks_layer.data.dtype)] * tracks_layer.data.shape[1]
+                )
 
-            diff_view = np.setdiff1d(cached_tracks_view, tracks_layer_data_view)
+                diff_view = np.setdiff1d(cached_tracks_view, tracks_layer_data_view)
 
-            tracks_layer.data = diff_view.view(tracks_layer.data.dtype).reshape(
-                -1, tracks_layer.data.shape[1]
-            )
-            self.cached_tracks = None
-            self.lineedit_filter.clear()
+                tracks_layer.data = diff_view.view(tracks_layer.data.dtype).reshape(
+                    -1, tracks_layer.data.shape[1]
+                )
+                self.cached_tracks = None
+                self.lineedit_filter.clear()
 
     def process_new_tracks(self, tracks: np.ndarray):
         """
@@ -1081,10 +1047,7 @@ class TrackingWindow(QWidget):
             tracks_objects.append(self.cached_tracks)
         cells = [np.insert(cell, 0, track_id) for cell in cells]
         for tracks in tracks_objects:
-            tracks = np.r_[tracks, cells]
-            df = pd.DataFrame(tracks, columns=["ID", "Z", "Y", "X"])
-            df.sort_values(["ID", "Z"], ascending=True, inplace=True)
-            results_tracks.append(df.values)
+            results_tracks.append(insert_entries(tracks, cells))
 
         tracks_layer.data = results_tracks[0]
         if len(results_tracks) > 1:
@@ -1109,8 +1072,7 @@ class TrackingWindow(QWidget):
         tracks = tracks_layer.data
         track_id = np.amax(tracks[:, 0]) + 1
         track = np.insert(track, 0, track_id, axis=1)
-        tracks = np.r_[tracks, track]
-        tracks_layer.data = tracks
+        tracks_layer.data = insert_entries(tracks, track)
 
     def get_tracks_layer(self):
         """
@@ -1127,6 +1089,67 @@ class TrackingWindow(QWidget):
         except ValueError:
             return None
 
+    def get_all_tracks(self):
+        """
+        Returns all tracks, including the ones hidden by the filter
+
+        Returns
+        -------
+        tracks : np.ndarray
+            The tracks, None if there are no tracks
+        """
+        if self.cached_tracks is not None:
+            return self.cached_tracks
+        tracks_layer = self.get_tracks_layer()
+        if tracks_layer is None:
+            return None
+        return tracks_layer.data
+
+    def set_all_tracks(self, tracks, track_ids=()):
+        """
+        Replaces all tracks, keeping the current filter
+
+        Parameters
+        ----------
+        tracks : np.ndarray
+            The tracks, None to remove the tracks layer
+        track_ids : list
+            Ids of tracks to display in addition to the displayed ones
+        """
+        tracks_layer = self.get_tracks_layer()
+        if tracks is None or len(tracks) == 0:
+            self.cached_tracks = None
+            if tracks_layer is not None:
+                self.viewer.layers.remove(tracks_layer.name)
+            return
+        if tracks_layer is None:
+            self.cached_tracks = None
+            tracks_layer = self.viewer.add_tracks(tracks, name="Tracks")
+            self.parent.combobox_tracks.setCurrentText(tracks_layer.name)
+            return
+        if self.cached_tracks is not None:
+            displayed_ids = np.union1d(tracks_layer.data[:, 0], track_ids)
+            displayed_tracks = tracks[np.isin(tracks[:, 0], displayed_ids)]
+            if len(displayed_tracks) > 0:
+                self.cached_tracks = tracks
+                tracks_layer.data = displayed_tracks
+                return
+            self.cached_tracks = None
+        tracks_layer.data = tracks
+
+    @contextmanager
+    def record_edit(self):
+        """
+        Records the changes made to the tracks and the segmentation inside the context
+        as one entry of the edit journal
+        """
+        before = self.get_all_tracks()
+        with self.parent.journal.operation():
+            yield
+            after = self.get_all_tracks()
+            if after is not before:
+                self.parent.journal.record(diff_tracks(before, after))
+
     def restore_callbacks(self):
         if len(self.viewer.layers) == 0:
             return
@@ -1158,64 +1181,3 @@ class TrackingWindow(QWidget):
         """
         self.btn_insert_correspondence.setText(LINK_TEXT)
         self.btn_remove_correspondence.setText(UNLINK_TEXT)
-
-
-def func(label_data, start_slice, id):
-    """
-    Performs the proximity tracking for a single cell
-
-    Parameters
-    ----------
-    label_data : np.ndarray
-        The label data
-    start_slice : int
-        The slice to start the tracking
-    id : int
-        The id of the cell to track
-
-    Returns
-    -------
-    track_cells : list
-        The tracked cells
-    """
-    MIN_OVERLAP = 0.7
-
-    slice_id = start_slice
-
-    track_cells = []
-    cell = np.where(label_data[start_slice] == id)
-    while slice_id + 1 < len(label_data):
-        matching = label_data[slice_id + 1][cell]
-        matches = np.unique(matching, return_counts=True)
-        maximum = np.argmax(matches[1])
-        if (
-            matches[1][maximum] <= MIN_OVERLAP * np.sum(matches[1])
-            or matches[0][maximum] == 0
-        ):
-            if len(track_cells) < TrackingWindow.MIN_TRACK_LENGTH:
-                return
-            return track_cells
-
-        if slice_id == start_slice:
-            centroid = ndimage.center_of_mass(
-                label_data[slice_id], labels=label_data[slice_id], index=id
-            )
-            track_cells.append(
-                [slice_id, int(np.rint(centroid[0])), int(np.rint(centroid[1]))]
-            )
-        centroid = ndimage.center_of_mass(
-            label_data[slice_id + 1],
-            labels=label_data[slice_id + 1],
-            index=matches[0][maximum],
-        )
-
-        track_cells.append(
-            [slice_id + 1, int(np.rint(centroid[0])), int(np.rint(centroid[1]))]
-        )
-
-        id = matches[0][maximum]
-        slice_id += 1
-        cell = np.where(label_data[slice_id] == id)
-    if len(track_cells) < TrackingWindow.MIN_TRACK_LENGTH:
-        return
-    return track_cells
@@ -0,0 +1,301 @@
+import weakref
+
+import numpy as np
+
+# Tables of the tracks layers, None after the data of the layer was replaced
+_LAYER_TABLES = weakref.WeakKeyDictionary()
+
+
+class TracksTable:
+    """
+    Indexes of a tracks array in napari's tracks format (ID, Z, Y, X).
+    Maps every cell (z,y,x) to its rows and every track id to its rows,
+    so entries can be looked up without iterating over the whole array.
+    """
+
+    def __init__(self, tracks):
+        """
+        Parameters
+        ----------
+        tracks : nd array
+            (N,4) shape array of the tracks
+        """
+        self.tracks = tracks
+        cells = np.asarray(tracks)[:, 1:4].astype(np.int64)
+        # Every cell is packed into a single key, rows of the same cell stay in order
+        if len(cells):
+            self.cell_offset = cells.min(axis=0)
+            self.cell_shape = cells.max(axis=0) - self.cell_offset + 1
+        else:
+            self.cell_offset = np.zeros(3, dtype=np.int64)
+            self.cell_shape = np.zeros(3, dtype=np.int64)
+        keys = self._get_keys(cells)
+        self.cell_order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.cell_order]
+        ids = np.asarray(tracks)[:, 0]
+        self.order = np.argsort(ids, kind="stable")
+        self.sorted_ids = ids[self.order]
+
+    def _get_keys(self, cells):
+        """
+        Returns the keys of cells, -1 for cells outside of the tracked area
+
+        Parameters
+        ----------
+        cells : nd array
+            (N,3) shape int array of (z,y,x) positions
+
+        Returns
+        -------
+        nd array
+            the key of every cell
+        """
+        cells = cells - self.cell_offset
+        inside = np.all((cells >= 0) & (cells < self.cell_shape), axis=1)
+        keys = np.ravel_multi_index(
+            tuple(np.where(inside, cells.T, 0)), np.maximum(self.cell_shape, 1)
+        )
+        return np.where(inside, keys, -1)
+
+    def _get_cell_range(self, cell):
+        """
+        Returns the range of the sorted keys holding a cell
+
+        Parameters
+        ----------
+        cell : list
+            the (z,y,x) position of the cell
+
+        Returns
+        -------
+        tuple
+            start and stop in the sorted keys, equal if the cell is not tracked
+        """
+        cells = np.array([[int(value) for value in cell]], dtype=np.int64)
+        key = self._get_keys(cells)[0]
+        if key < 0:
+            return 0, 0
+        start = np.searchsorted(self.sorted_keys, key, side="left")
+        stop = np.searchsorted(self.sorted_keys, key, side="right")
+        return start, stop
+
+    def get_row(self, cell):
+        """
+        Returns the first row of a cell
+
+        Parameters
+        ----------
+        cell : list
+            the (z,y,x) position of the cell
+
+        Returns
+        -------
+        int
+            the row of the cell, None if the cell is not tracked
+        """
+        start, stop = self._get_cell_range(cell)
+        if start == stop:
+            return None
+        return int(self.cell_order[start])
+
+    def get_rows(self, cell):
+        """
+        Returns all rows of a cell
+
+        Parameters
+        ----------
+        cell : list
+            the (z,y,x) position of the cell
+
+        Returns
+        -------
+        list
+            the rows of the cell in ascending order, empty if the cell is not tracked
+        """
+        start, stop = self._get_cell_range(cell)
+        return self.cell_order[start:stop].tolist()
+
+    def get_track_id(self, cell):
+        """
+        Returns the id of the track containing a cell
+
+        Parameters
+        ----------
+        cell : list
+            the (z,y,x) position of the cell
+
+        Returns
+        -------
+        int
+            the track id, None if the cell is not tracked
+        """
+        row = self.get_row(cell)
+        if row is None:
+            return None
+        return self.tracks[row, 0]
+
+    def get_track_rows(self, track_id):
+        """
+        Returns the rows of a track
+
+        Parameters
+        ----------
+        track_id : int
+            the id of the track
+
+        Returns
+        -------
+        nd array
+            the rows of the track in ascending order, empty if the track doesn't exist
+        """
+        start = np.searchsorted(self.sorted_ids, track_id, side="left")
+        stop = np.searchsorted(self.sorted_ids, track_id, side="right")
+        return self.order[start:stop]
+
+    def get_track(self, track_id):
+        """
+        Returns the entries of a track
+
+        Parameters
+        ----------
+        track_id : int
+            the id of the track
+
+        Returns
+        -------
+        nd array
+            (N,4) shape array of the entries of the track
+        """
+        return self.tracks[self.get_track_rows(track_id)]
+
+
+def get_tracks_table(layer):
+    """
+    Returns the table of a tracks layer. The table is kept between calls
+    and rebuilt when the data of the layer is replaced.
+
+    Parameters
+    ----------
+    layer : napari.layers.Tracks
+        the tracks layer
+
+    Returns
+    -------
+    TracksTable
+        the table of the layer data
+    """
+    if layer not in _LAYER_TABLES:
+        layer.events.data.connect(_on_data)
+        _LAYER_TABLES[layer] = None
+    table = _LAYER_TABLES[layer]
+    if table is None or table.tracks is not layer.data:
+        table = TracksTable(layer.data)
+        _LAYER_TABLES[layer] = table
+    return table
+
+
+def _on_data(event):
+    """
+    Discards the table after the data of the layer was replaced
+    """
+    _LAYER_TABLES[event.source] = None
+
+
+def get_insert_positions(tracks, entries):
+    """
+    Returns the rows entries have to be inserted at to keep tracks sorted by ID and Z
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array of the tracks, sorted by ID and Z
+    entries : nd array
+        (M,4) shape array of the entries to insert
+
+    Returns
+    -------
+    nd array
+        the rows of the tracks array the entries belong in front of
+    """
+    starts = np.searchsorted(tracks[:, 0], entries[:, 0], side="left")
+    stops = np.searchsorted(tracks[:, 0], entries[:, 0], side="right")
+    return np.array(
+        [
+            start + np.searchsorted(tracks[start:stop, 1], z, side="right")
+            for start, stop, z in zip(starts, stops, entries[:, 1])
+        ],
+        dtype=np.intp,
+    )
+
+
+def insert_entries(tracks, entries):
+    """
+    Inserts entries into tracks sorted by ID and Z without sorting the whole array again
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array of the tracks, sorted by ID and Z
+    entries : array
+        (M,4) shape array of the entries to insert
+
+    Returns
+    -------
+    nd array
+        the tracks including the entries, sorted by ID and Z
+    """
+    entries = np.asarray(entries).reshape(-1, 4).astype(tracks.dtype)
+    entries = entries[np.lexsort((entries[:, 1], entries[:, 0]))]
+    return np.insert(tracks, get_insert_positions(tracks, entries), entries, axis=0)
+
+
+def relabel_rows(tracks, rows, new_id):
+    """
+    Moves entries to another track, keeping tracks sorted by ID and Z
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array of the tracks, sorted by ID and Z
+    rows : array
+        the rows of the entries to move
+    new_id : int
+        the id of the track to move the entries to
+
+    Returns
+    -------
+    nd array
+        the updated tracks, sorted by ID and Z
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    entries = tracks[rows]
+    entries[:, 0] = new_id
+    return insert_entries(np.delete(tracks, rows, 0), entries)
+
+
+def relabel_tracks(tracks, old_ids, new_id):
+    """
+    Assigns a new id to whole tracks, keeping tracks sorted by ID and Z
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array of the tracks, sorted by ID and Z
+    old_ids : int or list of int
+        the ids of the tracks to relabel
+    new_id : int
+        the new id
+
+    Returns
+    -------
+    nd array
+        the updated tracks, sorted by ID and Z
+    """
+    old_ids = np.atleast_1d(old_ids)
+    starts = np.searchsorted(tracks[:, 0], old_ids, side="left")
+    stops = np.searchsorted(tracks[:, 0], old_ids, side="right")
+    rows = np.concatenate(
+        [np.arange(start, stop) for start, stop in zip(starts, stops)]
+        + [np.zeros(0, dtype=np.intp)]
+    )
+    return relabel_rows(tracks, rows, new_id)
@@ -24,7 +24,6 @@ from qtpy.QtGui import QImage, QPixmap
 
 from pathlib import Path
 import numpy as np
-import copy
 import cv2
 import zarr
 from napari.layers.image.image import Image
@@ -39,6 +38,16 @@ from ._segmentation import SegmentationWindow
 from ._tracking import TrackingWindow
 from ._writer import save_zarr
 from ._grabber import grab_layer
+from ._journal import EditJournal, LabelsDiff
+from ._lazy_frames import LazyFrames
+from ._label_index import invalidate_label_index
+from ._morphology import invalidate_morphology_table
+from ._frame_changes import get_frame_changes, track_frame_changes
+import mmv_h4tracks.pipeline as pipeline
+
+
+# Size of raw data and segmentation above which zarr files are loaded lazily
+LAZY_LOAD_MIN_BYTES = 4 * 1024**3
 
 
 class MMVH4TRACKS(QWidget):
@@ -79,6 +88,7 @@ class MMVH4TRACKS(QWidget):
         viewer = napari.current_viewer() if viewer is None else viewer
         self.viewer = viewer
         self.initial_layers = [None, None]
+        self.journal = EditJournal()
 
         ### QObjects
 
@@ -120,6 +130,7 @@ class MMVH4TRACKS(QWidget):
         self.rb_eco = QRadioButton("Eco")
         rb_heavy = QRadioButton("Regular")
         rb_heavy.toggle()
+        self.rb_eco.toggled.connect(self.resize_pool)
 
         # Comboboxes
         self.combobox_image = QComboBox()
@@ -226,6 +237,8 @@ class MMVH4TRACKS(QWidget):
         custom_binds = [
             ("E", self.hotkey_next_free),
             ("S", self.hotkey_overlap_single_tracking),
+            ("U", self.hotkey_undo),
+            ("Shift-U", self.hotkey_redo),
         ]
         for custom_bind in custom_binds:
             if not custom_bind[0] in hotkeys:
@@ -263,6 +276,18 @@ class MMVH4TRACKS(QWidget):
         """
         self.tracking_window._add_auto_track_callback()
 
+    def hotkey_undo(self, _):
+        """
+        Hotkey for undoing the last edit
+        """
+        self.undo()
+
+    def hotkey_redo(self, _):
+        """
+        Hotkey for redoing the last undone edit
+        """
+        self.redo()
+
     def add_entry_to_comboboxes(self, event):
         """
         Adds a new entry to the comboboxes for the layers
@@ -419,11 +444,22 @@ class MMVH4TRACKS(QWidget):
                 # Yes -> Remove this layer
                 self.viewer.layers.remove(layername)
 
-        # add layers to viewer
-        self.viewer.add_image(zarr_file["raw_data"][:], name="Raw Image")
-        segmentation = zarr_file["segmentation_data"][:]
+        # add layers to viewer, large files are read frame by frame when needed
+        raw_data = zarr_file["raw_data"]
+        segmentation = zarr_file["segmentation_data"]
+        # labels are stored in the smallest sufficient dtype, edit them as at least 32 bit
+        label_dtype = np.promote_types(segmentation.dtype, np.int32)
+        if raw_data.nbytes + segmentation.nbytes < LAZY_LOAD_MIN_BYTES:
+            raw_data = raw_data[:]
+            segmentation = segmentation[:].astype(label_dtype, copy=False)
+        else:
+            segmentation = LazyFrames(segmentation, dtype=label_dtype)
+        raw_layer = self.viewer.add_image(raw_data, name="Raw Image")
 
-        self.viewer.add_labels(segmentation, name="Segmentation Data")
+        labels_layer = self.viewer.add_labels(segmentation, name="Segmentation Data")
+        # only changed frames are written back when saving
+        track_frame_changes(raw_layer)
+        track_frame_changes(labels_layer)
         # save tracks so we can delete one slice tracks first
         tracks = zarr_file["tracking_data"][:]
         # Filter track ids of tracks that just occur once
@@ -441,10 +477,9 @@ class MMVH4TRACKS(QWidget):
         self.viewer.add_tracks(filtered_tracks, name="Tracks")
 
         self.zarr = zarr_file
-        self.initial_layers = [
-            copy.deepcopy(segmentation),
-            copy.deepcopy(filtered_tracks),
-        ]
+        # The initial layers are reconstructed from the edit journal when needed
+        self.initial_layers = [None, None]
+        self.journal.reset(labels_layer, self.undo, self.redo)
         self.combobox_image.setCurrentText("Raw Image")
         self.combobox_segmentation.setCurrentText("Segmentation Data")
         self.combobox_tracks.setCurrentText("Tracks")
@@ -496,6 +531,97 @@ class MMVH4TRACKS(QWidget):
         zarrfile = zarr.open(path, mode="w")
         save_zarr(zarrfile, layers, self.tracking_window.cached_tracks)
 
+    def undo(self):
+        """
+        Reverts the last edit of the segmentation or the tracks
+        """
+        entry = self.journal.undo()
+        if entry is None:
+            notify("Nothing to undo.")
+            return
+        self.apply_journal_entry(entry, reverse=True)
+
+    def redo(self):
+        """
+        Applies the last undone edit of the segmentation or the tracks again
+        """
+        entry = self.journal.redo()
+        if entry is None:
+            notify("Nothing to redo.")
+            return
+        self.apply_journal_entry(entry)
+
+    def apply_journal_entry(self, entry, reverse=False):
+        """
+        Applies the changes of an entry of the edit journal to the layers
+
+        Parameters
+        ----------
+        entry : list
+            The changes of the entry
+        reverse : bool
+            Whether to revert the changes instead
+        """
+        for change in reversed(entry) if reverse else entry:
+            if isinstance(change, LabelsDiff):
+                labels_layer = self.journal.labels_layer
+                frames = change.apply(labels_layer.data, reverse)
+                invalidate_label_index(labels_layer, frames)
+                invalidate_morphology_table(labels_layer, frames)
+                changes = get_frame_changes(labels_layer)
+                if changes is not None:
+                    changes.mark(frames)
+                labels_layer.refresh()
+            else:
+                tracks = change.apply(self.tracking_window.get_all_tracks(), reverse)
+                shown_rows = change.removed if reverse else change.added
+                self.tracking_window.set_all_tracks(tracks, shown_rows[:, 0])
+
+    def get_initial_layers(self):
+        """
+        Returns the segmentation and tracks as they were computed or loaded, before any edits
+
+        Returns
+        -------
+        list
+            The initial segmentation and tracks, None if they are not available
+        """
+        segmentation, tracks = self.initial_layers
+        if self.journal.labels_layer is not None:
+            if segmentation is None:
+                segmentation = self.journal.get_initial_labels(
+                    self.journal.labels_layer.data
+                )
+            if tracks is None:
+                tracks = self.journal.get_initial_tracks(
+                    self.tracking_window.get_all_tracks()
+                )
+        return [segmentation, tracks]
+
+    def get_pool(self):
+        """
+        Returns the worker pool shared by all computations
+
+        Returns
+        -------
+        Pool
+            The worker pool, sized according to the computation mode
+        """
+        return pipeline.get_pool(self.get_process_limit())
+
+    def resize_pool(self):
+        """
+        Resizes the worker pool after the computation mode changed
+        """
+        pipeline.resize_pool(self.get_process_limit())
+
+    def closeEvent(self, event):
+        """
+        Shuts down the worker pool when the widget is closed
+        """
+        pipeline.close_pool()
+        super().closeEvent(event)
+
     def get_process_limit(self):
         """
         Returns the number of processes to use for computation
@@ -1,12 +1,12 @@
-import csv
-import locale
-
 import numpy as np
 import zarr
 import pandas as pd
 from qtpy.QtWidgets import QFileDialog, QMessageBox, QApplication
 
+from ._frame_changes import get_frame_changes
+from ._lazy_frames import LazyFrames
 from ._logger import choice_dialog, notify
+from ._zarr_export import create_dataset, fits_dtype
 
 
 def save_dialog(parent, filetype="*.zarr", directory=""):
@@ -38,7 +38,7 @@ def save_dialog(parent, filetype="*.zarr", directory=""):
     return filepath
 
 
-def save_zarr( zarr_file, layers, cached_tracks):
+def save_zarr( zarr_file, layers, cached_tracks, profile=None):
     """
     Saves the (changed) layers to a zarr file. Fails if required layers are missing
 
@@ -50,6 +50,9 @@ def save_zarr( zarr_file, layers, cached_tracks):
         The layers raw image, segmentation, tracks in order
     cached_tracks : array
         The cached tracks layer, can be None
+    profile : dict, optional
+        Overrides for the export profile of each dataset, e.g.
+        {"raw_data": {"chunks": (1, 512, 512)}}, see get_export_profile
     """
 
     response = 0
@@ -75,59 +78,70 @@ def save_zarr( zarr_file, layers, cached_tracks):
     # if response == 0:
     #     tracks = layers[2]
 
+    if profile is None:
+        profile = {}
+    datasets = {
+        "raw_data": layers[0].data,
+        "segmentation_data": layers[1].data,
+        "tracking_data": tracks,
+    }
     if not "raw_data" in zarr_file:
-        zarr_file.create_dataset(
-            "raw_data",
-            shape=layers[0].data.shape,
-            dtype="f8",
-            data=layers[0].data,
-        )
-        zarr_file.create_dataset(
-            "segmentation_data",
-            shape=layers[1].data.shape,
-            dtype="i4",
-            data=layers[1].data,
-        )
-        zarr_file.create_dataset(
-            "tracking_data", shape=tracks.shape, dtype="i4", data=tracks
-        )
+        bytes_written = 0
+        for name, data in datasets.items():
+            bytes_written += create_dataset(zarr_file, name, data, profile.get(name))
     else:
-        zarr_file["raw_data"][:] = layers[0].data
-        zarr_file["segmentation_data"][:] = layers[1].data
-        zarr_file["tracking_data"].resize(tracks.shape[0], tracks.shape[1])
-        zarr_file["tracking_data"][:] = tracks
+        bytes_written = 0
+        for name, layer in [("raw_data", layers[0]), ("segmentation_data", layers[1])]:
+            bytes_written += write_changed_frames(
+                zarr_file, name, layer, profile.get(name)
+            )
+        saved_tracks = zarr_file["tracking_data"]
+        if saved_tracks.shape != tracks.shape or not np.array_equal(
+            saved_tracks[:], tracks
+        ):
+            saved_tracks.resize(tracks.shape[0], tracks.shape[1])
+            saved_tracks[:] = tracks
+            bytes_written += saved_tracks.nbytes
     QApplication.restoreOverrideCursor()
-    notify("Zarr file has been saved.")
+    notify(f"Zarr file has been saved, {bytes_written / 1024**2:.1f} MB written.")
 
 
-def save_csv(file, data):
+def write_changed_frames(zarr_file, name, layer, settings=None):
     """
-    Save data to a csv file
+    Writes the frames of a layer that changed since it was loaded or last saved.
+    Layers that were not loaded from the file, or whose values no longer fit
+    the dtype of the dataset, are written completely.
 
     Parameters
     ----------
-    file : str
-        Path of the csv file to write to
-    data : list
-        CSV data to write to disk
-    """
-    default_locale = locale.getdefaultlocale()[0]
-    if default_locale.startswith("de"):
-        data = [convert_np64_to_string(sublist) for sublist in data]
-        delimiter = ";"
-    else:
-        delimiter = ","
-    csvfile = open(file[0], "w", newline="")
-    writer = csv.writer(csvfile, delimiter = delimiter)
-    [writer.writerow(row) for row in data]
-    csvfile.close()
-    print("CSV file has been saved.")
+    zarr_file : zarr
+        The zarr file to write to
+    name : str
+        The name of the dataset
+    layer : layer
+        The image or labels layer
+    settings : dict, optional
+        Overrides for the export profile if the dataset is created again
 
-def convert_np64_to_string(sublist):
-    converted_sublist = []
-    for item in sublist:
-        if isinstance(item, np.float64):
-            converted_sublist.append(str(item).replace(".", ","))
-        else:
-            converted_sublist.append(item)
-    return converted_sublist
\ No newline at end of file
+    Returns
+    -------
+    int
+        The amount of bytes written
+    """
+    dataset = zarr_file[name]
+    changes = get_frame_changes(layer)
+    if changes is None or dataset.shape != layer.data.shape:
+        return create_dataset(zarr_file, name, layer.data, settings)
+    changed_frames = changes.get_changed_frames(layer.data)
+    frames = {frame: np.asarray(layer.data[frame]) for frame in changed_frames}
+    if not all(fits_dtype(frame, dataset.dtype) for frame in frames.values()):
+        bytes_written = create_dataset(zarr_file, name, layer.data, settings)
+        changes.mark_saved(changed_frames)
+        # lazily loaded data has to read from the new dataset from now on
+        if isinstance(layer.data, LazyFrames):
+            layer.data.source = zarr_file[name]
+        return bytes_written
+    for frame, data in frames.items():
+        dataset[frame] = data
+    changes.mark_saved(changed_frames)
+    return len(changed_frames) * dataset.nbytes // max(len(dataset), 1)
@@ -0,0 +1,154 @@
+import numpy as np
+from numcodecs import Blosc
+
+# Compression of the datasets written to zarr files
+EXPORT_CODEC = "zstd"
+EXPORT_LEVEL = 5
+# Frames larger than this are split into tiles
+MAX_CHUNK_BYTES = 16 * 1024**2
+
+
+def create_dataset(zarr_file, name, data, settings=None):
+    """
+    Writes data to a new dataset, replacing an existing one, using the export profile
+
+    Parameters
+    ----------
+    zarr_file : zarr
+        The zarr file to write to
+    name : str
+        The name of the dataset
+    data : array
+        The data to write
+    settings : dict, optional
+        Overrides for the export profile, see get_export_profile
+
+    Returns
+    -------
+    int
+        The amount of bytes written
+    """
+    settings = {**get_export_profile(name, data), **(settings or {})}
+    # the data may be read from the dataset it replaces, write a copy first
+    temporary_name = f"{name}_incomplete"
+    dataset = zarr_file.create_dataset(
+        temporary_name, shape=data.shape, overwrite=True, **settings
+    )
+    for start in range(0, len(data), dataset.chunks[0]):
+        stop = start + dataset.chunks[0]
+        dataset[start:stop] = np.asarray(data[start:stop])
+    if name in zarr_file:
+        del zarr_file[name]
+    zarr_file.move(temporary_name, name)
+    return dataset.nbytes
+
+
+def get_export_profile(
+    name, data, codec=EXPORT_CODEC, level=EXPORT_LEVEL, max_chunk_bytes=MAX_CHUNK_BYTES
+):
+    """
+    Chooses the dtype, chunks and compression of a dataset from its data.
+    The raw data keeps its dtype, the segmentation uses the smallest sufficient
+    label dtype and both are chunked per frame, tiled if a frame is too large.
+
+    Parameters
+    ----------
+    name : str
+        The name of the dataset
+    data : array
+        The data of the dataset
+    codec : str
+        The Blosc codec
+    level : int
+        The compression level
+    max_chunk_bytes : int
+        The maximum size of a chunk
+
+    Returns
+    -------
+    dict
+        The dtype, chunks and compressor of the dataset
+    """
+    compressor = Blosc(cname=codec, clevel=level, shuffle=Blosc.SHUFFLE)
+    if name == "tracking_data":
+        return {"dtype": "i4", "chunks": True, "compressor": compressor}
+    if name == "segmentation_data":
+        dtype = get_label_dtype(data)
+    else:
+        dtype = np.dtype(data.dtype)
+    return {
+        "dtype": dtype,
+        "chunks": get_chunks(data.shape, dtype, max_chunk_bytes),
+        "compressor": compressor,
+    }
+
+
+def get_chunks(shape, dtype, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Returns a chunk shape of one frame, halving the frame along y and x until it
+    is no larger than the given size
+
+    Parameters
+    ----------
+    shape : tuple
+        The shape of the dataset, frames first
+    dtype : dtype
+        The dtype of the dataset
+    max_chunk_bytes : int
+        The maximum size of a chunk
+
+    Returns
+    -------
+    tuple
+        The chunk shape
+    """
+    chunks = [1] + [max(length, 1) for length in shape[1:]]
+    itemsize = np.dtype(dtype).itemsize
+    while np.prod(chunks) * itemsize > max_chunk_bytes and max(chunks[1:]) > 1:
+        axis = 1 + int(np.argmax(chunks[1:]))
+        chunks[axis] = (chunks[axis] + 1) // 2
+    return tuple(chunks)
+
+
+def get_label_dtype(segmentation):
+    """
+    Returns the smallest unsigned dtype that holds all labels of a segmentation
+
+    Parameters
+    ----------
+    segmentation : array
+        The segmentation
+
+    Returns
+    -------
+    dtype
+        The label dtype
+    """
+    if segmentation.size == 0:
+        return np.dtype("u1")
+    return np.promote_types(np.min_scalar_type(int(np.max(segmentation))), "u1")
+
+
+def fits_dtype(data, dtype):
+    """
+    Returns whether all values of an array can be stored in the given dtype
+
+    Parameters
+    ----------
+    data : nd array
+        The values
+    dtype : dtype
+        The dtype
+
+    Returns
+    -------
+    bool
+        True if no value would change
+    """
+    dtype = np.dtype(dtype)
+    if np.can_cast(data.dtype, dtype) or data.size == 0:
+        return True
+    if dtype.kind not in "iu" or data.dtype.kind not in "iub":
+        return False
+    info = np.iinfo(dtype)
+    return info.min <= data.min() and data.max() <= info.max
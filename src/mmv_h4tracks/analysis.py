@@ -0,0 +1,533 @@
+"""
+Qt-free analysis of tracks, for scripts and batch processing without a display.
+
+The analysis widget uses the same functions, so exported CSV files are identical.
+"""
+
+import csv
+import locale
+
+import numpy as np
+
+from ._metrics import (
+    MOTILITY_METRICS,
+    TrackGroups,
+    calculate_accumulated_distance,
+    calculate_directness,
+    calculate_motility_metrics,
+    calculate_track_statistics,
+)
+from ._morphology import MorphologyTable, get_track_morphology
+from ._object_table import calculate_object_table, get_object_rows
+
+# The metrics that can be exported, in the order of the analysis widget
+METRICS = [
+    "Speed",
+    "Size",
+    "Direction",
+    "Euclidean distance",
+    "Accumulated distance",
+    "Velocity",
+    "Perimeter",
+    "Eccentricity",
+]
+# Metrics that are measured on the segmentation under the tracks
+SEGMENTATION_METRICS = ["Size", "Perimeter", "Eccentricity"]
+
+
+def calculate_cell_size(tracks, segmentation, objects=None):
+    """
+    Calculates the size of each cell
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    segmentation : nd array
+        (z,y,x) shape array, which follows napari's labelslayer format
+    objects : nd array, optional
+        the object table of the segmentation, calculated if None
+
+    Returns
+    -------
+    nd array
+        (N,3) shape array, which contains the ID, average size and standard deviation of size
+    """
+    if objects is None:
+        objects = calculate_object_table(segmentation)
+    z, y, x = np.asarray(tracks)[:, 1:4].T.astype(int)
+    labels = segmentation[z, y, x]
+    rows = get_object_rows(objects, z, labels)
+    cell_sizes = np.append(objects["area"], 0)[rows]
+    # Positions on the background count the background pixels of the frame
+    background = labels == 0
+    frame_areas = np.bincount(
+        objects["frame"], weights=objects["area"], minlength=len(segmentation)
+    )
+    cell_sizes[background] = (
+        np.prod(segmentation.shape[1:]) - frame_areas[z[background]]
+    )
+    return calculate_track_statistics(tracks, cell_sizes)
+
+
+def filter_tracks(tracks, min_movement=0, min_duration=0, accumulated_distance=None):
+    """
+    Returns the IDs of the tracks that move and last at least the given minimum
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    min_movement : int
+        minimum accumulated distance in pixels
+    min_duration : int
+        minimum duration in frames
+    accumulated_distance : nd array, optional
+        the accumulated distance of the tracks, calculated if None
+
+    Returns
+    -------
+    nd array
+        the sorted IDs of the tracks matching the given parameters
+    """
+    tracks = np.asarray(tracks)
+    if accumulated_distance is None:
+        accumulated_distance = calculate_accumulated_distance(tracks)
+    valid = (accumulated_distance[:, 1] >= min_movement) & (
+        accumulated_distance[:, 2] >= min_duration
+    )
+    return accumulated_distance[valid, 0].astype(tracks.dtype)
+
+
+def compute_metrics(
+    tracks,
+    segmentation=None,
+    metrics=None,
+    min_movement=0,
+    min_duration=0,
+    pool=None,
+):
+    """
+    Calculates metrics of all tracks and filters the tracks by movement and duration
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    segmentation : nd array, optional
+        (z,y,x) shape array, required for Size, Perimeter and Eccentricity
+    metrics : list, optional
+        the names of the metrics, see METRICS, all if None
+    min_movement : int
+        minimum accumulated distance in pixels of the valid tracks
+    min_duration : int
+        minimum duration in frames of the valid tracks
+    pool : Pool, optional
+        the worker pool to measure the segmentation with, serial if None
+
+    Returns
+    -------
+    results : dict
+        the result of every metric, as well as Track duration and, if both
+        distances are calculated, Directness
+    valid_ids : nd array
+        the IDs of the tracks matching min_movement and min_duration
+
+    Raises
+    ------
+    ValueError
+        if a metric is unknown or requires a segmentation that is not given
+    """
+    metrics = list(METRICS if metrics is None else metrics)
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}'")
+        if metric in SEGMENTATION_METRICS and segmentation is None:
+            raise ValueError(f"{metric} requires a segmentation")
+
+    tracks = np.asarray(tracks)
+    motility_metrics = [
+        metric
+        for metric in MOTILITY_METRICS
+        if metric in metrics or metric in ["Accumulated distance", "Track duration"]
+    ]
+    results = calculate_motility_metrics(tracks, motility_metrics)
+    valid_ids = filter_tracks(
+        tracks, min_movement, min_duration, results["Accumulated distance"]
+    )
+    if "Accumulated distance" not in metrics:
+        del results["Accumulated distance"]
+
+    if "Size" in metrics:
+        results["Size"] = calculate_cell_size(tracks, segmentation)
+    if "Perimeter" in metrics or "Eccentricity" in metrics:
+        morphology = get_track_morphology(
+            tracks, segmentation, MorphologyTable(segmentation), pool
+        )
+        groups = TrackGroups(tracks)
+        for metric in ["Perimeter", "Eccentricity"]:
+            if metric in metrics:
+                results[metric] = calculate_track_statistics(
+                    tracks, morphology[metric.lower()], groups
+                )
+    if "Euclidean distance" in results and "Accumulated distance" in results:
+        results["Directness"] = calculate_directness(
+            results["Euclidean distance"], results["Accumulated distance"]
+        )
+    return results, valid_ids
+
+
+def compose_csv_data(
+    tracks, results, valid_ids, min_movement, min_duration, selected_metrics
+):
+    """
+    Composes the rows of the metrics csv file
+
+    Parameters
+    ----------
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    results : dict
+        the result of every selected metric and of Track duration
+    valid_ids : nd array
+        (N,) shape array, which contains the IDs of the tracks matching the given parameters
+    min_movement : int
+        minimum movement in pixels
+    min_duration : int
+        minimum duration in frames
+    selected_metrics : list
+        list of metrics to export
+
+    Returns
+    -------
+    rows : list
+        list of rows to export
+    """
+    duration = results["Track duration"]
+    metrics = ["", "Number of cells", "Average track duration [# frames]"]
+    metrics.append("Standard deviation of track duration [# frames]")
+    individual_metrics = ["ID", "Track duration [# frames]"]
+    all_values = ["all"]
+    all_values.extend(
+        [
+            len(np.unique(tracks[:, 0])),
+            np.around(np.average(duration[:, 1]), 3),
+            np.around(np.std(duration[:, 1]), 3),
+        ]
+    )
+    valid_values = ["valid"]
+    valid_values.extend(
+        [
+            len(valid_ids),
+            np.around(np.average(duration[np.isin(duration[:, 0], valid_ids), 1]), 3),
+            np.around(np.std(duration[np.isin(duration[:, 0], valid_ids), 1]), 3),
+        ]
+    )
+    if len(selected_metrics) > 0:
+        (
+            more_metrics,
+            more_individual_metrics,
+            more_all_values,
+            more_valid_values,
+            metrics_dict,
+        ) = _extend_metrics(results, selected_metrics, valid_ids)
+        metrics.extend(more_metrics)
+        individual_metrics.extend(more_individual_metrics)
+        all_values.extend(more_all_values)
+        valid_values.extend(more_valid_values)
+
+    rows = [metrics, all_values, valid_values]
+    rows.append([None])
+    rows.append(
+        [
+            "Movement Threshold: {} pixels".format(str(min_movement)),
+            "Duration Threshold: {} frames".format(str(min_duration)),
+        ]
+    )
+    rows.append([None])
+
+    if len(selected_metrics) > 0:
+        rows.append(individual_metrics)
+        valid_values, invalid_values = _individual_metric_values(
+            tracks, valid_ids, metrics_dict
+        )
+        rows.append(["Cells matching the filters"])
+        for value in valid_values:
+            rows.append(value)
+
+        if not np.array_equal(np.unique(tracks[:, 0]), valid_ids):
+            rows.append([None])
+            rows.append([None])
+            rows.append(["Cells not matching the filters"])
+
+            [rows.append(value) for value in invalid_values]
+
+    return rows
+
+
+def _get_summary(result, column, valid_ids, std=True):
+    """
+    Returns average and standard deviation of a column of a metric result,
+    for all tracks and for the valid tracks
+    """
+    valid_result = result[np.isin(result[:, 0], valid_ids), column]
+    all_values = [np.around(np.average(result[:, column]), 3)]
+    valid_values = [np.around(np.average(valid_result), 3)]
+    if std:
+        all_values.append(np.around(np.std(result[:, column]), 3))
+        valid_values.append(np.around(np.std(valid_result), 3))
+    return all_values, valid_values
+
+
+def _extend_metrics(results, selected_metrics, valid_ids):
+    """
+    Composes the header and summary values of the selected metrics
+
+    Parameters
+    ----------
+    results : dict
+        the result of every selected metric
+    selected_metrics : list
+        list of metrics to export
+    valid_ids : nd array
+        (N,) shape array, which contains the IDs of the tracks matching the given parameters
+
+    Returns
+    -------
+    metrics : list
+        the headers of the summary
+    individual_metrics : list
+        the headers of the values of every track
+    all_values : list
+        the summary of all tracks
+    valid_values : list
+        the summary of the valid tracks
+    metrics_dict : dict
+        the results to list for every track
+    """
+    metrics, individual_metrics, all_values, valid_values = [[], [], [], []]
+    metrics_dict = {}
+
+    def add(metric, result, column, headers, individual_headers, std=True):
+        more_all_values, more_valid_values = _get_summary(
+            result, column, valid_ids, std
+        )
+        metrics.extend(headers)
+        individual_metrics.extend(individual_headers)
+        all_values.extend(more_all_values)
+        valid_values.extend(more_valid_values)
+        metrics_dict[metric] = result
+
+    if "Speed" in selected_metrics:
+        add(
+            "Speed",
+            results["Speed"],
+            1,
+            ["Average_speed [# pixels/frame]"],
+            [
+                "Average speed [# pixels/frame]",
+                "Standard deviation of speed [# pixels/frame]",
+            ],
+            std=False,
+        )
+
+    if "Size" in selected_metrics:
+        headers = ["Average size [# pixels]", "Standard deviation of size [# pixels]"]
+        add("Size", results["Size"], 1, headers, headers)
+
+    if "Direction" in selected_metrics:
+        add(
+            "Direction",
+            results["Direction"],
+            3,
+            ["Average direction [°]", "Standard deviation of direction [°]"],
+            ["Direction [°]"],
+        )
+
+    if "Euclidean distance" in selected_metrics:
+        add(
+            "Euclidean distance",
+            results["Euclidean distance"],
+            1,
+            ["Average euclidean distance [# pixels]"],
+            ["Euclidean distance [# pixels]"],
+            std=False,
+        )
+
+    if "Velocity" in selected_metrics:
+        add(
+            "Velocity",
+            results["Velocity"],
+            1,
+            [
+                "Average velocity [#pixels/frame]",
+                "Standard deviation of velocity [# pixels/frame]",
+            ],
+            ["Velocity [# pixels/frame]"],
+        )
+
+    if "Accumulated distance" in selected_metrics:
+        add(
+            "Accumulated distance",
+            results["Accumulated distance"],
+            1,
+            ["Average accumulated distance [# pixels]"],
+            ["Accumulated distance [# pixels]"],
+            std=False,
+        )
+
+        if "Euclidean distance" in selected_metrics:
+            directness = calculate_directness(
+                results["Euclidean distance"], results["Accumulated distance"]
+            )
+            add(
+                "Directness",
+                directness,
+                1,
+                ["Average directness"],
+                ["Directness"],
+                std=False,
+            )
+
+    if "Perimeter" in selected_metrics:
+        add(
+            "Perimeter",
+            results["Perimeter"],
+            1,
+            [
+                "Average perimeter [# pixels]",
+                "Standard deviation of perimeter [# pixels",
+            ],
+            [
+                "Average perimeter [# pixels]",
+                "Standard deviation of perimeter [# pixels]",
+            ],
+        )
+
+    if "Eccentricity" in selected_metrics:
+        headers = [
+            "Average eccentricity [# pixels]",
+            "Standard deviation of eccentricity [# pixels]",
+        ]
+        add("Eccentricity", results["Eccentricity"], 1, headers, headers)
+
+    return metrics, individual_metrics, all_values, valid_values, metrics_dict
+
+
+def _individual_metric_values(tracks, valid_ids, metrics):
+    """
+    Lists the selected metrics of every track, split into tracks that match the
+    filter criteria and tracks that do not
+    """
+    valid_values, invalid_values = [[], []]
+    ids, durations = np.unique(tracks[:, 0], return_counts=True)
+    is_valid = np.isin(ids, valid_ids)
+    for i, id in enumerate(ids):
+        value = [id]
+        value.append(durations[i])
+        if "Speed" in metrics:
+            value.extend([metrics["Speed"][i][1], metrics["Speed"][i][2]])
+        if "Size" in metrics:
+            value.extend([metrics["Size"][i][1], metrics["Size"][i][2]])
+        if "Direction" in metrics:
+            value.extend(
+                [metrics["Direction"][i][3]]
+            )  # using index 3 as 1 and 2 are solely used for plotting
+        if "Euclidean distance" in metrics:
+            value.append(metrics["Euclidean distance"][i][1])
+        if "Velocity" in metrics:
+            value.append(metrics["Velocity"][i][1])
+        if "Accumulated distance" in metrics:
+            value.append(metrics["Accumulated distance"][i][1])
+        if "Directness" in metrics:
+            value.append(metrics["Directness"][i][1])
+        if "Perimeter" in metrics:
+            value.extend([metrics["Perimeter"][i][1], metrics["Perimeter"][i][2]])
+        if "Eccentricity" in metrics:
+            value.extend([metrics["Eccentricity"][i][1], metrics["Eccentricity"][i][2]])
+
+        if is_valid[i]:
+            valid_values.append(value)
+        else:
+            invalid_values.append(value)
+
+    return valid_values, invalid_values
+
+
+def export_metrics(
+    file,
+    tracks,
+    segmentation=None,
+    metrics=None,
+    min_movement=0,
+    min_duration=0,
+    pool=None,
+):
+    """
+    Calculates metrics of all tracks and saves them as csv, like the analysis widget
+
+    Parameters
+    ----------
+    file : str
+        path of the csv file to write to
+    tracks : nd array
+        (N,4) shape array, which follows napari's trackslayer format (ID, z, y, x)
+    segmentation : nd array, optional
+        (z,y,x) shape array, required for Size, Perimeter and Eccentricity
+    metrics : list, optional
+        the names of the metrics, see METRICS, all if None
+    min_movement : int
+        minimum movement in pixels
+    min_duration : int
+        minimum duration in frames
+    pool : Pool, optional
+        the worker pool to measure the segmentation with, serial if None
+
+    Returns
+    -------
+    rows : list
+        the rows written to the csv file
+    """
+    metrics = list(METRICS if metrics is None else metrics)
+    tracks = np.asarray(tracks)
+    results, valid_ids = compute_metrics(
+        tracks, segmentation, metrics, min_movement, min_duration, pool
+    )
+    rows = compose_csv_data(
+        tracks, results, valid_ids, min_movement, min_duration, metrics
+    )
+    save_csv(file, rows)
+    return rows
+
+
+def save_csv(file, data):
+    """
+    Save data to a csv file
+
+    Parameters
+    ----------
+    file : str
+        Path of the csv file to write to
+    data : list
+        CSV data to write to disk
+    """
+    # Headless machines often have no locale configured
+    default_locale = locale.getdefaultlocale()[0] or ""
+    if default_locale.startswith("de"):
+        data = [convert_np64_to_string(sublist) for sublist in data]
+        delimiter = ";"
+    else:
+        delimiter = ","
+    with open(file, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile, delimiter=delimiter)
+        writer.writerows(data)
+
+
+def convert_np64_to_string(sublist):
+    converted_sublist = []
+    for item in sublist:
+        if isinstance(item, np.float64):
+            converted_sublist.append(str(item).replace(".", ","))
+        else:
+            converted_sublist.append(item)
+    return converted_sublist
@@ -0,0 +1,223 @@
+"""
+Batch processing of a directory of zarr files without a display:
+segmentation, tracking and export of the metrics of every file.
+
+Run ``mmv-h4tracks --help`` for the options.
+"""
+
+import argparse
+import multiprocessing
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import zarr
+
+from . import pipeline
+from ._zarr_export import create_dataset
+from .analysis import METRICS, export_metrics
+
+
+def process_file(
+    path,
+    output_dir,
+    model=None,
+    metrics=None,
+    min_movement=0,
+    min_duration=0,
+    processes=1,
+    segment=False,
+    track=False,
+    overlap=False,
+):
+    """
+    Segments and tracks a zarr file where needed and exports the metrics of its tracks.
+    New segmentation and tracks are saved to the file.
+
+    Parameters
+    ----------
+    path : Path
+        the zarr file, as saved by the widget
+    output_dir : Path
+        the directory to write the csv file to, named after the zarr file
+    model : str, optional
+        the segmentation model, required if the file has no segmentation or segment is set
+    metrics : list, optional
+        the names of the metrics, see analysis.METRICS, all if None
+    min_movement : int
+        minimum movement in pixels of the valid tracks
+    min_duration : int
+        minimum duration in frames of the valid tracks
+    processes : int
+        the amount of processes of the worker pool
+    segment : bool
+        whether to segment the file even if it has a segmentation
+    track : bool
+        whether to track the file even if it has tracks
+    overlap : bool
+        whether to track by the overlap of the cells instead of their centroids
+
+    Returns
+    -------
+    Path
+        the written csv file
+    """
+    path = Path(path)
+    zarr_file = zarr.open(str(path), mode="r+")
+    pool = pipeline.get_pool(processes)
+
+    if segment or "segmentation_data" not in zarr_file:
+        if model is None:
+            raise ValueError(f"{path.name} has no segmentation, a model is required")
+        parameters = pipeline.get_model_parameters(model)
+        # An interrupted run is resumed from the finished frames
+        target = pipeline.segment_zarr(zarr_file, parameters, processes)
+        create_dataset(zarr_file, "segmentation_data", target)
+        del zarr_file[pipeline.CALCULATED_SEGMENTATION_NAME]
+        del zarr_file[pipeline.SEGMENTATION_PROGRESS_NAME]
+        track = True
+    segmentation = zarr_file["segmentation_data"][:]
+
+    if track or "tracking_data" not in zarr_file:
+        if overlap:
+            tracks = pipeline.track_overlap(segmentation, pool)
+        else:
+            tracks = pipeline.track_segmentation(segmentation, pool)
+        create_dataset(zarr_file, "tracking_data", tracks)
+    else:
+        tracks = zarr_file["tracking_data"][:]
+    # Like in the widget, tracks that exist in only one frame are not analysed
+    ids, counts = np.unique(tracks[:, 0], return_counts=True)
+    tracks = tracks[np.isin(tracks[:, 0], ids[counts > 1])]
+
+    file = Path(output_dir) / f"{path.stem}.csv"
+    export_metrics(
+        file, tracks, segmentation, metrics, min_movement, min_duration, pool
+    )
+    return file
+
+
+def get_parser():
+    """
+    Returns the parser of the command line arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="mmv-h4tracks",
+        description="Segments, tracks and analyses all .zarr files of a directory.",
+    )
+    parser.add_argument("directory", type=Path, help="directory of the .zarr files")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="directory to write the csv files to, the input directory by default",
+    )
+    parser.add_argument(
+        "--model",
+        help="segmentation model for files without segmentation, "
+        "e.g. Neutrophil_granulocytes or custom_<name>",
+    )
+    parser.add_argument(
+        "--segment",
+        action="store_true",
+        help="segment and track files again that already have a segmentation",
+    )
+    parser.add_argument(
+        "--track",
+        action="store_true",
+        help="track files again that already have tracks",
+    )
+    parser.add_argument(
+        "--overlap",
+        action="store_true",
+        help="track by the overlap of the cells instead of their centroids",
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="+",
+        choices=METRICS,
+        default=METRICS,
+        metavar="METRIC",
+        help=f"metrics to export, all by default: {', '.join(METRICS)}",
+    )
+    parser.add_argument(
+        "--min-movement", type=int, default=0, help="minimum movement in pixels"
+    )
+    parser.add_argument(
+        "--min-duration", type=int, default=0, help="minimum duration in frames"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="amount of files processed at the same time",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=max(1, int(multiprocessing.cpu_count() * 0.8)),
+        help="amount of worker processes, shared by all files",
+    )
+    return parser
+
+
+def main(argv=None):
+    """
+    Entry point of the command line interface
+
+    Parameters
+    ----------
+    argv : list, optional
+        the command line arguments, sys.argv if None
+
+    Returns
+    -------
+    int
+        the exit code, 1 if any file failed
+    """
+    args = get_parser().parse_args(argv)
+    files = sorted(args.directory.glob("*.zarr"))
+    if not files:
+        print(f"No .zarr files found in {args.directory}", file=sys.stderr)
+        return 1
+    output_dir = args.directory if args.output is None else args.output
+    output_dir.mkdir(parents=True, exist_ok=True)
+    jobs = max(1, min(args.jobs, len(files)))
+    options = {
+        "model": args.model,
+        "metrics": args.metrics,
+        "min_movement": args.min_movement,
+        "min_duration": args.min_duration,
+        "processes": args.processes,
+        "segment": args.segment,
+        "track": args.track,
+        "overlap": args.overlap,
+    }
+
+    # Files are processed in threads that share one worker pool for the heavy lifting,
+    # it is created up front so the threads don't race to create it
+    pipeline.get_pool(args.processes)
+    pipeline.limit_torch_threads(args.processes)
+    failed = []
+    with ThreadPoolExecutor(jobs) as executor:
+        futures = {
+            executor.submit(process_file, file, output_dir, **options): file
+            for file in files
+        }
+        for future in as_completed(futures):
+            file = futures[future]
+            if future.exception() is not None:
+                print(f"{file.name} failed: {future.exception()}", file=sys.stderr)
+                failed.append(file)
+            else:
+                print(f"{file.name} done")
+
+    print(f"Processed {len(files) - len(failed)} of {len(files)} files.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1207 @@
+import atexit
+import json
+from multiprocessing import Pool
+from pathlib import Path
+from threading import Thread
+
+import numpy as np
+import torch
+import zarr
+from cellpose import core, models
+from scipy import ndimage, optimize, sparse, spatial
+
+from mmv_h4tracks import APPROX_INF, MAX_MATCHING_DIST
+from ._object_table import (
+    calculate_object_table,
+    get_frame_objects,
+    get_object_rows,
+    get_rounded_centroids,
+)
+from ._segmentation_cache import SegmentationCache
+from ._shared import SharedArray, attach_shared_array, untrack_shared_memory
+
+CUSTOM_MODEL_PREFIX = "custom_"
+# Name of the zarr dataset streamed segmentation results are written to
+CALCULATED_SEGMENTATION_NAME = "calculated_segmentation"
+# Name of the zarr dataset marking the frames of the streamed segmentation that are done
+SEGMENTATION_PROGRESS_NAME = "calculated_segmentation_progress"
+# Amount of frames handed to Cellpose at once, if the model doesn't specify a batch size
+DEFAULT_FRAMES_PER_BATCH = 8
+# Frames with more pixels than this are split into overlapping tiles for CPU segmentation
+TILED_SEGMENTATION_MIN_PIXELS = 1024 * 1024
+# Edge length of the tiles and minimum overlap between neighbouring tiles, in pixels
+TILE_SIZE = 512
+TILE_OVERLAP = 64
+# One matched pair of cells between two slices, centroids are rounded to full pixels
+MATCH_DTYPE = np.dtype(
+    [
+        ("parent_id", np.int64),
+        ("child_id", np.int64),
+        ("parent_yx", np.float64, (2,)),
+        ("child_yx", np.float64, (2,)),
+        ("cost", np.float64),
+    ]
+)
+
+# Share of a cell a cell in the next slice has to cover to continue its track
+MIN_OVERLAP = 0.7
+# Largest dense table of overlapping cell pairs computed for a pair of slices
+MAX_OVERLAP_TABLE_SIZE = 2**22
+# Minimum amount of cells of a track found by overlap based tracking
+MIN_TRACK_LENGTH = 5
+
+# Cellpose models loaded by this process, keyed by (model path, gpu)
+_MODEL_CACHE = {}
+# Worker pool shared by all computations that is kept alive between runs, (pool, processes)
+_POOL = None
+# Pools replaced by a resized pool, that are joined once their remaining work is done
+_RETIRED_POOLS = []
+# On-disk cache of segmented frames, created on first use
+_SEGMENTATION_CACHE = None
+
+
+def init_worker():
+    """
+    Initializes a worker process of the worker pool
+
+    Every worker keeps its own model cache, so models are only loaded once per process.
+    Torch is limited to one thread per worker to not oversubscribe the CPU.
+    """
+    _MODEL_CACHE.clear()
+    limit_torch_threads(1)
+    untrack_shared_memory()
+
+
+def limit_torch_threads(threads):
+    """
+    Limits the threads torch uses in this process. Torch threads are shared by all
+    threads of a process, so this is only called once when the process starts.
+
+    Parameters
+    ----------
+    threads : int
+        the amount of threads torch may use
+    """
+    torch.set_num_threads(threads)
+
+
+def get_cellpose_model(model_path, gpu=False):
+    """
+    Returns the Cellpose model for the given path, loading it only on first use
+
+    Parameters
+    ----------
+    model_path : str
+        path to the pretrained model
+    gpu : bool
+        whether or not the model should run on the GPU
+
+    Returns
+    -------
+    CellposeModel
+        the cached model
+    """
+    key = (model_path, gpu)
+    if not key in _MODEL_CACHE:
+        _MODEL_CACHE[key] = models.CellposeModel(gpu=gpu, pretrained_model=model_path)
+    return _MODEL_CACHE[key]
+
+
+def get_pool(processes):
+    """
+    Returns the worker pool shared by all computations. The pool is reused between runs
+    and only recreated if the amount of processes changes.
+
+    Parameters
+    ----------
+    processes : int
+        the amount of processes the pool should have
+
+    Returns
+    -------
+    Pool
+        the worker pool
+    """
+    global _POOL
+    if _POOL is not None:
+        pool, pool_processes = _POOL
+        if pool_processes == processes:
+            return pool
+        # Let computations still using the old pool finish
+        _retire_pool(pool)
+    pool = Pool(processes, initializer=init_worker)
+    _POOL = (pool, processes)
+    return pool
+
+
+def resize_pool(processes):
+    """
+    Recreates the worker pool with the given amount of processes, if a pool exists
+
+    Parameters
+    ----------
+    processes : int
+        the amount of processes the pool should have
+    """
+    if _POOL is not None:
+        get_pool(processes)
+
+
+def _retire_pool(pool):
+    """
+    Closes a pool for new work and joins it in the background, so its workers exit
+    once the computations still using it are done
+
+    Parameters
+    ----------
+    pool : Pool
+        the pool to retire
+    """
+    pool.close()
+    _RETIRED_POOLS.append(pool)
+
+    def join():
+        pool.join()
+        _RETIRED_POOLS.remove(pool)
+
+    Thread(target=join, daemon=True).start()
+
+
+@atexit.register
+def close_pool():
+    """
+    Shuts down the worker pool and the retired pools, if any exist
+    """
+    global _POOL
+    for pool in list(_RETIRED_POOLS):
+        pool.terminate()
+    if _POOL is None:
+        return
+    pool, _ = _POOL
+    pool.terminate()
+    pool.join()
+    _POOL = None
+
+
+def segment_slice_cpu(layer_slice, parameters):
+    """
+    Parameters
+    ----------
+    layer_slice : nd array
+        the slice of raw image data to calculate segmentation for
+    parameters : dict
+        the parameters for the segmentation model
+
+    Returns
+    -------
+    nd array
+        the segmentation mask for the slice
+    """
+    eval_params = dict(parameters)
+    model = get_cellpose_model(eval_params.pop("model_path", None))
+    mask, _, _ = model.eval(layer_slice, **eval_params)
+    return mask
+
+
+def segment_stack(
+    model, data, parameters, out=None, frames_per_batch=DEFAULT_FRAMES_PER_BATCH
+):
+    """
+    Segments a stack of frames in batches of frames
+
+    Parameters
+    ----------
+    model : CellposeModel
+        the model to run the segmentation with
+    data : nd array
+        the raw image data, frames along the first axis
+    parameters : dict
+        the evaluation parameters for the model
+    out : nd array, optional
+        preallocated label volume to write the masks to
+    frames_per_batch : int
+        the amount of frames passed to the model at once
+
+    Returns
+    -------
+    nd array
+        the segmentation masks for all frames
+    """
+    if out is None:
+        out = np.zeros(data.shape[:3], dtype=np.int32)
+    for start in range(0, len(data), frames_per_batch):
+        batch = [
+            np.asarray(layer_slice)
+            for layer_slice in data[start : start + frames_per_batch]
+        ]
+        masks, _, _ = model.eval(batch, **parameters)
+        for offset, mask in enumerate(masks):
+            out[start + offset] = mask
+    return out
+
+
+def get_tile_ranges(length, tile_size, overlap):
+    """
+    Splits an axis into overlapping tiles. Each tile owns the part of the overlap
+    up to the middle between itself and its neighbour, its core.
+
+    Parameters
+    ----------
+    length : int
+        the length of the axis
+    tile_size : int
+        the length of a tile
+    overlap : int
+        the minimum overlap between neighbouring tiles
+
+    Returns
+    -------
+    list
+        (start, stop, core_start, core_stop) of every tile
+    """
+    if length <= tile_size:
+        return [(0, length, 0, length)]
+    step = max(tile_size - overlap, 1)
+    starts = list(range(0, length - tile_size, step)) + [length - tile_size]
+    stops = [start + tile_size for start in starts]
+    borders = (
+        [0]
+        + [(starts[i + 1] + stops[i]) // 2 for i in range(len(starts) - 1)]
+        + [length]
+    )
+    return [
+        (start, stop, borders[i], borders[i + 1])
+        for i, (start, stop) in enumerate(zip(starts, stops))
+    ]
+
+
+def get_tiles(shape, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """
+    Returns the overlapping tiles covering a 2D frame
+
+    Parameters
+    ----------
+    shape : tuple
+        the shape (y,x) of the frame
+    tile_size : int
+        the edge length of a tile
+    overlap : int
+        the minimum overlap between neighbouring tiles
+
+    Returns
+    -------
+    list
+        (y range, x range) of every tile, ranges as returned by get_tile_ranges
+    """
+    return [
+        (y_range, x_range)
+        for y_range in get_tile_ranges(shape[0], tile_size, overlap)
+        for x_range in get_tile_ranges(shape[1], tile_size, overlap)
+    ]
+
+
+def stitch_tiles(tile_masks, tiles, shape):
+    """
+    Stitches the segmentation masks of overlapping tiles into one frame.
+    A cell is taken from the tile that contains its centroid in its core, so cells cut
+    at a tile border are taken from the neighbouring tile that sees them whole.
+    Cells are relabelled to be unique in the frame.
+
+    Parameters
+    ----------
+    tile_masks : list
+        the segmentation masks of the tiles
+    tiles : list
+        the tiles as returned by get_tiles
+    shape : tuple
+        the shape (y,x) of the frame
+
+    Returns
+    -------
+    nd array
+        the segmentation mask of the frame
+    """
+    mask = np.zeros(shape, dtype=np.int32)
+    next_id = 1
+    for tile_mask, (y_range, x_range) in zip(tile_masks, tiles):
+        y_start, y_stop, y_core_start, y_core_stop = y_range
+        x_start, x_stop, x_core_start, x_core_stop = x_range
+        tile_mask = np.asarray(tile_mask)
+        labels = tile_mask.ravel()
+        areas = np.bincount(labels)
+        present = np.flatnonzero(areas)
+        present = present[present > 0]
+        if len(present) == 0:
+            continue
+        rows, cols = np.indices(tile_mask.shape)
+        centroid_y = (
+            np.bincount(labels, weights=rows.ravel())[present] / areas[present]
+            + y_start
+        )
+        centroid_x = (
+            np.bincount(labels, weights=cols.ravel())[present] / areas[present]
+            + x_start
+        )
+        keep = present[
+            (centroid_y >= y_core_start)
+            & (centroid_y < y_core_stop)
+            & (centroid_x >= x_core_start)
+            & (centroid_x < x_core_stop)
+        ]
+        lookup = np.zeros(len(areas), dtype=np.int32)
+        lookup[keep] = np.arange(next_id, next_id + len(keep))
+        next_id += len(keep)
+        relabelled = lookup[tile_mask]
+        region = mask[y_start:y_stop, x_start:x_stop]
+        free = (relabelled > 0) & (region == 0)
+        region[free] = relabelled[free]
+    return mask
+
+
+def segment_tiled(data, parameters, processes):
+    """
+    Segments frames by splitting them into overlapping tiles that are segmented on the pool
+    and stitched back together
+
+    Parameters
+    ----------
+    data : nd array
+        the raw image data, frames along the first axis
+    parameters : dict
+        the parameters for the segmentation model
+    processes : int
+        the amount of processes to use
+
+    Returns
+    -------
+    nd array
+        the segmentation masks for all frames
+    """
+    # Cells have to fit into the overlap twice to be seen whole by one tile
+    overlap = max(TILE_OVERLAP, 4 * int(parameters.get("diameter") or 0))
+    tiles = get_tiles(data.shape[1:3], max(TILE_SIZE, 2 * overlap), overlap)
+    tasks = [
+        (np.asarray(layer_slice)[y_start:y_stop, x_start:x_stop], parameters)
+        for layer_slice in data
+        for (y_start, y_stop, _, _), (x_start, x_stop, _, _) in tiles
+    ]
+    tile_masks = get_pool(processes).starmap(segment_slice_cpu, tasks)
+    out = np.zeros(data.shape[:3], dtype=np.int32)
+    for frame in range(len(data)):
+        out[frame] = stitch_tiles(
+            tile_masks[frame * len(tiles) : (frame + 1) * len(tiles)],
+            tiles,
+            data.shape[1:3],
+        )
+    return out
+
+
+def get_segmentation_cache():
+    """
+    Returns the cache of segmented frames
+
+    Returns
+    -------
+    SegmentationCache
+        the segmentation cache
+    """
+    global _SEGMENTATION_CACHE
+    if _SEGMENTATION_CACHE is None:
+        _SEGMENTATION_CACHE = SegmentationCache()
+    return _SEGMENTATION_CACHE
+
+
+def segment_frames(data, parameters, processes):
+    """
+    Run segmentation on the given frames. Frames that were already segmented with the
+    same model and parameters are taken from the segmentation cache.
+
+    Parameters
+    ----------
+    data : nd array
+        the raw image data, frames along the first axis
+    parameters : dict
+        the parameters for the segmentation model
+    processes : int
+        the amount of processes to use for CPU segmentation
+
+    Returns
+    -------
+    nd array
+        the segmentation masks for all frames
+    """
+    cache = get_segmentation_cache()
+    keys = [cache.get_key(layer_slice, parameters) for layer_slice in data]
+    masks = [cache.get(key) for key in keys]
+    missing_frames = [frame for frame, mask in enumerate(masks) if mask is None]
+    if missing_frames:
+        computed_masks = segment_frames_uncached(
+            np.stack([np.asarray(data[frame]) for frame in missing_frames]),
+            parameters,
+            processes,
+        )
+        for frame, mask in zip(missing_frames, computed_masks):
+            cache.put(keys[frame], mask)
+            masks[frame] = mask
+    out = np.zeros(data.shape[:3], dtype=np.int32)
+    for frame, mask in enumerate(masks):
+        out[frame] = mask
+    return out
+
+
+def segment_frames_uncached(data, parameters, processes):
+    """
+    Run segmentation on the given frames, on the GPU if available
+
+    Parameters
+    ----------
+    data : nd array
+        the raw image data, frames along the first axis
+    parameters : dict
+        the parameters for the segmentation model
+    processes : int
+        the amount of processes to use for CPU segmentation
+
+    Returns
+    -------
+    nd array
+        the segmentation masks for all frames
+    """
+    parameters = dict(parameters)
+    if core.use_gpu():
+        model = get_cellpose_model(parameters.pop("model_path"), gpu=True)
+        return segment_stack(model, data, parameters)
+    if np.prod(data.shape[1:3]) > TILED_SEGMENTATION_MIN_PIXELS:
+        # Large frames are split into tiles so memory stays bounded and all cores are used
+        return segment_tiled(data, parameters, processes)
+    if len(data) < processes:
+        # Too few frames to keep all processes busy, let torch use the cores instead
+        model = get_cellpose_model(parameters.pop("model_path"))
+        return segment_stack(model, data, parameters)
+    data_with_parameters = [(layer_slice, parameters) for layer_slice in data]
+    pool = get_pool(processes)
+    return np.asarray(pool.starmap(segment_slice_cpu, data_with_parameters))
+
+
+def open_segmentation_job(zarr_file, shape, parameters):
+    """
+    Opens the datasets the streamed segmentation is written to.
+    The masks are stored with one chunk per frame, next to a bitmap of the finished frames.
+    The datasets of an earlier run with the same shape and parameters are reused so it can be resumed,
+    otherwise they are replaced.
+
+    Parameters
+    ----------
+    zarr_file : zarr
+        the zarr file to create the datasets in
+    shape : tuple
+        the shape (z,y,x) of the segmentation
+    parameters : dict
+        the parameters for the segmentation model
+
+    Returns
+    -------
+    target : zarr array
+        the dataset for the segmentation masks
+    progress : zarr array
+        (z,) shape array, True for every frame that has been segmented
+    """
+    if (
+        CALCULATED_SEGMENTATION_NAME in zarr_file
+        and SEGMENTATION_PROGRESS_NAME in zarr_file
+    ):
+        target = zarr_file[CALCULATED_SEGMENTATION_NAME]
+        progress = zarr_file[SEGMENTATION_PROGRESS_NAME]
+        if (
+            target.shape == tuple(shape)
+            and progress.shape == (shape[0],)
+            and target.attrs.get("parameters") == json.loads(json.dumps(parameters))
+        ):
+            return target, progress
+
+    target = zarr_file.create_dataset(
+        CALCULATED_SEGMENTATION_NAME,
+        shape=shape,
+        chunks=(1,) + tuple(shape[1:]),
+        dtype="i4",
+        overwrite=True,
+    )
+    target.attrs["parameters"] = parameters
+    progress = zarr_file.create_dataset(
+        SEGMENTATION_PROGRESS_NAME,
+        shape=(shape[0],),
+        dtype=bool,
+        fill_value=False,
+        overwrite=True,
+    )
+    return target, progress
+
+
+def segment_to_zarr(
+    data,
+    parameters,
+    target,
+    processes,
+    progress=None,
+    frames_per_batch=DEFAULT_FRAMES_PER_BATCH,
+):
+    """
+    Run segmentation without holding the full stack in memory.
+    Frames are read in windows, segmented and written to the target right away.
+    If a progress bitmap is given, finished frames are skipped and every written frame is marked.
+
+    Parameters
+    ----------
+    data : array
+        the raw image data, can be a lazy array like a zarr dataset
+    parameters : dict
+        the parameters for the segmentation model
+    target : array
+        the array to write the masks to, e.g. a zarr dataset
+    processes : int
+        the amount of processes to use for CPU segmentation
+    progress : array, optional
+        (z,) shape bool array of the frames that are already segmented
+    frames_per_batch : int
+        the least amount of frames read and segmented at once
+
+    Returns
+    -------
+    array
+        the target holding the segmentation masks
+    """
+    if progress is None:
+        missing_frames = np.arange(len(data))
+    else:
+        missing_frames = np.flatnonzero(np.logical_not(progress[:]))
+    window = max(processes, frames_per_batch)
+    for start in range(0, len(missing_frames), window):
+        frames = missing_frames[start : start + window]
+        masks = segment_frames(
+            np.stack([np.asarray(data[frame]) for frame in frames]),
+            parameters,
+            processes,
+        )
+        for frame, mask in zip(frames, masks):
+            target[frame] = mask
+            if progress is not None:
+                progress[frame] = True
+    return target
+
+
+def segment_zarr(zarr_file, parameters, processes):
+    """
+    Segments the raw data of a zarr file frame by frame, resuming an unfinished run
+
+    Parameters
+    ----------
+    zarr_file : zarr or str
+        the zarr file or its path, holding the "raw_data" dataset,
+        the masks are written to it
+    parameters : dict
+        the parameters for the segmentation model
+    processes : int
+        the amount of processes to use for CPU segmentation
+
+    Returns
+    -------
+    zarr array
+        the dataset holding the segmentation masks
+    """
+    if isinstance(zarr_file, (str, Path)):
+        zarr_file = zarr.open(str(zarr_file), mode="r+")
+    raw_data = zarr_file["raw_data"]
+    target, progress = open_segmentation_job(zarr_file, raw_data.shape[:3], parameters)
+    return segment_to_zarr(raw_data, parameters, target, processes, progress)
+
+
+def segment_to_scratch(data, parameters, processes):
+    """
+    Segments a zarr array frame by frame into a temporary zarr store,
+    the store is removed when the process exits
+
+    Parameters
+    ----------
+    data : zarr array
+        the raw image data, frames along the first axis
+    parameters : dict
+        the parameters for the segmentation model
+    processes : int
+        the amount of processes to use for CPU segmentation
+
+    Returns
+    -------
+    zarr array
+        the dataset holding the segmentation masks
+    """
+    scratch = zarr.group(store=zarr.TempStore(prefix="mmv_h4tracks_"))
+    target, _ = open_segmentation_job(scratch, data.shape[:3], parameters)
+    return segment_to_zarr(data, parameters, target, processes)
+
+
+def is_raw_data(data, zarr_file):
+    """
+    Checks if the data is the "raw_data" dataset of the zarr file
+
+    Parameters
+    ----------
+    data : array
+        the image data
+    zarr_file : zarr
+        the zarr file
+
+    Returns
+    -------
+    bool
+        True if the data is read from the "raw_data" dataset of the file
+    """
+    return (
+        isinstance(data, zarr.Array)
+        and "raw_data" in zarr_file
+        and data.store is zarr_file.store
+        and data.path == zarr_file["raw_data"].path
+    )
+
+
+def segment_image(data, parameters, processes, zarr_file=None):
+    """
+    Run segmentation on image data
+
+    Parameters
+    ----------
+    data : array
+        the raw image data, frames along the first axis
+    parameters : dict
+        the parameters for the segmentation model
+    processes : int
+        the amount of processes to use for CPU segmentation
+    zarr_file : zarr, optional
+        the zarr file the data was loaded from, if the data is its raw data
+        the frames are streamed from disk into a temporary store, the file is not changed
+
+    Returns
+    -------
+    array
+        the segmentation masks
+    """
+    if zarr_file is not None and is_raw_data(data, zarr_file):
+        return segment_to_scratch(data, parameters, processes)
+    return segment_frames(data, parameters, processes)
+
+
+def read_custom_model_dict():
+    """
+    Reads the parameters of the custom models from the 'custom_models.json' file and returns them
+    """
+    try:
+        with open(Path(__file__).parent / "custom_models.json", "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def get_model_parameters(model, custom_models=None):
+    """
+    Get the parameters for a model
+
+    Parameters
+    ----------
+    model : str
+        the name of a hardcoded model, or of a custom model prefixed with CUSTOM_MODEL_PREFIX
+    custom_models : dict, optional
+        the custom models as read by read_custom_model_dict, read from disk if None
+
+    Returns
+    -------
+    dict
+        a dictionary of all the parameters of the model
+
+    Raises
+    ------
+    ValueError
+        if the model is unknown
+    """
+    # Hardcoded models
+    if model == "Neutrophil_granulocytes":
+        return {
+            "model_path": str(Path(__file__).parent.absolute() / "models" / model),
+            "diameter": 15,
+            "channels": [0, 0],
+            "flow_threshold": 0.4,
+            "cellprob_threshold": 0,
+        }
+
+    # Custom models
+    if custom_models is None:
+        custom_models = read_custom_model_dict()
+    name = model[len(CUSTOM_MODEL_PREFIX) :]
+    if not model.startswith(CUSTOM_MODEL_PREFIX) or name not in custom_models:
+        raise ValueError(f"Unknown model '{model}'")
+    params = dict(custom_models[name]["params"])
+    params["model_path"] = str(
+        Path(__file__).parent.absolute()
+        / "models"
+        / "custom_models"
+        / custom_models[name]["filename"]
+    )
+    return params
+
+
+def calculate_centroids(label_slice):
+    """
+    Calculate the centroids of objects in a 2D slice.
+
+    Parameters
+    ----------
+    label_slice : numpy.ndarray
+        A 2D numpy array representing the slice.
+
+    Returns
+    -------
+    tuple
+        A tuple containing two numpy arrays: the centroids and the labels.
+    """
+    labels = np.unique(label_slice)[1:]
+    centroids = ndimage.center_of_mass(label_slice, labels=label_slice, index=labels)
+
+    return (centroids, labels)
+
+
+def get_matching_candidates(parent_centroids, child_centroids):
+    """
+    Finds all pairs of cells in two slices that are close enough to be matched
+
+    Parameters
+    ----------
+    parent_centroids : nd array
+        (N,2) shape array of the centroids in the first slice
+    child_centroids : nd array
+        (M,2) shape array of the centroids in the second slice
+
+    Returns
+    -------
+    parent_indices, child_indices : nd array
+        the indices of the cells of each candidate pair
+    distances : nd array
+        the distance between the cells of each candidate pair
+    """
+    if len(parent_centroids) == 0 or len(child_centroids) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+    # Query slightly further and filter with the exact distance, so cells at exactly
+    # MAX_MATCHING_DIST are treated like the dense distance matrix does
+    pairs = spatial.cKDTree(parent_centroids).sparse_distance_matrix(
+        spatial.cKDTree(child_centroids),
+        MAX_MATCHING_DIST * (1 + 1e-9),
+        output_type="ndarray",
+    )
+    parent_indices = pairs["i"].astype(int)
+    child_indices = pairs["j"].astype(int)
+    distances = np.sqrt(
+        np.sum(
+            (parent_centroids[parent_indices] - child_centroids[child_indices]) ** 2,
+            axis=1,
+        )
+    )
+    close = distances <= MAX_MATCHING_DIST
+    return parent_indices[close], child_indices[close], distances[close]
+
+
+def solve_sparse_assignment(
+    parent_indices, child_indices, costs, num_cells_parent, num_cells_child
+):
+    """
+    Solves the assignment between two slices for the given candidate pairs.
+    Every connected group of candidates is solved on its own, with an auxiliary vertex
+    per parent that accommodates segmentation errors and leaving cells.
+
+    Parameters
+    ----------
+    parent_indices, child_indices : nd array
+        the indices of the cells of each candidate pair
+    costs : nd array
+        the cost of each candidate pair
+    num_cells_parent, num_cells_child : int
+        the amount of cells in the two slices
+
+    Returns
+    -------
+    row_ind, col_ind : nd array
+        the indices of the matched parents and children, sorted by parent
+    matched_costs : nd array
+        the cost of each matched pair
+    """
+    if len(costs) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+    graph = sparse.coo_matrix(
+        (
+            np.ones(len(costs)),
+            (parent_indices, num_cells_parent + child_indices),
+        ),
+        shape=(num_cells_parent + num_cells_child,) * 2,
+    )
+    _, components = sparse.csgraph.connected_components(graph, directed=False)
+    edge_components = components[parent_indices]
+    order = np.argsort(edge_components, kind="stable")
+    boundaries = np.flatnonzero(np.diff(edge_components[order])) + 1
+
+    row_ind = []
+    col_ind = []
+    matched_costs = []
+    for edges in np.split(order, boundaries):
+        rows, local_rows = np.unique(parent_indices[edges], return_inverse=True)
+        cols, local_cols = np.unique(child_indices[edges], return_inverse=True)
+        # same cost matrix as the dense formulation, restricted to the component
+        cost_mat_aug = np.full(
+            (len(rows), len(cols) + len(rows)), MAX_MATCHING_DIST * 1.2
+        )
+        cost_mat_aug[:, : len(cols)] = APPROX_INF
+        cost_mat_aug[local_rows, local_cols] = costs[edges]
+        component_rows, component_cols = optimize.linear_sum_assignment(cost_mat_aug)
+        matched = component_cols < len(cols)
+        component_rows = component_rows[matched]
+        component_cols = component_cols[matched]
+        row_ind.append(rows[component_rows])
+        col_ind.append(cols[component_cols])
+        matched_costs.append(cost_mat_aug[component_rows, component_cols])
+    row_ind = np.concatenate(row_ind)
+    col_ind = np.concatenate(col_ind)
+    matched_costs = np.concatenate(matched_costs)
+    order = np.argsort(row_ind)
+    return row_ind[order], col_ind[order], matched_costs[order]
+
+
+def match_centroids(
+    slice_pair,
+):
+    """
+    Match centroids between two slices.
+
+    Parameters
+    ----------
+    slice_pair : tuple
+        A tuple containing two slices, each represented by a tuple
+        containing the centroids and IDs of cells in that slice.
+
+    Returns
+    -------
+    nd array
+        the matched pairs as MATCH_DTYPE array, sorted by parent
+    """
+    parent_centroids = np.asarray(slice_pair[0][0], dtype=float).reshape(-1, 2)
+    parent_ids = slice_pair[0][1]
+    child_centroids = np.asarray(slice_pair[1][0], dtype=float).reshape(-1, 2)
+    child_ids = slice_pair[1][1]
+
+    # only cells within MAX_MATCHING_DIST of each other can be matched
+    parent_indices, child_indices, distances = get_matching_candidates(
+        parent_centroids, child_centroids
+    )
+    row_ind, col_ind, costs = solve_sparse_assignment(
+        parent_indices,
+        child_indices,
+        distances,
+        len(parent_centroids),
+        len(child_centroids),
+    )
+
+    matched_pairs = np.zeros(len(row_ind), dtype=MATCH_DTYPE)
+    matched_pairs["parent_id"] = np.asarray(parent_ids)[row_ind]
+    matched_pairs["child_id"] = np.asarray(child_ids)[col_ind]
+    matched_pairs["parent_yx"] = np.around(parent_centroids[row_ind])
+    matched_pairs["child_yx"] = np.around(child_centroids[col_ind])
+    matched_pairs["cost"] = costs
+    return matched_pairs
+
+
+def get_extended_centroids(objects, amount_of_frames):
+    """
+    Splits an object table into the centroids and labels of each frame
+
+    Parameters
+    ----------
+    objects : nd array
+        the object table of the segmentation
+    amount_of_frames : int
+        the amount of frames of the segmentation
+
+    Returns
+    -------
+    list
+        (centroids, labels) of every frame, as returned by calculate_centroids
+    """
+    extended_centroids = []
+    for frame in range(amount_of_frames):
+        frame_objects = get_frame_objects(objects, frame)
+        centroids = np.stack(
+            [frame_objects["centroid_y"], frame_objects["centroid_x"]], axis=1
+        )
+        extended_centroids.append((centroids, frame_objects["label"]))
+    return extended_centroids
+
+
+def _match_centroids_parallel(pool, extended_centroids):
+    """
+    Match centroids between two slices.
+    """
+    slice_pairs = [
+        (extended_centroids[i - 1], extended_centroids[i])
+        for i in range(1, len(extended_centroids))
+    ]
+    if pool is None:
+        return list(map(match_centroids, slice_pairs))
+    return pool.map(match_centroids, slice_pairs)
+
+
+def _process_matches(matches):
+    """
+    Process the matches to create the tracks
+
+    Parameters
+    ----------
+    matches : list
+        the matches of every slice pair, as returned by match_centroids
+
+    Returns
+    -------
+    array
+        the tracks
+    """
+    # For every match, find the match continuing the track in the next slice
+    successors = []
+    for slice_matches, next_matches in zip(matches, matches[1:]):
+        order = np.argsort(next_matches["parent_id"], kind="stable")
+        parent_ids = next_matches["parent_id"][order]
+        positions = np.searchsorted(parent_ids, slice_matches["child_id"])
+        found = positions < len(parent_ids)
+        found[found] = parent_ids[positions[found]] == slice_matches["child_id"][found]
+        successor = np.full(len(slice_matches), -1)
+        successor[found] = order[positions[found]]
+        successors.append(successor)
+    if matches:
+        successors.append(np.full(len(matches[-1]), -1))
+    visited = [np.zeros(len(slice_matches), dtype=bool) for slice_matches in matches]
+
+    # Every match adds its child, every track additionally adds its first cell
+    amount_of_matches = sum(len(slice_matches) for slice_matches in matches)
+    tracks = np.zeros((2 * amount_of_matches, 4), dtype=int)
+    next_id = 0
+    row = 0
+
+    for start_slice, slice_matches in enumerate(matches):
+        for cell_id in range(len(slice_matches)):
+            if visited[start_slice][cell_id]:
+                continue
+
+            tracks[row, 0:2] = next_id, start_slice
+            tracks[row, 2:4] = slice_matches["parent_yx"][cell_id]
+            row += 1
+
+            # Follow the matches through the subsequent slices to complete the track
+            slice_id, match_number = start_slice, cell_id
+            while match_number >= 0:
+                visited[slice_id][match_number] = True
+                tracks[row, 0:2] = next_id, slice_id + 1
+                tracks[row, 2:4] = matches[slice_id]["child_yx"][match_number]
+                row += 1
+                match_number = successors[slice_id][match_number]
+                slice_id += 1
+
+            next_id += 1
+
+    return tracks[:row]
+
+
+def track_segmentation(data, pool):
+    """
+    Run coordinate based tracking on a segmentation
+
+    Parameters
+    ----------
+    data : array
+        the segmentation data, frames along the first axis
+    pool : Pool, optional
+        the worker pool to match the cells of the frames with, serial if None
+
+    Returns
+    -------
+    array
+        (N,4) shape array of the tracks (ID, z, y, x)
+    """
+    objects = calculate_object_table(data)
+    extended_centroids = get_extended_centroids(objects, len(data))
+    matches = _match_centroids_parallel(pool, extended_centroids)
+    return _process_matches(matches)
+
+
+def get_overlap_successors(label_slice, next_slice):
+    """
+    Finds the successor of every cell in the next slice by the overlap of the cells
+
+    The successor is the cell in the next slice covering the largest part of the cell,
+    if it covers more than MIN_OVERLAP of it.
+
+    Parameters
+    ----------
+    label_slice : np.ndarray
+        The labels of the slice
+    next_slice : np.ndarray
+        The labels of the next slice
+
+    Returns
+    -------
+    labels : np.ndarray
+        The labels of the cells in the slice, sorted
+    successors : np.ndarray
+        The label of the successor of each cell, 0 if it has none
+    """
+    label_slice = np.asarray(label_slice).ravel()
+    next_slice = np.asarray(next_slice).ravel()
+    foreground = label_slice != 0
+    labels, label_indices = np.unique(label_slice[foreground], return_inverse=True)
+    next_labels, next_indices = np.unique(next_slice[foreground], return_inverse=True)
+    if len(labels) == 0:
+        return labels, np.zeros(0, dtype=next_slice.dtype)
+
+    # Pixel counts of all pairs of overlapping cells (label, next label) in one pass
+    pairs = label_indices.ravel() * len(next_labels) + next_indices.ravel()
+    if len(labels) * len(next_labels) <= MAX_OVERLAP_TABLE_SIZE:
+        counts = np.bincount(pairs, minlength=len(labels) * len(next_labels))
+        counts = counts.reshape(len(labels), len(next_labels))
+        # argmax picks the lowest label on ties, like np.unique and np.argmax per cell
+        highest_overlap = np.argmax(counts, axis=1)
+        overlap = counts[np.arange(len(labels)), highest_overlap]
+        areas = counts.sum(axis=1)
+    else:
+        # Too many cells for a dense table, count only the pairs that occur
+        pairs, counts = np.unique(pairs, return_counts=True)
+        pair_labels = pairs // len(next_labels)
+        order = np.lexsort((pairs % len(next_labels), -counts, pair_labels))
+        first = np.r_[True, np.diff(pair_labels[order]) != 0]
+        highest_overlap = pairs[order][first] % len(next_labels)
+        overlap = counts[order][first]
+        areas = np.bincount(pair_labels, weights=counts, minlength=len(labels))
+    successors = next_labels[highest_overlap]
+    successors[overlap <= MIN_OVERLAP * areas] = 0
+    return labels, successors
+
+
+def get_overlap_successors_shared(label_descriptor, slice_id):
+    """
+    Finds the successors of the cells of a slice, with the label data in shared memory
+
+    Parameters
+    ----------
+    label_descriptor : tuple
+        The descriptor of the shared label data
+    slice_id : int
+        The slice to find the successors for
+
+    Returns
+    -------
+    labels, successors : np.ndarray
+        As returned by get_overlap_successors
+    """
+    label_data = attach_shared_array(label_descriptor)
+    return get_overlap_successors(label_data[slice_id], label_data[slice_id + 1])
+
+
+def link_overlap_tracks(objects, successors, amount_of_slices, min_track_length):
+    """
+    Links cells to tracks by following their successors
+
+    Tracks are started from every cell in the slices that can still hold a track of the
+    minimum length, unless the cell is already part of a track.
+
+    Parameters
+    ----------
+    objects : np.ndarray
+        The object table of the label data
+    successors : list
+        The labels and successors of every slice except the last one,
+        as returned by get_overlap_successors
+    amount_of_slices : int
+        The amount of slices of the label data
+    min_track_length : int
+        The minimum amount of cells of a track
+
+    Returns
+    -------
+    tracks : np.ndarray
+        (N,4) shape array of the tracks, sorted by ID and slice
+    """
+    # Row of the successor of every object in the object table, -1 if it has none
+    successor_rows = np.full(len(objects), -1)
+    for slice_id, (labels, next_labels) in enumerate(successors):
+        rows = get_object_rows(objects, np.full(len(labels), slice_id), labels)
+        next_rows = get_object_rows(
+            objects, np.full(len(next_labels), slice_id + 1), next_labels
+        )
+        successor_rows[rows] = next_rows
+    centroids = get_rounded_centroids(objects)
+
+    tracks = []
+    tracked_cells = set()
+    track_id = 1
+    for start_slice in range(amount_of_slices - min_track_length):
+        start, stop = np.searchsorted(objects["frame"], [start_slice, start_slice + 1])
+        # Only cells tracked from earlier slices are skipped
+        new_tracks = []
+        for row in range(start, stop):
+            if (start_slice, *centroids[row]) in tracked_cells:
+                continue
+            track_rows = [row]
+            while successor_rows[track_rows[-1]] >= 0:
+                track_rows.append(successor_rows[track_rows[-1]])
+            if len(track_rows) < min_track_length:
+                continue
+            new_tracks.append(track_rows)
+        for track_rows in new_tracks:
+            track = np.zeros((len(track_rows), 4), dtype=int)
+            track[:, 0] = track_id
+            track[:, 1] = objects["frame"][track_rows]
+            track[:, 2:4] = centroids[track_rows]
+            tracks.append(track)
+            tracked_cells.update(map(tuple, track[:, 1:4].tolist()))
+            track_id += 1
+
+    if not tracks:
+        return np.zeros((0, 4), dtype=int)
+    return np.concatenate(tracks)
+
+
+def track_overlap(data, pool=None, min_track_length=MIN_TRACK_LENGTH):
+    """
+    Run overlap based tracking on a segmentation
+
+    Parameters
+    ----------
+    data : array
+        the segmentation data, frames along the first axis
+    pool : Pool, optional
+        the worker pool to compute the overlaps of the frames with, serial if None
+    min_track_length : int
+        the minimum amount of cells of a track
+
+    Returns
+    -------
+    array
+        (N,4) shape array of the tracks (ID, z, y, x)
+    """
+    data = np.asarray(data)
+    objects = calculate_object_table(data)
+    if pool is None:
+        successors = [
+            get_overlap_successors(data[slice_id], data[slice_id + 1])
+            for slice_id in range(len(data) - 1)
+        ]
+    else:
+        # Publish the volume once, the overlaps of all frame pairs are computed in parallel
+        with SharedArray(data) as shared_data:
+            successors = pool.starmap(
+                get_overlap_successors_shared,
+                [
+                    (shared_data.descriptor, slice_id)
+                    for slice_id in range(len(data) - 1)
+                ],
+            )
+    return link_overlap_tracks(objects, successors, len(data), min_track_length)